@@ -1,95 +1,2703 @@
+import bisect
+import csv
+import datetime
+import gc
+import hashlib
+import heapq
+import json
+import math
+import mmap
 import os
-import networkx as nx
-from pyvis.network import Network
-import requests
+import random
+import re
+import shutil
+import sqlite3
+import statistics
+import sys
+import tempfile
+import threading
 import time
-from typing import Dict, List, Tuple
-from openai import OpenAI
+import zlib
+from array import array
+from collections import OrderedDict, defaultdict, deque, namedtuple
+from itertools import islice
+from json.encoder import encode_basestring
+from types import SimpleNamespace
+from typing import Dict, Iterable, Iterator, List, Tuple
+
+# Heavy dependencies (networkx, pyvis, openai, numpy, scipy, tiktoken) are imported on
+# first use so that loading this module for CLI helpers stays fast. So are the stdlib
+# modules only worker pools, shard processes and benchmarks need (concurrent.futures,
+# multiprocessing, subprocess, tracemalloc), which would take most of the import budget
+# on their own.
+IMPORT_TIME_BUDGET_MS = 50
+HEAVY_MODULES = ('networkx', 'pyvis', 'openai', 'requests', 'numpy', 'scipy', 'tiktoken')
+
+def count_tokens(text: str) -> int:
+    """Token count with tiktoken when installed, else a 4-characters-per-token estimate"""
+    try:
+        import tiktoken
+    except ImportError:
+        return (len(text) + 3) // 4
+    return len(tiktoken.get_encoding("cl100k_base").encode(text))
+
+class PromptTemplate:
+    """Prompt with a static, byte-identical prefix and a per-call suffix
+
+    Providers cache repeated prompt prefixes, so the text before the first
+    per-call field (e.g. the knowledge base context) is built once; only the
+    suffix is formatted per call.
+    """
+    __slots__ = ('prefix', 'suffix', 'prefix_tokens')
+
+    def __init__(self, prefix: str, suffix: str):
+        self.prefix = prefix
+        self.suffix = suffix
+        self.prefix_tokens = count_tokens(prefix)
+
+    def render(self, **fields) -> str:
+        return self.prefix + self.suffix.format(**fields)
+
+    def tokens(self, **fields) -> int:
+        return self.prefix_tokens + count_tokens(self.suffix.format(**fields))
+
+class PromptTemplates(dict):
+    """PromptTemplates by name, each built by build(name) on first access"""
+    def __init__(self, build):
+        super().__init__()
+        self.build = build
+
+    def __missing__(self, name: str) -> PromptTemplate:
+        template = self[name] = self.build(name)
+        return template
 
 class ClassicalAI:
     """Classical AI using OpenAI API"""
+    MODEL = "gpt-3.5-turbo"  # or "gpt-4" if you have access
+    SYSTEM_PROMPT = ("You are a medical expert providing accurate, detailed explanations "
+                     "about cancer biology and treatments.")
+    GRAPH_INSTRUCTIONS = """Based on the knowledge graph relationships shown above, provide a comprehensive explanation that:
+1. Explains the key relationships
+2. Describes the biological mechanisms
+3. Highlights the clinical implications
+
+Focus on the specific pathways and interactions shown in the knowledge graph."""
+    CITATION_INSTRUCTION = ("After each statement, give the bracketed citation keys (e.g. [c12]) "
+                            "of the relationships it relies on.")
+
     def __init__(self, knowledge_base: List[Dict]):
         self.knowledge = knowledge_base
-        self.client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
-        
+        self._client = None
+        self._templates = None
+        self._lock = threading.Lock()
+        self.usage = {'requests': 0, 'prompt_tokens': 0, 'cached_tokens': 0, 'completion_tokens': 0}
+
+    @property
+    def client(self):
+        """OpenAI client, created when the first API call is made"""
+        if self._client is None:
+            from openai import OpenAI
+            self._client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+        return self._client
+
+    @property
+    def templates(self) -> 'PromptTemplates':
+        """Prompt templates by name, each built on first use (see PromptTemplates)"""
+        if self._templates is None:
+            self._templates = PromptTemplates(self._build_template)
+        return self._templates
+
+    def _build_template(self, name: str) -> PromptTemplate:
+        if name == 'raw':
+            # Serializes the whole knowledge base, so only built when a raw query is made
+            return PromptTemplate(
+                "Based on the following medical knowledge base, please provide a detailed and "
+                f"accurate answer:\n\n{self._knowledge_context()}\n\n",
+                "Question: {query}\n\nPlease provide a clear and specific answer focusing on the "
+                "medical relationships and mechanisms involved.")
+        if name == 'graph':
+            return PromptTemplate("As a medical expert, analyze this knowledge graph data:\n\n",
+                                  "{graph_context}\n\nQuestion: {query}\n\n" + self.GRAPH_INSTRUCTIONS)
+        if name == 'graph_cited':
+            return PromptTemplate("As a medical expert, analyze this knowledge graph data:\n\n",
+                                  "{graph_context}\n\nQuestion: {query}\n\n" + self.GRAPH_INSTRUCTIONS
+                                  + " " + self.CITATION_INSTRUCTION)
+        if name == 'community':
+            return PromptTemplate(
+                "Summarize the following knowledge graph relationships in 2-3 sentences, "
+                "naming the key entities and mechanisms:\n\n",
+                "{facts}")
+        if name == 'summary_answer':
+            return PromptTemplate(
+                "Community summary:\n\n",
+                "{summary}\n\nQuestion: {query}\n\n"
+                "Answer only with information from the summary above. If it is not relevant, reply NONE.")
+        if name == 'judge':
+            return PromptTemplate(
+                """Score the answer to a medical question from 0 to 5 on each criterion (see Metric.md):
+relationship_depth: multi-hop relationships with their intermediate connections
+pathway_completeness: the full biological pathway with all intermediate steps
+clinical_relevance: clinical implications with mechanisms and effects
+mechanism_clarity: a clear mechanism with every step explained
+
+Reference relationships from the knowledge graph are given for grounding. Reply with exactly four lines of the form "criterion: score".
+
+""",
+                "Question: {query}\n\nReference relationships:\n{reference}\n\nAnswer:\n{answer}")
+        raise KeyError(f"Unknown prompt template: {name}")
+
+    def _knowledge_context(self) -> str:
+        parts = ["Medical Knowledge Base:\n\n"]
+        for item in self.knowledge:
+            parts.append(f"• {item['entity']} ({item['type']}):\n")
+            for rel in item.get('related_to') or ():
+                parts.append(f"  - {rel['type']} {rel['entity']}\n")
+            parts.append("\n")
+        return "".join(parts)
+
+    def prompt_tokens(self, template: str, **fields) -> int:
+        """Prompt tokens of a request, system message included"""
+        return count_tokens(self.SYSTEM_PROMPT) + self.templates[template].tokens(**fields)
+
     def raw_query(self, query: str) -> str:
         """Query using only basic knowledge base"""
         try:
-            # Format context
-            context = "Medical Knowledge Base:\n\n"
-            for item in self.knowledge:
-                context += f"• {item['entity']} ({item['type']}):\n"
-                if 'related_to' in item and item['related_to']:
-                    for rel in item['related_to']:
-                        context += f"  - {rel['type']} {rel['entity']}\n"
-                context += "\n"
-            
-            prompt = f"""Based on the following medical knowledge base, please provide a detailed and accurate answer:
+            return self._make_api_call(self.templates['raw'].render(query=query))
+        except Exception as e:
+            return f"Error: {str(e)}"
+    
+    def query_with_graph_context(self, query: str, graph_context: str, cited: bool = False) -> str:
+        """Query using GraphRAG context; cited asks for the context's citation keys in the answer"""
+        try:
+            template = self.templates['graph_cited' if cited else 'graph']
+            return self._make_api_call(template.render(graph_context=graph_context, query=query))
+        except Exception as e:
+            return f"Error: {str(e)}"
+    
+    def summarize_community(self, facts: str) -> str:
+        """Short LLM summary of one graph community's relationships"""
+        return self._make_api_call(self.templates['community'].render(facts=facts))
+
+    def answer_from_summary(self, query: str, summary: str) -> str:
+        """Partial answer from a single community summary (map step)"""
+        return self._make_api_call(self.templates['summary_answer'].render(summary=summary, query=query))
+
+    def prompt_cache_stats(self) -> Dict:
+        """Token usage so far and how much of it the provider served from its prompt cache"""
+        with self._lock:
+            stats = dict(self.usage)
+        stats['cached_ratio'] = (stats['cached_tokens'] / stats['prompt_tokens']
+                                 if stats['prompt_tokens'] else 0.0)
+        return stats
+
+    def batch(self, template: str, requests: List[Dict], pack_size: int = 8,
+              batch_api: bool = False, workers: int = 4, max_tokens: int = 500) -> Tuple[List[str], Dict]:
+        """Answer many prompts of one template with few requests
+
+        Up to pack_size requests share one prompt: the template prefix is
+        sent once, followed by numbered '### Request i' sections, and the
+        reply is split on '### Answer i' lines. With batch_api the packed
+        prompts go through the provider's batch endpoint instead of
+        concurrent chat completions. Answers that cannot be parsed back are
+        retried as single calls. Returns the answers and a report of the
+        requests and (estimated) prompt tokens saved.
+        """
+        prompt = self.templates[template]
+        suffixes = [prompt.suffix.format(**fields) for fields in requests]
+        pack_size = max(pack_size, 1)
+        packs = [list(range(start, min(start + pack_size, len(requests))))
+                 for start in range(0, len(requests), pack_size)]
+        packed = [self._pack(prompt.prefix, [suffixes[i] for i in pack]) if len(pack) > 1
+                  else prompt.prefix + suffixes[pack[0]] for pack in packs]
+        budgets = [min(max_tokens * len(pack), 4096) for pack in packs]
+        if batch_api:
+            replies = self._submit_batch(packed, budgets)
+        else:
+            from concurrent.futures import ThreadPoolExecutor
+            with ThreadPoolExecutor(max_workers=workers) as pool:
+                replies = list(pool.map(self._make_api_call, packed, budgets))
+
+        answers = [None] * len(requests)
+        for pack, reply in zip(packs, replies):
+            if reply is None:
+                continue
+            if len(pack) == 1:
+                answers[pack[0]] = reply
+                continue
+            parsed = self._unpack(reply)
+            for number, i in enumerate(pack, 1):
+                answers[i] = parsed.get(number)
+        missing = [i for i, answer in enumerate(answers) if not answer]
+        retried = [prompt.prefix + suffixes[i] for i in missing]
+        for i, answer in zip(missing, map(self._make_api_call, retried, [max_tokens] * len(missing))):
+            answers[i] = answer
+
+        system = count_tokens(self.SYSTEM_PROMPT)
+        unbatched = sum(system + count_tokens(prompt.prefix + suffix) for suffix in suffixes)
+        sent = sum(system + count_tokens(text) for text in packed + retried)
+        report = {
+            'prompts': len(requests),
+            'requests': len(packed) + len(retried),
+            'requests_saved': len(requests) - len(packed) - len(retried),
+            'retried': len(retried),
+            'prompt_tokens': sent,
+            'prompt_tokens_unbatched': unbatched,
+            'prompt_tokens_saved': unbatched - sent,
+            'batch_api': batch_api
+        }
+        return answers, report
+
+    @staticmethod
+    def _pack(prefix: str, suffixes: List[str]) -> str:
+        sections = "".join(f"### Request {i}\n{suffix}\n\n" for i, suffix in enumerate(suffixes, 1))
+        return (f"{prefix}Answer each of the {len(suffixes)} requests below independently. "
+                "Start each answer with a line '### Answer <number>'.\n\n" + sections)
+
+    @staticmethod
+    def _unpack(reply: str) -> Dict[int, str]:
+        pieces = re.split(r'^#+\s*Answer\s+(\d+)\s*:?\s*$', reply, flags=re.MULTILINE)
+        return {int(number): text.strip() for number, text in zip(pieces[1::2], pieces[2::2])
+                if text.strip()}
+
+    def _submit_batch(self, prompts: List[str], budgets: List[int],
+                      poll_interval: float = 10.0) -> List[str]:
+        """Run prompts through the batch API; None for requests that did not complete"""
+        lines = [json.dumps({'custom_id': f"request-{i}", 'method': 'POST', 'url': '/v1/chat/completions',
+                             'body': self._request_body(prompt, budget)})
+                 for i, (prompt, budget) in enumerate(zip(prompts, budgets))]
+        upload = self.client.files.create(file=("requests.jsonl", "\n".join(lines).encode('utf-8')),
+                                          purpose="batch")
+        batch = self.client.batches.create(input_file_id=upload.id, endpoint="/v1/chat/completions",
+                                           completion_window="24h")
+        while batch.status not in ('completed', 'failed', 'expired', 'cancelled'):
+            time.sleep(poll_interval)
+            batch = self.client.batches.retrieve(batch.id)
+        replies = [None] * len(prompts)
+        if batch.status == 'completed' and batch.output_file_id:
+            for line in self.client.files.content(batch.output_file_id).text.splitlines():
+                record = json.loads(line)
+                body = (record.get('response') or {}).get('body') or {}
+                if body.get('choices'):
+                    replies[int(record['custom_id'].split('-')[1])] = body['choices'][0]['message']['content'].strip()
+                    self._record_usage(body.get('usage'))
+        return replies
+
+    def _record_usage(self, usage):
+        if usage is None:
+            return
+        def field(obj, name):
+            # Chat completions return objects, batch output lines plain JSON
+            value = obj.get(name) if isinstance(obj, dict) else getattr(obj, name, None)
+            return value or 0
+        with self._lock:
+            self.usage['requests'] += 1
+            self.usage['prompt_tokens'] += field(usage, 'prompt_tokens')
+            self.usage['completion_tokens'] += field(usage, 'completion_tokens')
+            self.usage['cached_tokens'] += field(field(usage, 'prompt_tokens_details'), 'cached_tokens')
+
+    def _request_body(self, prompt: str, max_tokens: int) -> Dict:
+        return {
+            'model': self.MODEL,
+            'messages': [
+                {"role": "system", "content": self.SYSTEM_PROMPT},
+                {"role": "user", "content": prompt}
+            ],
+            'temperature': 0.7,
+            'max_tokens': max_tokens
+        }
+
+    def _make_api_call(self, prompt: str, max_tokens: int = 500) -> str:
+        """Make OpenAI API call"""
+        try:
+            response = self.client.chat.completions.create(**self._request_body(prompt, max_tokens))
+            self._record_usage(getattr(response, 'usage', None))
+            return response.choices[0].message.content.strip()
+                
+        except Exception as e:
+            return f"API Error: {str(e)}"
+
+class MockLLMClient:
+    """In-process stand-in for the OpenAI client: chat completions, files and batches
+
+    Replies 'Mock answer to: <last line>' for a prompt, or one such answer
+    per '### Request i' section of a packed prompt, so batching can be
+    exercised offline. Usage is estimated with count_tokens, and a prefix
+    shared with the previous prompt (1024 tokens or more) is reported as
+    cached in 128-token blocks, like provider prompt caching.
+
+    With extract=True, TripleExtractor prompts get a JSON reply instead: one
+    triple per '<Subject> <relationship> <Object>.' sentence of each
+    '### Chunk i' section, with capitalised entity names.
+    """
+    EXTRACT_SENTENCE = re.compile(r"([A-Z][\w-]*(?: [A-Z][\w-]*)*) ([a-z_]+) ([A-Z][\w-]*(?: [A-Z][\w-]*)*)[.!?]")
+
+    def __init__(self, extract: bool = False):
+        self.extract = extract
+        self.requests = 0
+        self._previous = ""
+        self._lock = threading.Lock()
+        self._files = {}
+        self._batches = {}
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self._create))
+        self.files = SimpleNamespace(create=self._upload, content=self._content)
+        self.batches = SimpleNamespace(create=self._create_batch, retrieve=self._batches.__getitem__)
+
+    def _complete(self, messages: List[Dict], **kwargs) -> Dict:
+        prompt = "".join(message['content'] for message in messages)
+        sections = re.findall(r'^### Request (\d+)\n(.*?)(?=^### Request |\Z)', prompt, re.MULTILINE | re.DOTALL)
+        chunks = self.extract and re.findall(r'^### Chunk (\d+)\n(.*?)(?=^### Chunk |\Z)', prompt,
+                                             re.MULTILINE | re.DOTALL)
+        if chunks:
+            content = json.dumps({number: [{'subject': subject, 'subject_type': 'concept',
+                                            'relationship': relationship, 'object': target,
+                                            'object_type': 'concept'}
+                                           for subject, relationship, target in self.EXTRACT_SENTENCE.findall(text)]
+                                  for number, text in chunks})
+        elif sections:
+            content = "\n\n".join(f"### Answer {number}\nMock answer to: {text.strip().splitlines()[-1]}"
+                                   for number, text in sections)
+        else:
+            content = f"Mock answer to: {prompt.strip().splitlines()[-1]}"
+        with self._lock:
+            self.requests += 1
+            shared = os.path.commonprefix([prompt, self._previous])
+            self._previous = prompt
+        cached = count_tokens(shared) // 128 * 128
+        return {
+            'choices': [{'message': {'role': 'assistant', 'content': content}}],
+            'usage': {'prompt_tokens': count_tokens(prompt), 'completion_tokens': count_tokens(content),
+                      'prompt_tokens_details': {'cached_tokens': cached if cached >= 1024 else 0}}
+        }
+
+    def _create(self, **kwargs):
+        return json.loads(json.dumps(self._complete(**kwargs)), object_hook=lambda d: SimpleNamespace(**d))
+
+    def _upload(self, file, purpose: str):
+        file_id = f"file-{len(self._files)}"
+        self._files[file_id] = file[1].decode('utf-8') if isinstance(file, tuple) else file.read().decode('utf-8')
+        return SimpleNamespace(id=file_id)
+
+    def _content(self, file_id: str):
+        return SimpleNamespace(text=self._files[file_id])
+
+    def _create_batch(self, input_file_id: str, endpoint: str, completion_window: str):
+        output = []
+        for line in self._files[input_file_id].splitlines():
+            request = json.loads(line)
+            output.append(json.dumps({'custom_id': request['custom_id'],
+                                      'response': {'status_code': 200, 'body': self._complete(**request['body'])}}))
+        output_id = f"file-{len(self._files)}"
+        self._files[output_id] = "\n".join(output)
+        batch = SimpleNamespace(id=f"batch-{len(self._batches)}", status='completed', output_file_id=output_id)
+        self._batches[batch.id] = batch
+        return batch
+
+class TripleExtractor:
+    """LLM extraction of knowledge base items from raw documents
+
+    Documents are split into overlapping sentence chunks; chunks are packed
+    into batched extraction prompts sent concurrently through ClassicalAI.
+    Results are cached per chunk by content hash, so re-runs only send
+    chunks that changed. extract() yields items in the
+    {'entity', 'type', 'related_to'} format and can be streamed directly
+    into GraphRAG.create_knowledge_graph.
+    """
+    PROMPT_VERSION = 1
+
+    def __init__(self, llm: ClassicalAI, cache_dir: str = ".extraction_cache",
+                 chunk_size: int = 1500, overlap: int = 200, batch_size: int = 4,
+                 workers: int = 4):
+        self.llm = llm
+        self.cache_dir = cache_dir
+        self.chunk_size = chunk_size
+        self.overlap = overlap
+        self.batch_size = batch_size
+        self.workers = workers
+        self.stats = {'chunks': 0, 'cached': 0, 'requests': 0, 'failed': 0}
+
+    def chunk(self, text: str) -> List[str]:
+        """Split text on sentence boundaries into chunks of about chunk_size chars"""
+        sentences = [s for s in re.split(r"(?<=[.!?])\s+", text.strip()) if s]
+        chunks = []
+        current = []
+        length = 0
+        for sentence in sentences:
+            if current and length + len(sentence) > self.chunk_size:
+                chunks.append(" ".join(current))
+                # Carry trailing sentences over so relations spanning the cut survive
+                carried = []
+                while current and sum(map(len, carried)) + len(current[-1]) <= self.overlap:
+                    carried.insert(0, current.pop())
+                current = carried
+                length = sum(map(len, current))
+            current.append(sentence)
+            length += len(sentence)
+        if current:
+            chunks.append(" ".join(current))
+        return chunks
+
+    def extract(self, documents: Iterable[str]) -> Iterator[Dict]:
+        """Stream knowledge base items extracted from documents"""
+        window = self.batch_size * self.workers * 2
+        from concurrent.futures import ThreadPoolExecutor
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            pending = []
+            for document in documents:
+                pending.extend(self.chunk(document))
+                if len(pending) >= window:
+                    yield from self._process(pending, pool)
+                    pending = []
+            if pending:
+                yield from self._process(pending, pool)
+
+    def _process(self, chunks: List[str], pool) -> Iterator[Dict]:
+        self.stats['chunks'] += len(chunks)
+        results = {}
+        missing = []
+        for chunk in chunks:
+            key = self._key(chunk)
+            cached = self._cache_get(key)
+            if cached is None:
+                missing.append((key, chunk))
+            else:
+                results[key] = cached
+                self.stats['cached'] += 1
+
+        batches = [missing[i:i + self.batch_size] for i in range(0, len(missing), self.batch_size)]
+        # Counted here rather than in _extract_batch, which runs on pool threads
+        self.stats['requests'] += len(batches)
+        for batch, extracted in zip(batches, pool.map(self._extract_batch, batches)):
+            for (key, _), triples in zip(batch, extracted):
+                if triples is None:
+                    self.stats['failed'] += 1
+                    continue
+                results[key] = triples
+                self._cache_put(key, triples)
+
+        for chunk in chunks:
+            yield from self._to_items(results.get(self._key(chunk), []))
+
+    def _extract_batch(self, batch: List[Tuple[str, str]]) -> List:
+        """One prompt for several chunks; None for chunks that could not be parsed"""
+        sections = "\n\n".join(f"### Chunk {i + 1}\n{chunk}" for i, (_, chunk) in enumerate(batch))
+        prompt = f"""Extract biomedical knowledge graph triples from each chunk below.
+
+Reply with a single JSON object mapping each chunk number to a list of triples:
+{{"1": [{{"subject": "...", "subject_type": "drug|protein|pathway|cancer_type|side_effect|gene|concept", "relationship": "...", "object": "...", "object_type": "..."}}]}}
+
+{sections}"""
+        response = self.llm._make_api_call(prompt, max_tokens=2000)
+        try:
+            parsed = json.loads(response[response.index('{'):response.rindex('}') + 1])
+        except ValueError:
+            return [None] * len(batch)
+        extracted = []
+        for i in range(len(batch)):
+            triples = parsed.get(str(i + 1))
+            extracted.append(triples if isinstance(triples, list) else None)
+        return extracted
+
+    @staticmethod
+    def _to_items(triples: List[Dict]) -> Iterator[Dict]:
+        """Convert triples into knowledge base items grouped by subject"""
+        items = OrderedDict()
+        for triple in triples:
+            try:
+                subject = triple['subject'].strip()
+                target = triple['object'].strip()
+                relationship = triple['relationship'].strip().lower().replace(' ', '_')
+            except (KeyError, AttributeError):
+                continue
+            if not (subject and target and relationship):
+                continue
+            item = items.setdefault(subject, {'entity': subject,
+                                              'type': triple.get('subject_type') or 'concept',
+                                              'related_to': []})
+            item['related_to'].append({'entity': target, 'type': relationship})
+            if triple.get('object_type') and target not in items:
+                items[target] = {'entity': target, 'type': triple['object_type'], 'related_to': []}
+        yield from items.values()
+
+    def _key(self, chunk: str) -> str:
+        return hashlib.sha256(f"{self.PROMPT_VERSION}\n{chunk}".encode('utf-8')).hexdigest()
+
+    def _cache_get(self, key: str):
+        path = os.path.join(self.cache_dir, f"{key}.json")
+        if not os.path.exists(path):
+            return None
+        with open(path, encoding='utf-8') as f:
+            return json.load(f)
+
+    def _cache_put(self, key: str, triples: List[Dict]):
+        os.makedirs(self.cache_dir, exist_ok=True)
+        with open(os.path.join(self.cache_dir, f"{key}.json"), 'w', encoding='utf-8') as f:
+            json.dump(triples, f, ensure_ascii=False)
+
+class EntityResolver:
+    """Merge spelling variants of the same entity at ingest time
+
+    Names are first normalized (case, punctuation, generic suffixes such as
+    'protein'), then mapped through the alias table, then fuzzy-matched:
+    names are blocked by the first characters of their normalized form and
+    compared within a block by cosine similarity of character trigram
+    vectors, computed as sparse matrix products. Names whose numbers differ
+    (HER2/HER3, BRCA1/BRCA2) are never merged. Names resolved earlier stay
+    in their blocks, so a later batch's misspellings merge into them.
+    """
+    def __init__(self, aliases: Dict[str, str] = None, threshold: float = 0.85,
+                 suffixes: Tuple[str, ...] = ('protein', 'gene'), block_prefix: int = 2):
+        self.threshold = threshold
+        self.suffixes = suffixes
+        self.block_prefix = block_prefix
+        # normalized alias -> canonical name; grows as duplicates are merged
+        self.aliases = {}
+        # fuzzy block -> known aliases in it, which later names are compared with
+        self._blocks = defaultdict(list)
+        for alias, canonical in (aliases or {}).items():
+            self._remember(self.normalize(alias), canonical)
+            self._remember(self.normalize(canonical), canonical)
+
+    def normalize(self, name: str) -> str:
+        name = re.sub(r"(?<=[a-z])-(?=[0-9])", "", name.lower())  # HER-2 -> her2
+        words = re.sub(r"[^0-9a-z ]+", "", re.sub(r"[-_/]+", " ", name)).split()
+        while len(words) > 1 and words[-1] in self.suffixes:
+            words.pop()
+        return " ".join(words)
+
+    def _block(self, key: str) -> Tuple[str, Tuple[str, ...]]:
+        """Keys are only compared within a block: same leading characters and numbers"""
+        return key.replace(" ", "")[:self.block_prefix], tuple(re.findall(r"\d+", key))
+
+    def _remember(self, key: str, canonical: str):
+        if key not in self.aliases:
+            self.aliases[key] = canonical
+            self._blocks[self._block(key)].append(key)
+
+    def canonicalize(self, data: Iterable[Dict]) -> List[Dict]:
+        """Copy of the knowledge base items with every entity name resolved"""
+        data = list(data)
+        names = []
+        for item in data:
+            names.append(item['entity'])
+            names.extend(relation['entity'] for relation in item.get('related_to') or ())
+        mapping = self.resolve_batch(names)
+        resolved = []
+        for item in data:
+            copy = dict(item, entity=mapping[item['entity']])
+            if item.get('related_to'):
+                copy['related_to'] = [dict(relation, entity=mapping[relation['entity']])
+                                      for relation in item['related_to']]
+            resolved.append(copy)
+        return resolved
+
+    def resolve_batch(self, names: Iterable[str], remember: bool = True) -> Dict[str, str]:
+        """Map each name to its canonical form (the first-seen member of its group)
+
+        Names are matched against each other and against every name resolved
+        before. With remember=False, names new to the resolver map to
+        themselves without being recorded, e.g. for lookups.
+        """
+        names = list(OrderedDict.fromkeys(names))
+        keys = {name: self.normalize(name) for name in names}
+
+        # Exact normalized matches and alias table hits
+        canonical_by_key = OrderedDict()
+        for name in names:
+            key = keys[name]
+            canonical_by_key.setdefault(key, self.aliases.get(key, name))
+
+        # Fuzzy matching of the remaining distinct keys, blocked on leading
+        # characters and on the numbers in the name, which must match exactly.
+        # Known aliases in the block come first, so they lead and keep their names.
+        blocks = defaultdict(list)
+        for key in canonical_by_key:
+            if key not in self.aliases:
+                blocks[self._block(key)].append(key)
+        blocks = [(self._blocks.get(block, []), new) for block, new in blocks.items()]
+        blocks = [(known, known + new) for known, new in blocks if len(known) + len(new) > 1]
+        leader_of = {}
+        for (known, block), pairs in zip(blocks, self._similar_pairs([block for _, block in blocks])):
+            leader_of.update(self._assign_leaders(block, [pair for pair in pairs if pair[1] >= len(known)]))
+
+        mapping = {}
+        for name in names:
+            key = leader_of.get(keys[name], keys[name])
+            canonical = canonical_by_key[key] if key in canonical_by_key else self.aliases[key]
+            mapping[name] = canonical
+            if remember:
+                self._remember(keys[name], canonical)
+        return mapping
+
+    @staticmethod
+    def _assign_leaders(keys: List[str], pairs: List[Tuple[int, int, float]]) -> Dict[str, str]:
+        """Attach each key to the most similar earlier leader, else make it a leader
+
+        Members only join leaders, never each other, so similarity does not
+        chain through intermediate spellings.
+        """
+        best = {}
+        for i, j, score in pairs:
+            best.setdefault(j, []).append((score, i))
+        leader_of = {}
+        for j in sorted(best):
+            candidates = [(score, i) for score, i in best[j] if keys[i] not in leader_of]
+            if candidates:
+                leader_of[keys[j]] = keys[max(candidates)[1]]
+        return leader_of
+
+    def _similar_pairs(self, blocks: List[List[str]], small_block: int = 64,
+                       row_chunk: int = 1024) -> List[List[Tuple[int, int, float]]]:
+        """(i, j, cosine) for i < j above threshold within each block, by trigram vectors
+
+        Most blocks hold a few spellings of one name: their pairs are scored
+        together in one row-wise sparse product, as a product per block would
+        cost more in overhead than in arithmetic. Larger blocks are multiplied
+        out in row chunks.
+        """
+        pairs = [[] for _ in blocks]
+        if not blocks:
+            return pairs
+        import numpy as np
+        import scipy.sparse as sp
+        vocabulary = {}
+        rows, cols = [], []
+        offsets = []
+        count = 0
+        for block in blocks:
+            offsets.append(count)
+            for key in block:
+                padded = f" {key} "
+                for j in range(len(padded) - 2):
+                    rows.append(count)
+                    cols.append(vocabulary.setdefault(padded[j:j + 3], len(vocabulary)))
+                count += 1
+        vectors = sp.csr_matrix((np.ones(len(rows), dtype=np.float32), (rows, cols)),
+                                shape=(count, len(vocabulary)))
+        norms = np.sqrt(np.asarray(vectors.multiply(vectors).sum(axis=1)).ravel())
+        norms[norms == 0] = 1
+        vectors = sp.csr_matrix(sp.diags(1 / norms) @ vectors)
+
+        owners, lefts, rights = [], [], []
+        for b, block in enumerate(blocks):
+            offset = offsets[b]
+            if len(block) <= small_block:
+                for i in range(len(block)):
+                    for j in range(i + 1, len(block)):
+                        owners.append(b)
+                        lefts.append(offset + i)
+                        rights.append(offset + j)
+                continue
+            block_vectors = vectors[offset:offset + len(block)]
+            for start in range(0, len(block), row_chunk):
+                similarity = sp.coo_matrix(block_vectors[start:start + row_chunk] @ block_vectors.T)
+                block_rows = similarity.row + start
+                keep = (block_rows < similarity.col) & (similarity.data >= self.threshold)
+                pairs[b].extend(zip(block_rows[keep].tolist(), similarity.col[keep].tolist(),
+                                    similarity.data[keep].tolist()))
+        if owners:
+            scores = np.asarray(vectors[lefts].multiply(vectors[rights]).sum(axis=1)).ravel()
+            for k in np.flatnonzero(scores >= self.threshold).tolist():
+                offset = offsets[owners[k]]
+                pairs[owners[k]].append((lefts[k] - offset, rights[k] - offset, float(scores[k])))
+        return pairs
+
+    def alias_index(self) -> Dict[str, str]:
+        return dict(self.aliases)
+
+class QueryCache:
+    """LRU cache of graph analyses keyed by linked seed entities
+
+    Thread-safe: Evaluator and batch callers query one GraphRAG from
+    several threads.
+    """
+    def __init__(self, max_size: int = 256):
+        self.max_size = max_size
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def make_key(seeds: List[str], params: Dict, version: int) -> Tuple:
+        """Paraphrased questions resolving to the same seeds share a key"""
+        return (frozenset(seeds), tuple(sorted(params.items())), version)
+
+    def get(self, key: Tuple):
+        with self._lock:
+            value = self._entries.get(key)
+            if value is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key: Tuple, value):
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict:
+        lookups = self.hits + self.misses
+        return {
+            'size': len(self._entries),
+            'max_size': self.max_size,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'hit_rate': self.hits / lookups if lookups else 0.0
+        }
+
+    def __len__(self):
+        return len(self._entries)
+
+Neighbor = namedtuple('Neighbor', ['relationship', 'entity'])
+Step = namedtuple('Step', ['source', 'relationship', 'target'])
+Claim = namedtuple('Claim', ['source', 'relation', 'target'])
+
+class TripleIndex:
+    """Hash index of the graph's (source, relationship, target) triples
+
+    Entity and relationship names are interned to ints. Each undirected
+    edge is keyed by its id pair (low << 32 | high) and stores its
+    relationship id and ingest direction (relationship << 1 | reversed), so
+    an existence check is one dict lookup; re-adding an edge replaces its
+    relationship and direction, as the graph does. Per-relationship posting
+    sets of pair keys serve pattern scans such as (?, treats, ?).
+    """
+    def __init__(self):
+        self.names = []
+        self.ids = {}
+        self.relationships = []
+        self.relationship_ids = {}
+        self.edges = {}  # pair key -> relationship id << 1 | reversed
+        self.postings = {}  # relationship id -> set of pair keys
+
+    def __len__(self):
+        return len(self.edges)
+
+    def __contains__(self, triple: Tuple[str, str, str]) -> bool:
+        source, relationship, target = triple
+        s, t = self.ids.get(source), self.ids.get(target)
+        r = self.relationship_ids.get(relationship)
+        if s is None or t is None or r is None:
+            return False
+        return self.edges.get(self._pair(s, t)) == (r << 1 | (s > t))
+
+    @staticmethod
+    def _pair(s: int, t: int) -> int:
+        return s << 32 | t if s <= t else t << 32 | s
+
+    def add(self, source: str, relationship: str, target: str) -> int:
+        """Add or relabel an edge; returns its previous edge value, None if it is new"""
+        ids = self.ids
+        s = ids.get(source)
+        if s is None:
+            s = ids[source] = len(self.names)
+            self.names.append(source)
+        t = ids.get(target)
+        if t is None:
+            t = ids[target] = len(self.names)
+            self.names.append(target)
+        r = self.relationship_ids.get(relationship)
+        if r is None:
+            r = self.relationship_ids[relationship] = len(self.relationships)
+            self.relationships.append(relationship)
+            self.postings[r] = set()
+        if s <= t:
+            pair, value = s << 32 | t, r << 1
+        else:
+            pair, value = t << 32 | s, r << 1 | 1
+        previous = self.edges.get(pair)
+        if previous != value:
+            if previous is not None:
+                self.postings[previous >> 1].discard(pair)
+            self.edges[pair] = value
+            self.postings[r].add(pair)
+        return previous
+
+    def key(self, source: str, relationship: str, target: str) -> Tuple[int, int]:
+        """(pair key, edge value) of an indexed triple, as stored in edges"""
+        s, t = self.ids[source], self.ids[target]
+        return self._pair(s, t), self.relationship_ids[relationship] << 1 | (s > t)
+
+    def add_arrays(self, names: List[str], relationships: List[str], sources, targets, rels):
+        """Bulk load into an empty index from interned id arrays (one triple per edge)"""
+        import numpy as np
+        if self.edges:
+            raise ValueError("add_arrays needs an empty index")
+        self.names = list(names)
+        self.ids = {name: i for i, name in enumerate(self.names)}
+        self.relationships = list(relationships)
+        self.relationship_ids = {relationship: i for i, relationship in enumerate(self.relationships)}
+        sources, targets, rels = (np.asarray(a, dtype=np.int64) for a in (sources, targets, rels))
+        pairs = np.minimum(sources, targets) << 32 | np.maximum(sources, targets)
+        values = rels << 1 | (sources > targets)
+        self.edges = dict(zip(pairs.tolist(), values.tolist()))
+        order = np.argsort(rels, kind='stable')
+        bounds = np.searchsorted(rels[order], np.arange(len(self.relationships) + 1))
+        self.postings = {r: set(pairs[order[bounds[r]:bounds[r + 1]]].tolist())
+                         for r in range(len(self.relationships))}
+
+    def remove(self, source: str, target: str) -> bool:
+        """Drop the edge between two entities, whichever its direction"""
+        s, t = self.ids.get(source), self.ids.get(target)
+        if s is None or t is None:
+            return False
+        pair = self._pair(s, t)
+        value = self.edges.pop(pair, None)
+        if value is None:
+            return False
+        self.postings[value >> 1].discard(pair)
+        return True
+
+    def get(self, u: str, v: str) -> Step:
+        """The triple of the edge between u and v in its ingest direction, None if absent"""
+        s, t = self.ids.get(u), self.ids.get(v)
+        if s is None or t is None:
+            return None
+        pair = self._pair(s, t)
+        value = self.edges.get(pair)
+        return None if value is None else self._decode(pair, value)
+
+    def _decode(self, pair: int, value: int) -> Step:
+        low, high = pair >> 32, pair & 0xFFFFFFFF
+        if value & 1:
+            low, high = high, low
+        return Step(self.names[low], self.relationships[value >> 1], self.names[high])
+
+    def match(self, source: str = None, relationship: str = None, target: str = None) -> Iterator[Step]:
+        """Triples matching a pattern; None is a wildcard
+
+        Scans the relationship's posting set when it is given, every edge
+        otherwise; GraphRAG.match uses adjacency when an endpoint is given.
+        """
+        names, relationships = self.names, self.relationships
+        source = self.ids.get(source, -1) if source is not None else None
+        target = self.ids.get(target, -1) if target is not None else None
+        if relationship is not None:
+            r = self.relationship_ids.get(relationship)
+            if r is None:
+                return
+            edges = self.edges
+            candidates = ((pair, edges[pair]) for pair in self.postings[r])
+        else:
+            candidates = self.edges.items()
+        for pair, value in candidates:
+            s, t = pair >> 32, pair & 0xFFFFFFFF
+            if value & 1:
+                s, t = t, s
+            if (source is None or s == source) and (target is None or t == target):
+                yield Step(names[s], relationships[value >> 1], names[t])
+
+class ProvenanceTable:
+    """Columnar side table of edge provenance (document id, sentence offsets)
+
+    Rows live out-of-line in flat typed arrays (edge pair key and edge
+    value as in TripleIndex, interned document, start and end character
+    offsets), so the graph and the query hot path stay lean. The edge value
+    records the claim (relationship and direction) the evidence supports,
+    so rows of a relabeled edge stop being cited. A row's number is its
+    citation key ('c12'). Rows of an edge are found through a sorted copy
+    of the edge column, rebuilt on the first lookup after a change.
+    Evidence text is read only by resolve, from documents: a mapping or
+    callable from document id to its text.
+    """
+    def __init__(self, documents=None, text_cache: int = 32):
+        self.edges = array('q')
+        self.claims = array('q')  # edge value (relationship << 1 | reversed) when recorded
+        self.documents_of = array('i')  # document index, -1 once the edge is removed
+        self.starts = array('i')
+        self.ends = array('i')
+        self.document_names = []
+        self.document_ids = {}
+        self.documents = documents
+        self._texts = QueryCache(text_cache)  # recently resolved documents
+        self._sorted = None  # (sorted edge keys, row order)
+
+    def __len__(self):
+        return len(self.edges)
+
+    @staticmethod
+    def key(row: int) -> str:
+        return f"c{row}"
+
+    def add(self, pair: int, value: int, provenance):
+        """Rows for one edge claim from a {'document', 'start', 'end'} dict or a list of them"""
+        for record in [provenance] if isinstance(provenance, dict) else provenance:
+            document = str(record['document'])
+            index = self.document_ids.get(document)
+            if index is None:
+                index = self.document_ids[document] = len(self.document_names)
+                self.document_names.append(document)
+            self.edges.append(pair)
+            self.claims.append(value)
+            self.documents_of.append(index)
+            self.starts.append(record.get('start', 0))
+            self.ends.append(record.get('end', -1))
+        self._sorted = None
+
+    def rows(self, pair: int, value: int = None) -> List[int]:
+        """Live rows citing one edge, in insertion order"""
+        return self.rows_of([pair], None if value is None else [value])[0]
+
+    def rows_of(self, pairs: List[int], values: List[int] = None) -> List[List[int]]:
+        """Live rows citing each of several edges, with one vectorized search
+
+        With values (the edges' current TripleIndex values), only rows
+        recorded for that same claim are returned.
+        """
+        import numpy as np
+        if not self.edges:
+            return [[] for _ in pairs]
+        if self._sorted is None:
+            edges = np.frombuffer(self.edges, dtype=np.int64)
+            order = np.argsort(edges, kind='stable')
+            self._sorted = (edges[order], order)
+        keys, order = self._sorted
+        pairs = np.asarray(pairs, dtype=np.int64)
+        bounds = zip(np.searchsorted(keys, pairs).tolist(), np.searchsorted(keys, pairs + 1).tolist())
+        documents_of, claims = self.documents_of, self.claims
+        if values is None:
+            return [[row for row in order[lo:hi].tolist() if documents_of[row] >= 0] if hi > lo else []
+                    for lo, hi in bounds]
+        return [[row for row in order[lo:hi].tolist() if documents_of[row] >= 0 and claims[row] == value]
+                if hi > lo else [] for (lo, hi), value in zip(bounds, values)]
+
+    def remove(self, pair: int):
+        """Retire an edge's rows; their citation keys stop resolving"""
+        for row in self.rows(pair):
+            self.documents_of[row] = -1
+
+    def record(self, key: str) -> Dict:
+        """Pair key, edge value, document and offsets behind a citation key, without reading the document"""
+        row = int(key[1:]) if key[:1] == 'c' and key[1:].isdigit() else -1
+        if not 0 <= row < len(self.edges) or self.documents_of[row] < 0:
+            raise KeyError(f"Unknown citation key: {key}")
+        return {
+            'pair': self.edges[row],
+            'value': self.claims[row],
+            'document': self.document_names[self.documents_of[row]],
+            'start': self.starts[row],
+            'end': self.ends[row]
+        }
+
+    def resolve(self, key: str) -> Dict:
+        """The citation's record with its evidence text, loading the document on demand"""
+        record = self.record(key)
+        text = self._texts.get(record['document'])
+        if text is None and self.documents is not None:
+            document = record['document']
+            text = self.documents(document) if callable(self.documents) else self.documents.get(document)
+            if text is not None:
+                self._texts.put(document, text)
+        end = record['end'] if record['end'] >= 0 else None
+        record['text'] = text[record['start']:end] if text is not None else None
+        return record
+
+class SeedResult:
+    """Neighbors and paths of one seed entity matched by a query"""
+    __slots__ = ('entity', 'type', 'neighbors', 'paths')
+
+    def __init__(self, entity: str, type: str, neighbors: Tuple[Neighbor, ...],
+                 paths: Tuple[Tuple[Step, ...], ...]):
+        self.entity = entity
+        self.type = type
+        self.neighbors = neighbors
+        self.paths = paths
+
+class QueryResult:
+    """Structured result of GraphRAG.analyze, rendered on demand
+
+    citations, set by GraphRAG.cite, maps an edge (frozenset of its two
+    entities) to the citation keys of its provenance.
+    """
+    __slots__ = ('query', 'seeds', 'cached', 'citations')
+
+    def __init__(self, query: str, seeds: Tuple[SeedResult, ...], cached: bool = False):
+        self.query = query
+        self.seeds = seeds
+        self.cached = cached
+        self.citations = None
+
+    def cite(self, source: str, target: str) -> str:
+        """' [c1, c4]' for a cited edge, '' otherwise"""
+        if not self.citations:
+            return ""
+        keys = self.citations.get(frozenset((source, target)))
+        return f" [{', '.join(keys)}]" if keys else ""
+
+    def render(self, renderer: str = 'text') -> str:
+        return RENDERERS[renderer](self)
+
+    def to_dict(self) -> Dict:
+        data = {
+            'query': self.query,
+            'seeds': [{
+                'entity': seed.entity,
+                'type': seed.type,
+                'neighbors': [list(neighbor) for neighbor in seed.neighbors],
+                'paths': [[list(step) for step in path] for path in seed.paths]
+            } for seed in self.seeds]
+        }
+        if self.citations:
+            data['citations'] = [sorted(edge) + [list(keys)] for edge, keys in self.citations.items()]
+        return data
+
+    def triples(self) -> List[Step]:
+        """Distinct relationship facts, in order of first appearance
+
+        Edges are undirected, so a fact reached from either end is kept once.
+        """
+        seen = {}
+        for seed in self.seeds:
+            steps = [Step(seed.entity, *neighbor) for neighbor in seed.neighbors]
+            steps.extend(step for path in seed.paths for step in path)
+            for step in steps:
+                key = (step.relationship, frozenset((step.source, step.target)))
+                seen.setdefault(key, step)
+        return list(seen.values())
+
+class PathSet:
+    """Prefix tree of traversal paths per seed entity
+
+    Each tree node maps a (relationship, entity) step to its subtree, so paths
+    sharing a prefix are stored once. Rendering states every relationship
+    fact once, even when several seeds reach it.
+    """
+    def __init__(self):
+        self.roots = OrderedDict()  # seed -> (type, tree)
+
+    @classmethod
+    def from_result(cls, result: QueryResult) -> 'PathSet':
+        path_set = cls()
+        for seed in result.seeds:
+            path_set.add_seed(seed.entity, seed.type)
+            for neighbor in seed.neighbors:
+                path_set.insert(seed.entity, [neighbor])
+            for path in seed.paths:
+                path_set.insert(seed.entity, [(step.relationship, step.target) for step in path])
+        return path_set
+
+    def add_seed(self, seed: str, node_type: str = 'concept'):
+        if seed not in self.roots:
+            self.roots[seed] = (node_type, {})
+
+    def insert(self, seed: str, steps: List[Tuple[str, str]]):
+        """Add a path given as (relationship, entity) steps starting at seed"""
+        node = self.roots[seed][1]
+        for step in steps:
+            node = node.setdefault(step, {})
+
+    def render(self) -> str:
+        if not self.roots:
+            return NO_RESULTS
+
+        lines = ["", "Knowledge Graph Analysis:"]
+        emitted = set()
+        for seed, (node_type, tree) in self.roots.items():
+            body = []
+            self._render_tree(seed, tree, 1, False, emitted, body)
+            if not body:
+                continue
+            header = f"• {seed}"
+            if node_type != 'concept':
+                header += f" ({node_type})"
+            lines.append("")
+            lines.append(header + ":")
+            lines.extend(body)
+        return "\n".join(lines) + "\n"
+
+    def _render_tree(self, subject: str, tree: Dict, depth: int, explicit: bool,
+                     emitted: set, lines: List[str]):
+        for (relationship, entity), subtree in tree.items():
+            fact = (relationship, frozenset((subject, entity)))
+            if fact in emitted:
+                # Already stated elsewhere: continue below with an explicit subject
+                self._render_tree(entity, subtree, depth, True, emitted, lines)
+                continue
+            emitted.add(fact)
+            prefix = f"{subject} " if explicit else ""
+            lines.append("  " * depth + f"- {prefix}{relationship} {entity}")
+            self._render_tree(entity, subtree, depth + 1, False, emitted, lines)
+
+# Optional relation fields kept as edge attributes
+EDGE_ATTRIBUTES = ('confidence', 'evidence')
+
+def edge_attributes(relation: Dict) -> Dict:
+    """The optional attributes (confidence, evidence count) an input relation carries"""
+    return {name: relation[name] for name in EDGE_ATTRIBUTES if name in relation}
+
+def edge_confidence(data: Dict) -> float:
+    """Confidence of an edge in [0, 1]
+
+    An explicit confidence wins; otherwise each piece of evidence
+    independently supports the edge with probability 0.5 (noisy-or), so
+    an unannotated relation, one mention, scores 0.5.
+    """
+    if 'confidence' in data:
+        return float(data['confidence'])
+    return 1.0 - 0.5 ** data.get('evidence', 1)
+
+def _intern_chunk(chunk: List[Dict]) -> Tuple:
+    """Intern one input chunk into local string tables and an (m, 3) edge array
+
+    Relations carrying edge attributes or provenance are also listed, in
+    input order, as (source, relationship, target, attributes, provenance). Runs in worker
+    processes for create_knowledge_graph_bulk.
+    """
+    import numpy as np
+    index = {}
+    rel_index = {}
+    type_ids = []
+    types = []
+    flat = []
+    annotated = []
+    for item in chunk:
+        source = index.setdefault(item['entity'], len(index))
+        type_ids.append(source)
+        types.append(item['type'])
+        for relation in item.get('related_to') or ():
+            flat.append(source)
+            flat.append(index.setdefault(relation['entity'], len(index)))
+            flat.append(rel_index.setdefault(relation['type'], len(rel_index)))
+            if len(relation) > 2:
+                attributes = edge_attributes(relation)
+                provenance = relation.get('provenance')
+                if attributes or provenance:
+                    annotated.append((item['entity'], relation['type'], relation['entity'],
+                                      attributes, provenance))
+    edges = np.array(flat, dtype=np.int64).reshape(-1, 3)
+    return list(index), np.array(type_ids, dtype=np.int64), types, edges, list(rel_index), annotated
+
+def _insertion_order(graph) -> List[Tuple[str, str]]:
+    """Edges in an order that reproduces every node's neighbor order
+
+    Consecutive neighbors of a node constrain their edges' relative order;
+    a topological sort of those constraints (Kahn) gives an insertion
+    order consistent with all adjacency lists. Both directions of an edge
+    share one attribute dict in networkx, so its identity keys the edge;
+    adjacency lists are laid out flat (-1 ends a list), so an edge's
+    successors are the entries after its two positions.
+    """
+    ids = {}
+    edges = []
+    first = []  # per edge: its position in the first and second adjacency list
+    second = []
+    pending = []
+    flat = []
+    for node, neighbors in graph._adj.items():
+        head = True
+        for neighbor, data in neighbors.items():
+            key = ids.get(id(data))
+            if key is None:
+                key = ids[id(data)] = len(edges)
+                edges.append((node, neighbor))
+                first.append(len(flat))
+                second.append(-1)
+                pending.append(0)
+            else:
+                second[key] = len(flat)
+            pending[key] += not head
+            flat.append(key)
+            head = False
+        flat.append(-1)
+    ready = deque(key for key, count in enumerate(pending) if count == 0)
+    order = []
+    while ready:
+        key = ready.popleft()
+        order.append(edges[key])
+        for position in (first[key], second[key]):
+            if position >= 0:
+                successor = flat[position + 1]
+                if successor >= 0:
+                    pending[successor] -= 1
+                    if pending[successor] == 0:
+                        ready.append(successor)
+    if len(order) < len(edges):
+        # Only possible after edge removals; keep the remaining edges anyway
+        order.extend(edge for key, edge in enumerate(edges) if pending[key] > 0)
+    return order
+
+NO_RESULTS = "No directly relevant information found in the knowledge graph."
+
+def render_text(result: QueryResult) -> str:
+    """The Knowledge Graph Analysis prose listing"""
+    if not result.seeds:
+        return NO_RESULTS
+    parts = ["\nKnowledge Graph Analysis:\n"]
+    for seed in result.seeds:
+        parts.append(f"\n• {seed.entity}")
+        if seed.type != 'concept':
+            parts.append(f" ({seed.type})")
+        parts.append(":\n")
+        
+        if seed.neighbors:
+            parts.append("  Direct relationships:\n")
+            for neighbor in seed.neighbors:
+                parts.append(f"   - {neighbor.relationship} {neighbor.entity}"
+                             f"{result.cite(seed.entity, neighbor.entity)}\n")
+        
+        if seed.paths:
+            parts.append("  Extended relationships:\n")
+            for path in seed.paths:
+                if len(path) > 1:
+                    path_str = " → ".join(f"{step.source} {step.relationship} {step.target}"
+                                          f"{result.cite(step.source, step.target)}"
+                                          for step in path)
+                    parts.append(f"   - {path_str}\n")
+    return "".join(parts)
+
+def render_compact(result: QueryResult) -> str:
+    """Prefix-tree listing stating each relationship once"""
+    return PathSet.from_result(result).render()
+
+def render_json(result: QueryResult) -> str:
+    return json.dumps(result.to_dict(), ensure_ascii=False)
+
+def render_triples(result: QueryResult) -> str:
+    """One 'source | relationship | target' line per distinct fact, for prompts"""
+    if not result.seeds:
+        return NO_RESULTS
+    return "\n".join(" | ".join(step) + result.cite(step.source, step.target)
+                     for step in result.triples())
+
+RENDERERS = {
+    'text': render_text,
+    'compact': render_compact,
+    'json': render_json,
+    'triples': render_triples,
+}
+
+class TraversalPolicy:
+    """Which edges query expansion may follow
+
+    relationships and node_types are each None (anything), a set (the same
+    at every hop) or a sequence of sets, one per hop from the seed, whose
+    last entry also covers deeper hops, e.g. node_types=({'protein'},
+    {'pathway'}) walks drug -> protein -> pathway. Edges and nodes outside
+    them are pruned as they are reached, so their subtrees are never
+    expanded. Untyped nodes have type 'concept'.
+    """
+    __slots__ = ('name', 'relationships', 'node_types')
+
+    def __init__(self, name: str, relationships=None, node_types=None):
+        self.name = name
+        self.relationships = self._per_hop(relationships)
+        self.node_types = self._per_hop(node_types)
+
+    @staticmethod
+    def _per_hop(allowed) -> Tuple[frozenset, ...]:
+        if allowed is None:
+            return None
+        if isinstance(allowed, (set, frozenset)):
+            allowed = (allowed,)
+        return tuple(frozenset(hop) for hop in allowed)
+
+    def allows(self, hop: int, relationship: str, node_type: str) -> bool:
+        """Whether the edge taken at hop (0 from the seed) onto a node of node_type is followed"""
+        return self.allows_relationship(hop, relationship) and self.allows_type(hop, node_type)
+
+    def allows_relationship(self, hop: int, relationship: str) -> bool:
+        return self.relationships is None or \
+            relationship in self.relationships[min(hop, len(self.relationships) - 1)]
+
+    def allows_type(self, hop: int, node_type: str) -> bool:
+        return self.node_types is None or \
+            node_type in self.node_types[min(hop, len(self.node_types) - 1)]
+
+    def __repr__(self):
+        return f"TraversalPolicy({self.name!r})"
+
+TRAVERSAL_POLICIES = {
+    'mechanism': TraversalPolicy(
+        'mechanism',
+        relationships={'targets', 'encoded_by', 'regulates', 'activates', 'inhibits',
+                       'promotes', 'leads_to', 'overexpresses', 'involved_in'},
+        node_types={'drug', 'protein', 'gene', 'pathway', 'cancer_type', 'concept'}),
+    'risk': TraversalPolicy(
+        'risk',
+        relationships={'causes', 'requires', 'increases', 'affects', 'associated_with', 'involved_in'},
+        node_types={'drug', 'side_effect', 'gene', 'cancer_type', 'concept'}),
+    'treatment': TraversalPolicy(
+        'treatment',
+        relationships={'treats', 'targets', 'inhibits', 'overexpresses', 'encoded_by', 'associated_with'},
+        node_types={'drug', 'protein', 'gene', 'cancer_type'}),
+}
+
+# Phrases voting for each intent; ties go to the earlier intent, 'general'
+# (no policy) wins when nothing more specific matches
+INTENT_KEYWORDS = {
+    'general': ('relationship between', 'related to', 'what is', 'overview'),
+    'risk': ('risk', 'side effect', 'toxicity', 'adverse', 'safety', 'danger'),
+    'mechanism': ('how does', 'pathway', 'mechanism', 'explain', 'signal', 'relate'),
+    'treatment': ('treat', 'therapy', 'effective', 'drug for', 'cure'),
+}
+
+def classify_intent(query: str) -> str:
+    """Intent of a question by keyword votes, multi-word phrases counting per word"""
+    query = query.lower()
+    votes = {intent: sum(len(phrase.split()) for phrase in phrases if phrase in query)
+             for intent, phrases in INTENT_KEYWORDS.items()}
+    intent = max(votes, key=votes.get)
+    return intent if votes[intent] else 'general'
+
+STOPWORDS = frozenset(('a', 'an', 'and', 'are', 'as', 'between', 'by', 'does', 'for', 'from',
+                       'how', 'in', 'is', 'main', 'of', 'on', 'or', 'the', 'to', 'what',
+                       'which', 'why', 'with'))
+
+CONJUNCTIONS = frozenset(('and', 'or', 'but', 'nor', 'while', 'whereas'))
+
+def _terms(text: str) -> set:
+    """Lower-cased content words of a text"""
+    return {term for term in re.findall(r"[a-z0-9]+", text.lower()) if term not in STOPWORDS}
+
+class CommunityIndex:
+    """Graph communities at several resolutions with precomputed summaries
+
+    levels[0] is the finest Louvain partition and levels[-1] the coarsest.
+    Built offline by GraphRAG.build_community_index and stored as JSON.
+    """
+    def __init__(self, levels: List[List[List[str]]], summaries: List[List[str]]):
+        self.levels = levels
+        self.summaries = summaries
+        self._terms = [[_terms(summary) for summary in level] for level in summaries]
+
+    def save(self, path: str):
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump({'levels': self.levels, 'summaries': self.summaries}, f, ensure_ascii=False)
+
+    @classmethod
+    def load(cls, path: str) -> 'CommunityIndex':
+        with open(path, encoding='utf-8') as f:
+            data = json.load(f)
+        return cls(data['levels'], data['summaries'])
+
+    def relevant(self, query: str, level: int = -1, limit: int = 5) -> List[int]:
+        """Communities at a level whose summaries share most terms with the query"""
+        query_terms = _terms(query)
+        scored = [(len(query_terms & terms), len(self.levels[level][i]), i)
+                  for i, terms in enumerate(self._terms[level])]
+        scored.sort(reverse=True)
+        matching = [i for overlap, _, i in scored if overlap]
+        # Nothing in common: fall back to the largest communities
+        return (matching or [i for _, _, i in scored])[:limit]
+
+class DistanceOracle:
+    """Landmark distance oracle over an unweighted graph in CSR form
+
+    A BFS tree is kept from each landmark (the highest-degree nodes): hop
+    distances and parents, as (n_nodes, n_landmarks) arrays. For nodes x, y
+    the triangle inequality bounds the distance by
+    max |d(x,l) - d(y,l)| <= d(x,y) <= min d(x,l) + d(l,y), which settles
+    most "within k hops" questions, and the best landmark's two tree paths
+    give an approximate shortest path, both in microseconds.
+    """
+    def __init__(self, indptr, indices, landmarks: int = 16):
+        import numpy as np
+        degree = np.diff(indptr)
+        self.landmarks = np.argsort(-degree, kind='stable')[:landmarks]
+        self.distance = np.full((len(degree), len(self.landmarks)), -1, dtype=np.int16)
+        self.parent = np.full((len(degree), len(self.landmarks)), -1, dtype=np.int32)
+        for j, landmark in enumerate(self.landmarks.tolist()):
+            self._bfs(indptr, indices, landmark, j)
+
+    def _bfs(self, indptr, indices, root: int, j: int):
+        """Level-synchronous BFS with the whole frontier expanded by array ops"""
+        import numpy as np
+        distance = self.distance[:, j]
+        parent = self.parent[:, j]
+        distance[root] = 0
+        frontier = np.array([root])
+        level = 0
+        while len(frontier):
+            level += 1
+            starts = indptr[frontier]
+            counts = indptr[frontier + 1] - starts
+            # Positions of every frontier node's neighbors in indices
+            offsets = np.repeat(starts - np.cumsum(counts) + counts, counts)
+            positions = offsets + np.arange(int(counts.sum()))
+            neighbors = indices[positions]
+            sources = np.repeat(frontier, counts)
+            new = distance[neighbors] < 0
+            neighbors, first = np.unique(neighbors[new], return_index=True)
+            distance[neighbors] = level
+            parent[neighbors] = sources[new][first]
+            frontier = neighbors
+
+    def bounds(self, x: int, y: int) -> Tuple[float, float]:
+        """Lower and upper bound of the hop distance between node ids x and y"""
+        import numpy as np
+        dx = self.distance[x].astype(np.int32)
+        dy = self.distance[y].astype(np.int32)
+        reached_x = dx >= 0
+        reached_y = dy >= 0
+        if (reached_x != reached_y).any():
+            return float('inf'), float('inf')  # a landmark reaches only one: different components
+        both = reached_x & reached_y
+        if not both.any():
+            return 0.0, float('inf')
+        return float(np.abs(dx - dy)[both].max()), float((dx + dy)[both].min())
+
+    def within(self, x: int, y: int, k: int):
+        """True/False when the bounds decide d(x, y) <= k, None when they do not"""
+        lower, upper = self.bounds(x, y)
+        if upper <= k:
+            return True
+        if lower > k:
+            return False
+        return None
+
+    def path(self, x: int, y: int) -> List[int]:
+        """Node ids of x -> best landmark -> y, shortcut where the tree paths meet"""
+        import numpy as np
+        total = self.distance[x].astype(np.int32) + self.distance[y]
+        total[(self.distance[x] < 0) | (self.distance[y] < 0)] = np.iinfo(np.int32).max
+        if not len(total) or total.min() == np.iinfo(np.int32).max:
+            return []
+        j = int(total.argmin())
+        up = self._to_root(x, j)
+        down = self._to_root(y, j)
+        # Both paths end at the landmark; join them at their first common node
+        positions = {node: i for i, node in enumerate(down)}
+        for i, node in enumerate(up):
+            if node in positions:
+                return up[:i] + down[positions[node]::-1]
+        return []
+
+    def _to_root(self, node: int, j: int) -> List[int]:
+        path = [node]
+        parent = self.parent[:, j]
+        while parent[path[-1]] >= 0:
+            path.append(int(parent[path[-1]]))
+        return path
+
+class ClaimVerifier:
+    """Checks (entity, relation, entity) claims in generated answers against the graph
+
+    Entity mentions are found by looking up word n-grams of the answer in a
+    lower-cased name index (graph entities plus resolver aliases); two
+    mentions adjacent in a sentence, with at least one content word between
+    them, form a claim whose relation is that text. Text opening with a
+    coordinating conjunction continues the previous claim's subject, so
+    "A treats B and causes C" claims (A, causes, C), and "A treats B and C"
+    claims (A, treats, C), not a relation between B and C. A claim is supported
+    when the graph has an edge between the two entities (one hash lookup)
+    and its relationship shares a word stem with the relation text, stated
+    in the edge's ingest direction; reversed when it matches the other way
+    round ("HER2 targets Trastuzumab"), unless the relationship is one of
+    SYMMETRIC; relation_mismatch when the edge exists with another
+    relationship; and unsupported when the entities are not adjacent in the
+    graph. Edges without a direction (store-backed views, edges added to kg
+    directly) are matched either way round.
+    """
+    SYMMETRIC = frozenset(('associated_with', 'interacts_with'))
+
+    def __init__(self, graphrag: 'GraphRAG', max_gap: int = 8):
+        self.graphrag = graphrag
+        self.max_gap = max_gap
+        self._word = re.compile(r"[A-Za-z0-9][\w\-]*")
+        self._sentence = re.compile(r"[^.!?;\n]+")
+        names = graphrag.store.labels() if graphrag.store is not None else list(graphrag.kg)
+        self.names = {}
+        for name in names:
+            self.names.setdefault(self._key(name), name)
+        for alias, entity in graphrag.aliases.items():
+            self.names.setdefault(self._key(alias), entity)
+        self.max_words = max((key.count(' ') + 1 for key in self.names), default=1)
+        self.version = graphrag.version
+
+    def _key(self, text: str) -> str:
+        return " ".join(self._word.findall(text.lower()))
+
+    def extract(self, answer: str) -> List[Claim]:
+        """Claims between consecutive entity mentions of each sentence"""
+        claims = []
+        for sentence in self._sentence.finditer(answer):
+            words = [(match.group().lower(), match.start(), match.end())
+                     for match in self._word.finditer(sentence.group())]
+            mentions = []
+            i = 0
+            while i < len(words):
+                # Longest name starting at word i
+                for n in range(min(self.max_words, len(words) - i), 0, -1):
+                    entity = self.names.get(" ".join(word for word, _, _ in words[i:i + n]))
+                    if entity is not None:
+                        mentions.append((entity, i, i + n))
+                        i += n
+                        break
+                else:
+                    i += 1
+            subject = None  # (source, relation) of the sentence's last claim
+            for (source, _, end), (target, start, _) in zip(mentions, mentions[1:]):
+                between = [word for word, _, _ in words[end:start]]
+                if between and between[0] in CONJUNCTIONS:
+                    # Shared subject: "A treats B and [causes] C"
+                    if subject is None:
+                        continue
+                    source, relation = subject
+                    between = between[1:] or relation.split()
+                if source != target and len(between) <= self.max_gap and \
+                        any(word not in STOPWORDS for word in between):
+                    claims.append(Claim(source, " ".join(between), target))
+                    subject = (source, claims[-1].relation)
+                else:
+                    subject = None
+        return claims
+
+    def check(self, claim: Claim) -> Tuple[str, str]:
+        """(status, graph relationship or None) of one claim"""
+        triple = self.graphrag.triples.get(claim.source, claim.target)
+        if triple is not None:
+            relationship = triple.relationship
+        else:
+            relationship = self.graphrag._relationship(claim.source, claim.target)
+            if relationship is None:
+                return 'unsupported', None
+        stems = {word[:4] for word in self._word.findall(relationship.lower().replace('_', ' '))
+                 if word not in STOPWORDS and len(word) >= 4}
+        if not any(word[:4] in stems for word in claim.relation.split() if len(word) >= 4):
+            return 'relation_mismatch', relationship
+        if triple is not None and triple.source != claim.source and relationship not in self.SYMMETRIC:
+            return 'reversed', relationship
+        return 'supported', relationship
+
+    def verify(self, answer: str) -> Dict:
+        """Claims of one answer by status, with the support ratio and check latency"""
+        start = time.perf_counter()
+        result = {'supported': [], 'reversed': [], 'relation_mismatch': [], 'unsupported': []}
+        claims = self.extract(answer)
+        for claim in claims:
+            result[self.check(claim)[0]].append(claim)
+        result['claims'] = len(claims)
+        result['support_ratio'] = len(result['supported']) / len(claims) if claims else 1.0
+        result['latency_ms'] = (time.perf_counter() - start) * 1000
+        return result
+
+    def verify_batch(self, answers: List[str]) -> List[Dict]:
+        """verify() over many answers, sharing one name index"""
+        return [self.verify(answer) for answer in answers]
+
+class GraphColumns:
+    """Read-only columnar graph backed by memory-mapped files
+
+    Node labels are a newline-separated UTF-8 string table with offsets (plus
+    a lower-cased copy for substring seed matching), node types and edge
+    relationships are int16 category codes, and adjacency is CSR in the
+    graph's neighbor order. Everything is opened with mmap, so worker
+    processes share the page cache instead of holding their own copies.
+    """
+    ARRAYS = ('indptr', 'indices', 'relationship_codes', 'type_codes',
+              'label_offsets', 'lower_offsets', 'sorted_ids')
+
+    def __init__(self, path: str):
+        import numpy as np
+        with open(os.path.join(path, 'meta.json'), encoding='utf-8') as f:
+            meta = json.load(f)
+        self.type_categories = meta['types']
+        self.relationship_categories = meta['relationships']
+        for name in self.ARRAYS:
+            setattr(self, name, np.load(os.path.join(path, f"{name}.npy"), mmap_mode='r'))
+        self._labels = self._map(os.path.join(path, 'labels.bin'))
+        self._lower = self._map(os.path.join(path, 'labels_lower.bin'))
+
+    @staticmethod
+    def _map(path: str):
+        with open(path, 'rb') as f:
+            if os.fstat(f.fileno()).st_size == 0:
+                return b""
+            return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    @staticmethod
+    def write(graph, path: str):
+        import numpy as np
+        os.makedirs(path, exist_ok=True)
+        nodes = list(graph)
+        index = {node: i for i, node in enumerate(nodes)}
+        types = {}
+        relationships = {}
+        type_codes = np.fromiter(
+            (types.setdefault(data['type'], len(types)) if 'type' in data else -1
+             for _, data in graph.nodes(data=True)), dtype=np.int16, count=len(nodes))
+        adj = graph.adj
+        degree = np.fromiter((len(adj[node]) for node in nodes), dtype=np.int64, count=len(nodes))
+        indptr = np.zeros(len(nodes) + 1, dtype=np.int64)
+        np.cumsum(degree, out=indptr[1:])
+        indices = np.fromiter((index[neighbor] for node in nodes for neighbor in adj[node]),
+                              dtype=np.int32, count=int(indptr[-1]))
+        relationship_codes = np.fromiter(
+            (relationships.setdefault(data.get('relationship', 'related'), len(relationships))
+             for node in nodes for data in adj[node].values()),
+            dtype=np.int16, count=int(indptr[-1]))
+
+        encoded = [node.encode('utf-8') for node in nodes]
+        lower = [node.lower().encode('utf-8') for node in nodes]
+        arrays = {
+            'indptr': indptr,
+            'indices': indices,
+            'relationship_codes': relationship_codes,
+            'type_codes': type_codes,
+            'label_offsets': GraphColumns._offsets(encoded),
+            'lower_offsets': GraphColumns._offsets(lower),
+            'sorted_ids': np.array(sorted(range(len(nodes)), key=encoded.__getitem__), dtype=np.int64)
+        }
+        for name, column in arrays.items():
+            np.save(os.path.join(path, f"{name}.npy"), column)
+        for filename, labels in (('labels.bin', encoded), ('labels_lower.bin', lower)):
+            with open(os.path.join(path, filename), 'wb') as f:
+                f.write(b"".join(label + b"\n" for label in labels))
+        with open(os.path.join(path, 'meta.json'), 'w', encoding='utf-8') as f:
+            json.dump({'types': list(types), 'relationships': list(relationships)}, f)
+
+    @staticmethod
+    def _offsets(labels: List[bytes]):
+        import numpy as np
+        offsets = np.zeros(len(labels) + 1, dtype=np.int64)
+        np.cumsum([len(label) + 1 for label in labels], out=offsets[1:])
+        return offsets
+
+    def __len__(self):
+        return len(self.indptr) - 1
+
+    def label(self, i: int) -> str:
+        return self._labels[self.label_offsets[i]:self.label_offsets[i + 1] - 1].decode('utf-8')
+
+    def labels(self) -> List[str]:
+        return [self.label(i) for i in range(len(self))]
+
+    def csr(self) -> Tuple:
+        return self.indptr, self.indices
+
+    def relationships(self) -> List[str]:
+        """Relationship of each csr() entry, in the same order"""
+        categories = self.relationship_categories
+        return [categories[code] for code in self.relationship_codes.tolist()]
+
+    def index_of(self, name: str) -> int:
+        """Node id by binary search over the byte-sorted label order"""
+        target = name.encode('utf-8')
+        low, high = 0, len(self)
+        while low < high:
+            mid = (low + high) // 2
+            i = self.sorted_ids[mid]
+            if self._labels[self.label_offsets[i]:self.label_offsets[i + 1] - 1] < target:
+                low = mid + 1
+            else:
+                high = mid
+        if low < len(self):
+            i = int(self.sorted_ids[low])
+            if self.label(i) == name:
+                return i
+        raise KeyError(name)
+
+    def node_type(self, name: str) -> str:
+        code = self.type_codes[self.index_of(name)]
+        return self.type_categories[code] if code >= 0 else 'concept'
+
+    def neighbors(self, name: str) -> List[Tuple[str, str]]:
+        i = self.index_of(name)
+        start, end = self.indptr[i], self.indptr[i + 1]
+        return [(self.label(j), self.relationship_categories[r])
+                for j, r in zip(self.indices[start:end].tolist(), self.relationship_codes[start:end].tolist())]
+
+    def find_nodes(self, terms: List[str], extra: Iterable[str] = ()) -> List[str]:
+        """Labels containing any term (case-insensitive), in node order
+
+        Scans the lower-cased string table with mmap.find; each hit is mapped
+        to its node by binary search on the offsets.
+        """
+        import numpy as np
+        hits = set()
+        for term in terms:
+            needle = term.lower().encode('utf-8')
+            if not needle or b"\n" in needle:
+                continue
+            position = self._lower.find(needle)
+            while position != -1:
+                node = int(np.searchsorted(self.lower_offsets, position, side='right')) - 1
+                hits.add(node)
+                position = self._lower.find(needle, int(self.lower_offsets[node + 1]))
+        for name in extra:
+            try:
+                hits.add(self.index_of(name))
+            except KeyError:
+                continue
+        return [self.label(i) for i in sorted(hits)]
+
+class SQLiteGraphStore:
+    """Disk-resident graph in SQLite for graphs that do not fit in memory
+
+    Nodes are keyed by name; each undirected edge is stored once in its
+    ingest direction, with indexes on (source, relationship) and (target)
+    and a unique index on the unordered pair so re-adding an edge updates
+    its relationship, as networkx does. Neighbor lists are read in edge
+    insertion order, matching networkx adjacency order, and hot lists are
+    kept in a small LRU cache.
+    """
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS nodes (
+            id INTEGER PRIMARY KEY,
+            name TEXT NOT NULL UNIQUE,
+            name_lower TEXT NOT NULL,
+            type TEXT
+        );
+        CREATE TABLE IF NOT EXISTS edges (
+            source TEXT NOT NULL,
+            relationship TEXT NOT NULL,
+            target TEXT NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS edges_source_relationship ON edges (source, relationship);
+        CREATE INDEX IF NOT EXISTS edges_target ON edges (target);
+        CREATE UNIQUE INDEX IF NOT EXISTS edges_pair ON edges (min(source, target), max(source, target));
+    """
+
+    def __init__(self, path: str, adjacency_cache: int = 10000, page_cache_kb: int = 65536):
+        self.path = path
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.db.executescript(self.SCHEMA)
+        self.db.execute(f"PRAGMA cache_size = -{int(page_cache_kb)}")
+        self.adjacency_cache = adjacency_cache
+        self._adjacency = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    @classmethod
+    def from_graph(cls, graph, path: str, **kwargs) -> 'SQLiteGraphStore':
+        """Copy a networkx graph into a new SQLite file"""
+        store = cls(path, **kwargs)
+        with store.db:
+            store.db.executemany(
+                "INSERT INTO nodes (name, name_lower, type) VALUES (?, ?, ?) "
+                "ON CONFLICT (name) DO UPDATE SET type = excluded.type",
+                ((node, node.lower(), data.get('type')) for node, data in graph.nodes(data=True)))
+            store.db.executemany(
+                "INSERT OR REPLACE INTO edges (source, relationship, target) VALUES (?, ?, ?)",
+                ((u, graph.adj[u][v].get('relationship', 'related'), v)
+                 for u, v in _insertion_order(graph)))
+        return store
+
+    def ingest(self, data: Iterable[Dict], batch_size: int = 10000):
+        """Stream knowledge base items straight to disk, as create_knowledge_graph would"""
+        nodes = []
+        edges = []
+        for item in data:
+            nodes.append((item['entity'], item['entity'].lower(), item['type']))
+            for relation in item.get('related_to') or ():
+                nodes.append((relation['entity'], relation['entity'].lower(), None))
+                edges.append((item['entity'], relation['type'], relation['entity']))
+            if len(nodes) >= batch_size:
+                self._write(nodes, edges)
+                nodes, edges = [], []
+        self._write(nodes, edges)
+        self._adjacency.clear()
+
+    def _write(self, nodes: List[Tuple], edges: List[Tuple]):
+        with self.db:
+            # A typed row sets the type; an untyped mention never clears it
+            self.db.executemany(
+                "INSERT INTO nodes (name, name_lower, type) VALUES (?, ?, ?) "
+                "ON CONFLICT (name) DO UPDATE SET type = coalesce(excluded.type, type)", nodes)
+            self.db.executemany(
+                "INSERT INTO edges (source, relationship, target) VALUES (?, ?, ?) "
+                "ON CONFLICT (min(source, target), max(source, target)) "
+                "DO UPDATE SET relationship = excluded.relationship", edges)
+
+    def __len__(self):
+        return self.db.execute("SELECT count(*) FROM nodes").fetchone()[0]
+
+    def neighbors(self, name: str) -> List[Tuple[str, str]]:
+        if name in self._adjacency:
+            self._adjacency.move_to_end(name)
+            self.hits += 1
+            return self._adjacency[name]
+        self.misses += 1
+        rows = self.db.execute(
+            "SELECT rowid, target, relationship FROM edges WHERE source = ? "
+            "UNION ALL SELECT rowid, source, relationship FROM edges WHERE target = ? AND source != ? "
+            "ORDER BY 1", (name, name, name)).fetchall()
+        neighbors = [(neighbor, relationship) for _, neighbor, relationship in rows]
+        self._adjacency[name] = neighbors
+        if len(self._adjacency) > self.adjacency_cache:
+            self._adjacency.popitem(last=False)
+        return neighbors
+
+    def node_type(self, name: str) -> str:
+        row = self.db.execute("SELECT type FROM nodes WHERE name = ?", (name,)).fetchone()
+        if row is None:
+            raise KeyError(name)
+        return row[0] or 'concept'
+
+    def find_nodes(self, terms: List[str], extra: Iterable[str] = ()) -> List[str]:
+        """Names containing any term (case-insensitive) or listed in extra, in node order"""
+        terms = [term.lower() for term in terms if term]
+        extra = list(extra)
+        if not terms and not extra:
+            return []
+        clauses = ["instr(name_lower, ?) > 0"] * len(terms) + ["name = ?"] * len(extra)
+        rows = self.db.execute(f"SELECT name FROM nodes WHERE {' OR '.join(clauses)} ORDER BY id",
+                               terms + extra).fetchall()
+        return [row[0] for row in rows]
+
+    def labels(self) -> List[str]:
+        return [row[0] for row in self.db.execute("SELECT name FROM nodes ORDER BY id")]
+
+    def csr(self) -> Tuple:
+        """Adjacency in labels() order, for matrix-based ranking"""
+        import numpy as np
+        index = {name: i for i, name in enumerate(self.labels())}
+        adjacency = [[] for _ in index]
+        for source, target in self.db.execute("SELECT source, target FROM edges ORDER BY rowid"):
+            adjacency[index[source]].append(index[target])
+            if source != target:
+                adjacency[index[target]].append(index[source])
+        indptr = np.zeros(len(index) + 1, dtype=np.int64)
+        np.cumsum([len(row) for row in adjacency], out=indptr[1:])
+        indices = np.fromiter((j for row in adjacency for j in row), dtype=np.int64, count=int(indptr[-1]))
+        return indptr, indices
+
+    def relationships(self) -> List[str]:
+        """Relationship of each csr() entry, in the same order, from one scan of the edges"""
+        index = {name: i for i, name in enumerate(self.labels())}
+        adjacency = [[] for _ in index]
+        for source, relationship, target in self.db.execute(
+                "SELECT source, relationship, target FROM edges ORDER BY rowid"):
+            adjacency[index[source]].append(relationship)
+            if source != target:
+                adjacency[index[target]].append(relationship)
+        return [relationship for row in adjacency for relationship in row]
+
+    def cache_stats(self) -> Dict:
+        lookups = self.hits + self.misses
+        return {'size': len(self._adjacency), 'hits': self.hits, 'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0}
+
+    def close(self):
+        self.db.close()
+
+class Neo4jBulkFiles:
+    """Neo4j import files: neo4j-admin bulk-import CSVs and Cypher UNWIND batches
+
+    nodes.csv and relationships.csv follow the neo4j-admin header format
+    (name:ID, :LABEL / :START_ID, :END_ID, :TYPE) for
+
+        neo4j-admin database import full --nodes=nodes.csv --relationships=relationships.csv
+
+    and import.cypher holds the same graph as batched UNWIND statements for
+    cypher-shell on a running database. Every node is labelled Entity plus
+    its type; the original type and relationship strings, and the edges'
+    EDGE_ATTRIBUTES, are kept as properties so read() restores the graph
+    exactly (non-finite attribute values, which neither import accepts, are
+    written as null). Labels and relationship types are backtick-quoted in
+    Cypher. Rows are written as they are generated, in an edge order that
+    reproduces neighbor order.
+    """
+    NODES = 'nodes.csv'
+    RELATIONSHIPS = 'relationships.csv'
+    CYPHER = 'import.cypher'
+
+    @staticmethod
+    def label(node_type: str) -> str:
+        """Neo4j label for a node type, e.g. cancer_type -> CancerType"""
+        return "".join(part.capitalize() for part in re.split(r'\W+|_', node_type) if part)
+
+    @staticmethod
+    def relationship_type(relationship: str) -> str:
+        """Neo4j relationship type, e.g. is part of -> IS_PART_OF"""
+        return re.sub(r'\W+', '_', relationship).strip('_').upper() or 'RELATED'
+
+    @staticmethod
+    def write(graph, path: str, batch_size: int = 1000):
+        os.makedirs(path, exist_ok=True)
+        adj = graph._adj
+        edges = [(u, v, adj[u][v].get('relationship', 'related'), edge_attributes(adj[u][v]))
+                 for u, v in _insertion_order(graph)]
+        labels = {}
+        types = {}
+        for node_type in {data.get('type', '') for _, data in graph.nodes(data=True)}:
+            labels[node_type] = ";".join(filter(None, ('Entity', Neo4jBulkFiles.label(node_type))))
+        for relationship in {relationship for _, _, relationship, _ in edges}:
+            types[relationship] = Neo4jBulkFiles.relationship_type(relationship)
+
+        with open(os.path.join(path, Neo4jBulkFiles.NODES), 'w', newline='', encoding='utf-8') as f:
+            writer = csv.writer(f)
+            writer.writerow(['name:ID', 'type', ':LABEL'])
+            writer.writerows((node, data.get('type', ''), labels[data.get('type', '')])
+                             for node, data in graph.nodes(data=True))
+        with open(os.path.join(path, Neo4jBulkFiles.RELATIONSHIPS), 'w', newline='', encoding='utf-8') as f:
+            writer = csv.writer(f)
+            writer.writerow([':START_ID', ':END_ID', ':TYPE', 'relationship', 'confidence:float', 'evidence:int'])
+            def cell(value):
+                value = Neo4jBulkFiles._finite(value)
+                return '' if value is None else value
+            writer.writerows((u, v, types[relationship], relationship,
+                              cell(attributes.get('confidence')), cell(attributes.get('evidence')))
+                             for u, v, relationship, attributes in edges)
+        with open(os.path.join(path, Neo4jBulkFiles.CYPHER), 'w', encoding='utf-8') as f:
+            f.write("CREATE CONSTRAINT entity_name IF NOT EXISTS FOR (n:Entity) REQUIRE n.name IS UNIQUE;\n")
+            Neo4jBulkFiles._write_batches(
+                f, ((data.get('type', ''), {'name': node, 'type': data.get('type')})
+                    for node, data in graph.nodes(data=True)),
+                Neo4jBulkFiles._merge_nodes, batch_size)
+            Neo4jBulkFiles._write_batches(
+                f, ((relationship, {'source': u, 'target': v, 'relationship': relationship, **attributes})
+                    for u, v, relationship, attributes in edges),
+                Neo4jBulkFiles._merge_relationships, batch_size)
+
+    @staticmethod
+    def _write_batches(f, rows: Iterable[Tuple[str, Dict]], statement, batch_size: int):
+        """Buffer rows per group (node type or relationship) and flush full batches"""
+        buffers = {}
+        for group, row in rows:
+            buffer = buffers.setdefault(group, [])
+            buffer.append(row)
+            if len(buffer) >= batch_size:
+                f.write(statement(group, buffer))
+                buffer.clear()
+        for group, buffer in buffers.items():
+            if buffer:
+                f.write(statement(group, buffer))
+
+    @staticmethod
+    def _finite(value):
+        """value, or None (written as null) for the inf/nan floats Cypher and CSV imports reject"""
+        return None if isinstance(value, float) and not math.isfinite(value) else value
+
+    @staticmethod
+    def _literal(value) -> str:
+        # JSON string escapes are valid Cypher string literals
+        if isinstance(value, str):
+            return encode_basestring(value)
+        if isinstance(value, bool):
+            return 'true' if value else 'false'
+        return repr(value)
+
+    @staticmethod
+    def _unwind(rows: List[Dict]) -> str:
+        finite, literal = Neo4jBulkFiles._finite, Neo4jBulkFiles._literal
+        maps = ("{" + ", ".join(f"{key}: {literal(value)}"
+                                for key, value in row.items() if finite(value) is not None) + "}"
+                for row in rows)
+        return "UNWIND [" + ", ".join(maps) + "] AS row\n"
+
+    @staticmethod
+    def _quote(name: str) -> str:
+        """Backtick-quoted label or relationship type, safe for any characters"""
+        return "`" + name.replace("`", "``") + "`"
+
+    @staticmethod
+    def _merge_nodes(node_type: str, rows: List[Dict]) -> str:
+        label = Neo4jBulkFiles.label(node_type)
+        statement = Neo4jBulkFiles._unwind(rows) + "MERGE (n:Entity {name: row.name})"
+        if label:
+            statement += f" SET n:{Neo4jBulkFiles._quote(label)}, n.type = row.type"
+        return statement + ";\n"
+
+    @staticmethod
+    def _merge_relationships(relationship: str, rows: List[Dict]) -> str:
+        relationship_type = Neo4jBulkFiles._quote(Neo4jBulkFiles.relationship_type(relationship))
+        return (Neo4jBulkFiles._unwind(rows) +
+                "MATCH (a:Entity {name: row.source}), (b:Entity {name: row.target})\n"
+                f"MERGE (a)-[r:{relationship_type}]->(b) "
+                "SET r.relationship = row.relationship, r.confidence = row.confidence, "
+                "r.evidence = row.evidence;\n")
+
+    @staticmethod
+    def read(path: str) -> Tuple[Iterator[Tuple[str, str]], Iterator[Tuple[str, str, str, Dict]]]:
+        """Lazy (name, type) and (source, relationship, target, attributes) rows from the CSVs
+
+        Columns are found by header, so files exported from Neo4j with other
+        column orders or extra properties load too; without a relationship
+        property the :TYPE is lower-cased. attributes holds the edge's
+        non-empty confidence and evidence columns.
+        """
+        def rows(filename):
+            with open(os.path.join(path, filename), newline='', encoding='utf-8') as f:
+                reader = csv.reader(f)
+                header = []
+                for column in next(reader):
+                    name, _, kind = column.partition(':')
+                    kind = kind.split('(')[0]  # name:ID(Entity) id spaces
+                    header.append(kind if kind in ('ID', 'START_ID', 'END_ID', 'TYPE', 'LABEL') else name)
+                for row in reader:
+                    yield dict(zip(header, row))
+
+        def attributes(row):
+            found = {}
+            if row.get('confidence'):
+                found['confidence'] = float(row['confidence'])
+            if row.get('evidence'):
+                found['evidence'] = int(row['evidence'])
+            return found
+
+        nodes = ((row['ID'], row.get('type', '')) for row in rows(Neo4jBulkFiles.NODES))
+        edges = ((row['START_ID'], row.get('relationship') or row['TYPE'].lower(), row['END_ID'], attributes(row))
+                 for row in rows(Neo4jBulkFiles.RELATIONSHIPS))
+        return nodes, edges
+
+    @staticmethod
+    def validate(path: str) -> Dict:
+        """Offline checks that neo4j-admin would enforce: unique ids, no dangling endpoints"""
+        nodes, edges = Neo4jBulkFiles.read(path)
+        ids = set()
+        duplicates = 0
+        for name, _ in nodes:
+            duplicates += name in ids
+            ids.add(name)
+        relationships = 0
+        dangling = 0
+        for source, _, target, _ in edges:
+            relationships += 1
+            dangling += (source not in ids) + (target not in ids)
+        with open(os.path.join(path, Neo4jBulkFiles.CYPHER), encoding='utf-8') as f:
+            statements = sum(line.rstrip().endswith(';') for line in f)
+        return {'nodes': len(ids), 'relationships': relationships, 'duplicate_ids': duplicates,
+                'dangling_endpoints': dangling, 'cypher_statements': statements,
+                'valid': duplicates == 0 and dangling == 0}
+
+class GraphSnapshot:
+    """Immutable version of the graph sharing unchanged structure with its predecessor
+
+    Nodes are numbered in order of first appearance and kept in buckets of
+    BUCKET_SIZE consecutive numbers, each mapping node -> (attributes,
+    {neighbor: edge data}) copied from the graph. A new snapshot copies the
+    list of buckets and rebuilds only the buckets holding nodes touched
+    since the previous one, so it costs the size of the delta; untouched
+    buckets and node records are shared, which also lets diff skip them by
+    identity. Offers the read-only store interface (neighbors, node_type,
+    find_nodes, labels, csr, relationships) for querying through GraphRAG.at.
+    """
+    BUCKET_SIZE = 256
+
+    def __init__(self, label: str, version: int, buckets: List[Dict], sequence: Dict[str, int]):
+        self.label = label
+        self.version = version
+        self.buckets = buckets
+        self.sequence = sequence  # node -> number, append-only and shared by all snapshots
+
+    @classmethod
+    def capture(cls, graph, label: str, version: int, previous: 'GraphSnapshot' = None,
+                touched: Iterable[str] = None) -> 'GraphSnapshot':
+        """Snapshot graph; with a previous snapshot only the touched nodes are copied"""
+        if previous is None:
+            sequence = {}
+            buckets = []
+            touched = graph._node
+        else:
+            sequence = previous.sequence
+            buckets = list(previous.buckets)
+        copied = set()
+        for node in touched:
+            number = sequence.get(node)
+            if number is None:
+                if node not in graph._node:
+                    continue
+                number = sequence[node] = len(sequence)
+            b = number // cls.BUCKET_SIZE
+            if b == len(buckets):
+                buckets.append({})
+                copied.add(b)
+            elif b not in copied:
+                buckets[b] = dict(buckets[b])
+                copied.add(b)
+            if node in graph._node:
+                buckets[b][node] = (dict(graph._node[node]),
+                                    {neighbor: dict(data) for neighbor, data in graph._adj[node].items()})
+            else:
+                buckets[b].pop(node, None)
+        return cls(label, version, buckets, sequence)
+
+    def __len__(self):
+        return sum(map(len, self.buckets))
+
+    def _record(self, name: str) -> Tuple[Dict, Dict]:
+        number = self.sequence.get(name)
+        record = self.buckets[number // self.BUCKET_SIZE].get(name) \
+            if number is not None and number // self.BUCKET_SIZE < len(self.buckets) else None
+        if record is None:
+            raise KeyError(name)
+        return record
+
+    def __contains__(self, name: str) -> bool:
+        try:
+            self._record(name)
+        except KeyError:
+            return False
+        return True
+
+    def number_of_edges(self) -> int:
+        return sum(len(adjacency) for bucket in self.buckets for _, adjacency in bucket.values()) // 2
+
+    def labels(self) -> List[str]:
+        return [node for bucket in self.buckets for node in bucket]
+
+    def csr(self) -> Tuple:
+        import numpy as np
+        nodes = self.labels()
+        index = {node: i for i, node in enumerate(nodes)}
+        records = [record for bucket in self.buckets for record in bucket.values()]
+        indptr = np.zeros(len(nodes) + 1, dtype=np.int64)
+        np.cumsum([len(adjacency) for _, adjacency in records], out=indptr[1:])
+        indices = np.fromiter((index[neighbor] for _, adjacency in records for neighbor in adjacency),
+                              dtype=np.int64, count=int(indptr[-1]))
+        return indptr, indices
+
+    def relationships(self) -> List[str]:
+        """Relationship of each csr() entry, in the same order"""
+        return [data.get('relationship', 'related') for bucket in self.buckets
+                for _, adjacency in bucket.values() for data in adjacency.values()]
+
+    def node_type(self, name: str) -> str:
+        return self._record(name)[0].get('type', 'concept')
+
+    def neighbors(self, name: str) -> List[Tuple[str, str]]:
+        return [(neighbor, data.get('relationship', 'related'))
+                for neighbor, data in self._record(name)[1].items()]
+
+    def find_nodes(self, terms: List[str], extra: Iterable[str] = ()) -> List[str]:
+        """Nodes whose names contain any term (case-insensitive) or are in extra, in node order"""
+        extra = set(extra)
+        return [node for node in self.labels()
+                if node in extra or any(term in node.lower() for term in terms)]
+
+    def diff(self, other: 'GraphSnapshot') -> Dict[str, List]:
+        """Changes from this snapshot to other (a later or earlier one of the same graph)
+
+        Edges are reported once, from their earlier-numbered end, as Steps;
+        changed edges as (Step, {attribute: (old, new)}).
+        """
+        changes = {'added_nodes': [], 'removed_nodes': [], 'retyped_nodes': [],
+                   'added_edges': [], 'removed_edges': [], 'changed_edges': []}
+        empty = {}
+        for b in range(max(len(self.buckets), len(other.buckets))):
+            old = self.buckets[b] if b < len(self.buckets) else empty
+            new = other.buckets[b] if b < len(other.buckets) else empty
+            if old is new:
+                continue
+            for node in list(old) + [node for node in new if node not in old]:
+                before, after = old.get(node), new.get(node)
+                if before is after:
+                    continue
+                if before is None:
+                    changes['added_nodes'].append(node)
+                elif after is None:
+                    changes['removed_nodes'].append(node)
+                elif before[0].get('type') != after[0].get('type'):
+                    changes['retyped_nodes'].append((node, before[0].get('type'), after[0].get('type')))
+                old_edges = before[1] if before else empty
+                new_edges = after[1] if after else empty
+                number = self.sequence[node]
+                for neighbor in list(old_edges) + [neighbor for neighbor in new_edges if neighbor not in old_edges]:
+                    if self.sequence[neighbor] < number:
+                        continue
+                    was, now = old_edges.get(neighbor), new_edges.get(neighbor)
+                    if was is None:
+                        changes['added_edges'].append(Step(node, now.get('relationship', 'related'), neighbor))
+                    elif now is None:
+                        changes['removed_edges'].append(Step(node, was.get('relationship', 'related'), neighbor))
+                    elif was != now:
+                        changes['changed_edges'].append((
+                            Step(node, now.get('relationship', 'related'), neighbor),
+                            {key: (was.get(key), now.get(key)) for key in set(was) | set(now)
+                             if was.get(key) != now.get(key)}))
+        return changes
+
+class GraphShard:
+    """One partition of the graph, held by a shard server
+
+    Owns the adjacency of its nodes (in graph order) and their global node
+    numbers; types are kept for its nodes and their neighbors, so expanding
+    a frontier needs no further lookups.
+    """
+    def __init__(self, adjacency: Dict[str, List[Tuple[str, str]]], numbers: Dict[str, int],
+                 types: Dict[str, str]):
+        self.adjacency = adjacency
+        self.numbers = numbers
+        self.types = types
+
+    def __len__(self):
+        return len(self.adjacency)
+
+    def expand(self, nodes: List[str]) -> Dict[str, Tuple]:
+        """node -> (type, [(neighbor, relationship, neighbor type)]) for the owned nodes"""
+        types = self.types
+        return {node: (types.get(node, 'concept'),
+                       [(neighbor, relationship, types.get(neighbor, 'concept'))
+                        for neighbor, relationship in self.adjacency[node]])
+                for node in nodes if node in self.adjacency}
+
+    def find_nodes(self, terms: List[str], extra: List[str]) -> List[Tuple[int, str]]:
+        extra = set(extra)
+        return [(self.numbers[node], node) for node in self.adjacency
+                if node in extra or any(term in node.lower() for term in terms)]
+
+    def labels(self) -> List[Tuple[int, str]]:
+        return [(self.numbers[node], node) for node in self.adjacency]
+
+def serve_shard(connection):
+    """Request loop of a shard server: ('load', payload) once, then (method, args) calls
+
+    connection is anything with send/recv, e.g. a multiprocessing Pipe end
+    for local processes or a multiprocessing.connection.Client; None stops
+    the server. See ShardedGraph.
+    """
+    shard = None
+    while True:
+        request = connection.recv()
+        if request is None:
+            break
+        method, args = request
+        try:
+            if method == 'load':
+                shard = GraphShard(*args)
+                result = len(shard)
+            else:
+                result = getattr(shard, method)(*args)
+        except Exception as e:
+            result = e
+        connection.send(result)
+    connection.close()
+
+def listen_shard(address: Tuple[str, int], authkey: bytes):
+    """Serve one shard over TCP, for shards on other machines (see ShardedGraph.connect)"""
+    from multiprocessing.connection import Listener
+    with Listener(address, authkey=authkey) as listener:
+        with listener.accept() as connection:
+            serve_shard(connection)
+
+class ShardedGraph:
+    """Read-only graph partitioned across shard servers
+
+    Nodes are assigned to shards by hash of their name ('hash') or by
+    cutting the reverse Cuthill-McKee order, which keeps neighbors close,
+    into contiguous ranges ('edge_cut', fewer cross-shard edges). Each
+    shard server holds only its nodes' adjacency. Requests to all shards
+    are sent before any reply is read, so shards work in parallel, and
+    prefetch fetches a whole traversal frontier in one exchange; fetched
+    adjacency is kept in an LRU cache. Offers the read-only store interface.
+    """
+    def __init__(self, connections: List, owners: Dict[str, int] = None, processes: List = None,
+                 adjacency_cache: int = 100000):
+        self.connections = connections
+        self.owners = owners  # node -> shard; None for hash partitioning
+        self.processes = processes or []
+        self.adjacency_cache = adjacency_cache
+        self._adjacency = OrderedDict()  # node -> [(neighbor, relationship)]
+        self._types = {}
+        self.exchanges = 0
+        self.fetched = 0
+
+    @staticmethod
+    def partition(graph, shards: int, method: str = 'hash') -> Dict[str, int]:
+        """Shard of every node; None for 'hash', which needs no routing table"""
+        if method == 'hash':
+            return None
+        if method != 'edge_cut':
+            raise ValueError(f"Unknown partitioning method {method!r}; expected 'hash' or 'edge_cut'")
+        import numpy as np
+        from scipy.sparse import csr_matrix
+        from scipy.sparse.csgraph import reverse_cuthill_mckee
+        nodes = list(graph)
+        index = {node: i for i, node in enumerate(nodes)}
+        adj = graph._adj
+        indptr = np.zeros(len(nodes) + 1, dtype=np.int64)
+        np.cumsum([len(adj[node]) for node in nodes], out=indptr[1:])
+        indices = np.fromiter((index[neighbor] for node in nodes for neighbor in adj[node]),
+                              dtype=np.int32, count=int(indptr[-1]))
+        matrix = csr_matrix((np.ones(len(indices), dtype=np.int8), indices, indptr),
+                            shape=(len(nodes), len(nodes)))
+        order = reverse_cuthill_mckee(matrix, symmetric_mode=True)
+        shard_of = np.empty(len(nodes), dtype=np.int64)
+        shard_of[order] = np.arange(len(nodes)) * shards // max(1, len(nodes))
+        return dict(zip(nodes, shard_of.tolist()))
+
+    @staticmethod
+    def _hash_owner(node: str, shards: int) -> int:
+        return zlib.crc32(node.encode('utf-8')) % shards
+
+    def owner(self, node: str) -> int:
+        if self.owners is not None:
+            return self.owners.get(node, 0)
+        return self._hash_owner(node, len(self.connections))
+
+    @classmethod
+    def payloads(cls, graph, shards: int, owners: Dict[str, int] = None) -> List[Tuple]:
+        """GraphShard arguments for each shard of graph"""
+        payloads = [({}, {}, {}) for _ in range(shards)]
+        for number, (node, data) in enumerate(graph._node.items()):
+            adjacency, numbers, types = payloads[owners[node] if owners is not None
+                                                 else cls._hash_owner(node, shards)]
+            neighbors = graph._adj[node]
+            adjacency[node] = [(neighbor, edge.get('relationship', 'related'))
+                               for neighbor, edge in neighbors.items()]
+            numbers[node] = number
+            for name in (node, *neighbors):
+                node_type = graph._node[name].get('type')
+                if node_type:
+                    types[name] = node_type
+        return payloads
+
+    @classmethod
+    def launch(cls, graph, shards: int = 4, method: str = 'hash', **kwargs) -> 'ShardedGraph':
+        """Partition graph and serve each shard from a local process"""
+        import multiprocessing
+        owners = cls.partition(graph, shards, method)
+        connections = []
+        processes = []
+        for payload in cls.payloads(graph, shards, owners):
+            parent, child = multiprocessing.Pipe()
+            process = multiprocessing.Process(target=serve_shard, args=(child,), daemon=True)
+            process.start()
+            child.close()
+            parent.send(('load', payload))
+            connections.append(parent)
+            processes.append(process)
+        sharded = cls(connections, owners, processes, **kwargs)
+        for connection in connections:
+            sharded._reply(connection)
+        return sharded
+
+    @classmethod
+    def connect(cls, graph, addresses: List[Tuple[str, int]], authkey: bytes, method: str = 'hash',
+                **kwargs) -> 'ShardedGraph':
+        """Partition graph onto shard servers already listening (listen_shard) at addresses"""
+        from multiprocessing.connection import Client
+        owners = cls.partition(graph, len(addresses), method)
+        connections = [Client(address, authkey=authkey) for address in addresses]
+        for connection, payload in zip(connections, cls.payloads(graph, len(addresses), owners)):
+            connection.send(('load', payload))
+        for connection in connections:
+            cls._reply(connection)
+        return cls(connections, owners, **kwargs)
+
+    @staticmethod
+    def _reply(connection):
+        result = connection.recv()
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+    def _exchange(self, requests: Dict[int, Tuple[str, tuple]]) -> Dict[int, object]:
+        """Send every shard its request, then collect the replies"""
+        self.exchanges += 1
+        for shard, request in requests.items():
+            self.connections[shard].send(request)
+        return {shard: self._reply(self.connections[shard]) for shard in requests}
+
+    def _broadcast(self, method: str, *args) -> List:
+        return list(self._exchange({shard: (method, args) for shard in range(len(self.connections))}).values())
+
+    def prefetch(self, nodes: Iterable[str]):
+        """Fetch the adjacency of all uncached nodes in one exchange"""
+        missing = {}
+        for node in nodes:
+            if node in self._adjacency:
+                self._adjacency.move_to_end(node)
+            else:
+                missing.setdefault(self.owner(node), []).append(node)
+        if not missing:
+            return
+        for expanded in self._exchange({shard: ('expand', (batch,)) for shard, batch in missing.items()}).values():
+            self.fetched += len(expanded)
+            for node, (node_type, neighbors) in expanded.items():
+                self._types[node] = node_type
+                self._types.update((neighbor, neighbor_type) for neighbor, _, neighbor_type in neighbors)
+                self._adjacency[node] = [(neighbor, relationship) for neighbor, relationship, _ in neighbors]
+        while len(self._adjacency) > self.adjacency_cache:
+            self._adjacency.popitem(last=False)
+        if len(self._types) > 16 * self.adjacency_cache:
+            self._types.clear()
+
+    def neighbors(self, name: str) -> List[Tuple[str, str]]:
+        if name not in self._adjacency:
+            self.prefetch([name])
+            if name not in self._adjacency:
+                raise KeyError(name)
+        return self._adjacency[name]
+
+    def node_type(self, name: str) -> str:
+        if name not in self._types:
+            self._adjacency.pop(name, None)
+            self.neighbors(name)
+        return self._types[name]
+
+    def find_nodes(self, terms: List[str], extra: Iterable[str] = ()) -> List[str]:
+        """Matching names from every shard, scanned in parallel, in node order"""
+        terms = [term.lower() for term in terms if term]
+        return [name for _, name in sorted(hit for hits in self._broadcast('find_nodes', terms, list(extra))
+                                           for hit in hits)]
+
+    def labels(self) -> List[str]:
+        return [name for _, name in sorted(label for labels in self._broadcast('labels') for label in labels)]
+
+    def csr(self) -> Tuple:
+        """Adjacency in labels() order, gathered from all shards"""
+        import numpy as np
+        nodes = self.labels()
+        index = {node: i for i, node in enumerate(nodes)}
+        expanded = {}
+        for part in self._broadcast('expand', nodes):
+            expanded.update(part)
+        indptr = np.zeros(len(nodes) + 1, dtype=np.int64)
+        np.cumsum([len(expanded[node][1]) for node in nodes], out=indptr[1:])
+        indices = np.fromiter((index[neighbor] for node in nodes for neighbor, _, _ in expanded[node][1]),
+                              dtype=np.int64, count=int(indptr[-1]))
+        return indptr, indices
+
+    def relationships(self) -> List[str]:
+        """Relationship of each csr() entry, in the same order, in one exchange"""
+        nodes = self.labels()
+        expanded = {}
+        for part in self._broadcast('expand', nodes):
+            expanded.update(part)
+        return [relationship for node in nodes for _, relationship, _ in expanded[node][1]]
+
+    def stats(self) -> Dict:
+        return {'shards': len(self.connections), 'exchanges': self.exchanges, 'nodes_fetched': self.fetched,
+                'cached': len(self._adjacency)}
 
-{context}
+    def close(self):
+        for connection in self.connections:
+            try:
+                connection.send(None)
+                connection.close()
+            except OSError:
+                pass
+        for process in self.processes:
+            process.join(timeout=5)
 
-Question: {query}
+class GraphRAG:
+    """Knowledge graph-based AI system"""
+    ENGINES = ('python', 'sparse')  # traversal engines for local queries
 
-Please provide a clear and specific answer focusing on the medical relationships and mechanisms involved."""
+    def __init__(self, cache_size: int = 256):
+        import networkx as nx
+        self.kg = nx.Graph()
+        self.version = 0  # bumped on every graph change, part of cache keys
+        self._csr = None  # (version, nodes, index, indptr, indices)
+        self._csr_relationships = None  # (version, relationship of each CSR entry)
+        self._matrix = None  # (version, nodes, index, transition, dangling)
+        self._oracle = None  # (version, DistanceOracle)
+        self._verifier = None
+        self.triples = TripleIndex()  # in-memory graphs only, see has_triple/match
+        self.provenance = ProvenanceTable()  # keyed by the triple index's pair keys
+        self.snapshots = []  # GraphSnapshots in label order
+        self._touched = None  # nodes changed since the last snapshot, as an ordered dict
+        self._views = {}  # label -> read-only GraphRAG over that snapshot
+        self.communities = None
+        self.aliases = {}  # normalized alias -> graph entity, for seed matching
+        self._alias_words = defaultdict(list)  # first word of an alias -> aliases
+        self.resolver = None
+        self.store = None  # read-only GraphColumns/SQLiteGraphStore used instead of kg
+        self.cache = QueryCache(cache_size) if cache_size > 0 else None
 
-            return self._make_api_call(prompt)
-        except Exception as e:
-            return f"Error: {str(e)}"
-    
-    def query_with_graph_context(self, query: str, graph_context: str) -> str:
-        """Query using GraphRAG context"""
-        try:
-            prompt = f"""As a medical expert, analyze this knowledge graph data:
+    @classmethod
+    def from_columns(cls, path: str, cache_size: int = 256) -> 'GraphRAG':
+        """Read-only GraphRAG answering queries from memory-mapped columns"""
+        graphrag = cls(cache_size)
+        graphrag.store = GraphColumns(path)
+        graphrag.version = 1
+        return graphrag
 
-{graph_context}
+    @classmethod
+    def from_sqlite(cls, path: str, cache_size: int = 256, adjacency_cache: int = 10000) -> 'GraphRAG':
+        """Read-only GraphRAG answering queries from an on-disk SQLite graph"""
+        graphrag = cls(cache_size)
+        graphrag.store = SQLiteGraphStore(path, adjacency_cache)
+        graphrag.version = 1
+        return graphrag
 
-Question: {query}
+    def write_columns(self, path: str):
+        """Store the graph as memory-mappable columns (see GraphColumns)"""
+        GraphColumns.write(self.kg, path)
 
-Based on the knowledge graph relationships shown above, provide a comprehensive explanation that:
-1. Explains the key relationships
-2. Describes the biological mechanisms
-3. Highlights the clinical implications
+    def write_sqlite(self, path: str):
+        """Store the graph in a SQLite file (see SQLiteGraphStore)"""
+        SQLiteGraphStore.from_graph(self.kg, path).close()
 
-Focus on the specific pathways and interactions shown in the knowledge graph."""
+    def write_neo4j(self, path: str, batch_size: int = 1000):
+        """Export the graph as Neo4j bulk-import CSVs and Cypher (see Neo4jBulkFiles)"""
+        Neo4jBulkFiles.write(self.kg, path, batch_size)
 
-            return self._make_api_call(prompt)
-        except Exception as e:
-            return f"Error: {str(e)}"
-    
-    def _make_api_call(self, prompt: str) -> str:
-        """Make OpenAI API call"""
-        try:
-            response = self.client.chat.completions.create(
-                model="gpt-3.5-turbo",  # or "gpt-4" if you have access
-                messages=[
-                    {"role": "system", "content": "You are a medical expert providing accurate, detailed explanations about cancer biology and treatments."},
-                    {"role": "user", "content": prompt}
-                ],
-                temperature=0.7,
-                max_tokens=500
-            )
-            
-            return response.choices[0].message.content.strip()
-                
-        except Exception as e:
-            return f"API Error: {str(e)}"
-class GraphRAG:
-    """Knowledge graph-based AI system"""
-    def __init__(self):
-        self.kg = nx.Graph()
-        
-    def create_knowledge_graph(self, data: List[Dict]):
-        """Create a knowledge graph from structured data"""
+    def load_neo4j(self, path: str):
+        """Add the graph in Neo4j bulk-import CSVs, e.g. written by write_neo4j"""
+        self._check_writable()
+        nodes, edges = Neo4jBulkFiles.read(path)
+        self.version += 1
+        touched = self._touched
+        for name, node_type in nodes:
+            if node_type:
+                self.kg.add_node(name, type=node_type)
+            else:
+                self.kg.add_node(name)
+            if touched is not None:
+                touched[name] = None
+        for source, relationship, target, attributes in edges:
+            self.kg.add_edge(source, target, relationship=relationship, **attributes)
+            self.triples.add(source, relationship, target)
+            if touched is not None:
+                touched[source] = touched[target] = None
+
+    def create_knowledge_graph(self, data: Iterable[Dict], resolver: EntityResolver = None):
+        """Create a knowledge graph from structured data (any iterable, e.g. a stream)
+
+        With a resolver, duplicate spellings of an entity are merged into one
+        node and their aliases are kept for query-time seed matching.
+        Relations may carry a 'confidence' and/or an 'evidence' count, kept
+        on the edge (see edge_confidence), and 'provenance': a
+        {'document', 'start', 'end'} dict or a list of them, kept in the
+        ProvenanceTable.
+        """
+        self._check_writable()
+        data = self._resolve(data, resolver)
+        self.version += 1
+        touched = self._touched
         for item in data:
             self.kg.add_node(item['entity'], type=item['type'])
+            if touched is not None:
+                touched[item['entity']] = None
             if 'related_to' in item:
                 for relation in item['related_to']:
-                    self.kg.add_node(relation['entity'])
-                    self.kg.add_edge(item['entity'], relation['entity'], 
-                                   relationship=relation['type'])
+                    source, relationship, target = item['entity'], relation['type'], relation['entity']
+                    self.kg.add_node(target)
+                    if touched is not None:
+                        touched[target] = None
+                    self.kg.add_edge(source, target, relationship=relationship)
+                    self.triples.add(source, relationship, target)
+                    if len(relation) > 2:
+                        # Beyond plain {'entity', 'type'}: edge attributes and provenance
+                        self.kg.edges[source, target].update(edge_attributes(relation))
+                        if relation.get('provenance'):
+                            self._add_provenance(source, relationship, target, relation['provenance'])
+
+    def create_knowledge_graph_bulk(self, data: List[Dict], workers: int = 1,
+                                    chunk_size: int = 100000, resolver: EntityResolver = None):
+        """Build the graph from large inputs in one shot
+
+        The input is interned into integer edge arrays, deduplicated with
+        NumPy and added with one add_nodes_from/add_edges_from pass. The
+        graph is the same as create_knowledge_graph's, including node and
+        neighbor order. With workers > 1, chunks are interned in worker
+        processes; that only pays off with as many free cores, and needs this
+        module importable by name so the workers can unpickle _intern_chunk.
+        """
+        import numpy as np
+        from concurrent.futures import ProcessPoolExecutor
+
+        self._check_writable()
+        data = self._resolve(data, resolver)
+        data = data if isinstance(data, list) else list(data)
+        if workers > 1 and len(data) > chunk_size:
+            chunks = [data[i:i + chunk_size] for i in range(0, len(data), chunk_size)]
+            with ProcessPoolExecutor(max_workers=min(workers, len(chunks))) as pool:
+                interned = list(pool.map(_intern_chunk, chunks))
+        else:
+            # Single worker: one chunk whose local ids are already global
+            interned = [_intern_chunk(data)]
+
+        # Merge chunk-local ids into global ids; chunks are contiguous and in
+        # order, so first-appearance order matches sequential insertion
+        if len(interned) == 1:
+            names, type_ids, types, edges, rel_names, annotated = interned[0]
+            node_types = dict(zip(type_ids.tolist(), types))
+        else:
+            index = {}
+            rel_index = {}
+            node_types = {}
+            edge_arrays = []
+            annotated = []
+            for names, type_ids, types, edges, relationships, chunk_annotated in interned:
+                annotated.extend(chunk_annotated)
+                mapping = np.fromiter((index.setdefault(name, len(index)) for name in names),
+                                      dtype=np.int64, count=len(names))
+                rel_mapping = np.fromiter((rel_index.setdefault(rel, len(rel_index)) for rel in relationships),
+                                          dtype=np.int64, count=len(relationships))
+                node_types.update(zip(mapping[type_ids].tolist(), types))
+                edge_arrays.append(np.column_stack((mapping[edges[:, 0]], mapping[edges[:, 1]],
+                                                    rel_mapping[edges[:, 2]])))
+            names = list(index)
+            rel_names = list(rel_index)
+            edges = np.concatenate(edge_arrays)
+
+        # Undirected dedup: keep first-occurrence order, last relationship wins
+        low = np.minimum(edges[:, 0], edges[:, 1])
+        high = np.maximum(edges[:, 0], edges[:, 1])
+        keys = low * len(names) + high
+        _, first = np.unique(keys, return_index=True)
+        _, last_reversed = np.unique(keys[::-1], return_index=True)
+        last = len(keys) - 1 - last_reversed
+        order = np.argsort(first)
+        sources = edges[first[order], 0].tolist()
+        targets = edges[first[order], 1].tolist()
+        rels = edges[last[order], 2]
+        # The triple index keeps each edge's latest ingest direction
+        latest = edges[last[order]]
+
+        self.version += 1
+        if self._touched is not None:
+            self._touched.update(dict.fromkeys(names))
+        empty = not len(self.kg)
+        self.kg.add_nodes_from((names[i], {'type': node_types[i]}) if i in node_types else names[i]
+                               for i in range(len(names)))
+        rel_attrs = [{'relationship': rel} for rel in rel_names]
+        self.kg.add_edges_from((names[u], names[v], rel_attrs[r])
+                               for u, v, r in zip(sources, targets, rels.tolist()))
+        if empty:
+            self.triples = TripleIndex()
+            self.triples.add_arrays(names, rel_names, latest[:, 0], latest[:, 1], rels)
+        else:
+            for u, v, r in latest.tolist():
+                self.triples.add(names[u], rel_names[r], names[v])
+        self._annotate(annotated)
+
+    def _annotate(self, annotated: List[Tuple[str, str, str, Dict, object]]):
+        """Apply relations' edge attributes in input order, later mentions
+        overriding, and record their provenance"""
+        for source, relationship, target, attributes, provenance in annotated:
+            self.kg.edges[source, target].update(attributes)
+            if provenance:
+                self._add_provenance(source, relationship, target, provenance)
+
+    def _add_provenance(self, source: str, relationship: str, target: str, provenance):
+        self.provenance.add(*self.triples.key(source, relationship, target), provenance)
     
+    def _check_writable(self):
+        if self.store is not None:
+            raise ValueError("Graphs opened from a store are read-only")
+
+    def _resolve(self, data: Iterable[Dict], resolver: EntityResolver) -> Iterable[Dict]:
+        if resolver is None:
+            return data
+        self.resolver = resolver
+        data = resolver.canonicalize(data)
+        self._add_aliases(resolver.alias_index())
+        return data
+
+    def _add_aliases(self, aliases: Dict[str, str]):
+        for alias, entity in aliases.items():
+            if alias and alias not in self.aliases:
+                self._alias_words[alias.split(" ", 1)[0]].append(alias)
+            self.aliases[alias] = entity
+
+    def _canonical(self, source: str, target: str, remember: bool = True) -> Tuple[str, str]:
+        """Both names resolved to graph entities, as at ingest; unchanged without a resolver"""
+        if self.resolver is None:
+            return source, target
+        mapping = self.resolver.resolve_batch((source, target), remember)
+        if remember:
+            self._add_aliases({self.resolver.normalize(name): mapping[name] for name in mapping})
+        return mapping[source], mapping[target]
+
     def visualize_graph(self):
         """Create interactive visualization of the knowledge graph"""
+        from pyvis.network import Network
         net = Network(notebook=False, height="750px", width="100%", bgcolor="#ffffff")
         
         color_map = {
@@ -122,77 +2730,2293 @@ class GraphRAG:
         net.save_graph("cancer_research_graph.html")
         return "cancer_research_graph.html"
 
-    def query(self, query: str) -> str:
-        """Query using knowledge graph relationships"""
-        relevant_info = []
-        for node in self.kg.nodes(data=True):
-            if any(term.lower() in node[0].lower() for term in query.split()):
-                neighbors = []
-                paths = []
-                
-                # Direct neighbors
-                for neighbor in self.kg.neighbors(node[0]):
-                    edge_data = self.kg.get_edge_data(node[0], neighbor)
-                    neighbors.append({
-                        'entity': neighbor,
-                        'relationship': edge_data.get('relationship', 'related')
-                    })
-                
-                # Find paths to related concepts (up to 2 hops)
-                for target in self.kg.nodes():
-                    if target != node[0]:
-                        try:
-                            path = nx.shortest_path(self.kg, node[0], target)
-                            if len(path) <= 3:  # Only include paths up to 2 hops
-                                path_info = []
-                                for i in range(len(path)-1):
-                                    edge_data = self.kg.get_edge_data(path[i], path[i+1])
-                                    path_info.append({
-                                        'from': path[i],
-                                        'to': path[i+1],
-                                        'relationship': edge_data.get('relationship', 'related')
-                                    })
-                                paths.append(path_info)
-                        except nx.NetworkXNoPath:
-                            continue
-                
-                relevant_info.append({
-                    'entity': node[0],
-                    'type': node[1].get('type', 'concept'),
-                    'connected_to': neighbors,
-                    'paths': paths
-                })
-        
-        if relevant_info:
-            response = "\nKnowledge Graph Analysis:\n"
-            for info in relevant_info:
-                response += f"\n• {info['entity']}"
-                if info['type'] != 'concept':
-                    response += f" ({info['type']})"
-                response += ":\n"
-                
-                if info['connected_to']:
-                    response += "  Direct relationships:\n"
-                    connections = [f"{n['relationship']} {n['entity']}" 
-                                 for n in info['connected_to']]
-                    response += "   - " + "\n   - ".join(connections) + "\n"
-                
-                if info['paths']:
-                    response += "  Extended relationships:\n"
-                    for path in info['paths']:
-                        if len(path) > 1:
-                            path_str = " → ".join([
-                                f"{step['from']} {step['relationship']} {step['to']}"
-                                for step in path
-                            ])
-                            response += f"   - {path_str}\n"
+    def query(self, query: str, renderer: str = 'text', top_k: int = None,
+              mode: str = 'local', max_hops: int = None, policy=None, engine: str = 'python') -> str:
+        """Query using knowledge graph relationships
+
+        The analysis is rendered with one of RENDERERS: 'text' (default),
+        'compact', 'json' or 'triples'. With top_k, neighbors and paths are
+        ranked by personalized PageRank from the matched seeds and only the
+        top_k of each are kept. Paths reach up to max_hops (default 2) from
+        each seed. policy restricts local expansion to a TraversalPolicy,
+        given as one or a TRAVERSAL_POLICIES name; 'auto' picks it with
+        classify_intent, and general questions are expanded unrestricted.
+        engine='sparse' expands all seeds together with array operations over
+        the CSR adjacency (same paths, faster on dense graphs; policies still
+        use the Python engine).
+
+        mode='best_first' keeps each seed's top_k (default 10) most confident
+        neighbors and multi-hop paths, found in confidence order so expansion
+        stops once they are (see edge_confidence).
+        mode='pairs' instead returns the top_k (default 3) shortest paths of
+        up to max_hops (default 6) between each pair of matched entities;
+        with fewer than two matches it expands seeds as usual.
+        Edges with provenance are followed by their citation keys, e.g.
+        [c12], which resolve_citation expands into evidence text.
+        mode='global' answers from the community index instead of
+        traversing from seeds; mode='auto' does so only when no entity in
+        the graph matches the query.
+        """
+        if mode == 'global':
+            return self.global_query(query)
+        if mode == 'best_first':
+            return RENDERERS[renderer](self.cite(self.analyze_best_first(query, top_k or 10,
+                                                                         max_hops or 2, policy)))
+        if mode == 'pairs':
+            result = self.analyze_pairs(query, top_k or 3, max_hops or 6, policy=policy)
+            if len(result.seeds) > 1:
+                return RENDERERS[renderer](self.cite(result))
+        result = self.analyze(query, top_k, max_hops or 2, policy, engine)
+        if mode == 'auto' and not result.seeds and self.communities is not None:
+            return self.global_query(query)
+        return RENDERERS[renderer](self.cite(result))
+
+    def build_community_index(self, summarizer=None, resolution: float = 1.0,
+                              max_facts: int = 20, workers: int = 8, seed: int = 0) -> CommunityIndex:
+        """Partition the graph with Louvain and precompute community summaries
+
+        summarizer is an optional callable taking the community's facts as
+        text (e.g. ClassicalAI.summarize_community); it is called in parallel
+        threads. Without it, summaries are extractive. Graphs opened from a
+        store have no in-memory graph to partition: build the index on the
+        source GraphRAG, save it and load it into the view with
+        load_community_index.
+        """
+        import networkx as nx
+
+        if self.store is not None:
+            raise ValueError("Community indexes are built from in-memory graphs; "
+                             "build one on the source graph and use load_community_index")
+
+        levels = [[sorted(community) for community in sorted(partition, key=len, reverse=True)]
+                  for partition in nx.community.louvain_partitions(self.kg, resolution=resolution, seed=seed)]
+        if not levels:
+            levels = [[]]
+        summaries = []
+        for level in levels:
+            extracts = [self._summarize_community(nodes, max_facts) for nodes in level]
+            if summarizer is not None:
+                from concurrent.futures import ThreadPoolExecutor
+                with ThreadPoolExecutor(max_workers=workers) as pool:
+                    extracts = list(pool.map(summarizer, extracts))
+            summaries.append(extracts)
+        self.communities = CommunityIndex(levels, summaries)
+        return self.communities
+
+    def load_community_index(self, path: str) -> CommunityIndex:
+        self.communities = CommunityIndex.load(path)
+        return self.communities
+
+    def global_query(self, query: str, llm: 'ClassicalAI' = None, level: int = -1,
+                     limit: int = 5, workers: int = 8) -> str:
+        """Answer a global question by map-reducing over community summaries
+
+        Map: each relevant community summary is answered independently (in
+        parallel when an llm is given). Reduce: partial answers are combined,
+        and with an llm turned into a final answer.
+        """
+        if self.communities is None:
+            self.build_community_index()
+        chosen = self.communities.relevant(query, level, limit)
+        summaries = [self.communities.summaries[level][i] for i in chosen]
+        if not summaries:
+            return NO_RESULTS
+
+        if llm is None:
+            partials = summaries
+        else:
+            from concurrent.futures import ThreadPoolExecutor
+            with ThreadPoolExecutor(max_workers=workers) as pool:
+                partials = list(pool.map(lambda summary: llm.answer_from_summary(query, summary),
+                                         summaries))
+            partials = [partial for partial in partials if partial.strip().upper() != 'NONE']
+
+        context = "\nCommunity Summaries:\n\n" + "\n\n".join(f"• {partial}" for partial in partials)
+        if llm is None:
+            return context
+        return llm.query_with_graph_context(query, context)
+
+    def _summarize_community(self, nodes: List[str], max_facts: int) -> str:
+        """Extractive summary: entity types, hub entities and their strongest facts"""
+        members = set(nodes)
+        by_degree = sorted(nodes, key=lambda node: -self.kg.degree(node))
+        types = OrderedDict()
+        for node in by_degree:
+            node_type = self.kg.nodes[node].get('type')
+            if node_type:
+                types[node_type] = types.get(node_type, 0) + 1
+        facts = []
+        seen = set()
+        for node in by_degree:
+            for neighbor, data in self.kg.adj[node].items():
+                if neighbor in members and frozenset((node, neighbor)) not in seen:
+                    seen.add(frozenset((node, neighbor)))
+                    # The graph is undirected; state the fact in its ingest direction
+                    triple = self.triples.get(node, neighbor) or Step(node, data.get('relationship', 'related'),
+                                                                       neighbor)
+                    facts.append(f"{triple.source} {triple.relationship} {triple.target}")
+            if len(facts) >= max_facts:
+                break
+
+        summary = f"Community of {len(nodes)} entities"
+        if types:
+            summary += " (" + ", ".join(f"{count} {node_type}" for node_type, count in types.items()) + ")"
+        summary += f". Key entities: {', '.join(by_degree[:5])}."
+        if facts:
+            summary += " Relationships: " + "; ".join(facts[:max_facts]) + "."
+        return summary
+
+    def analyze(self, query: str, top_k: int = None, max_hops: int = 2, policy=None,
+                engine: str = 'python') -> 'QueryResult':
+        """Structured knowledge graph analysis for a query"""
+        self._check_engine(engine)
+        seeds = self._link_seeds(query)
+        policy = self._policy(query, policy)
+        key = QueryCache.make_key(seeds, {'max_hops': max_hops, 'top_k': top_k, 'policy': policy},
+                                  self.version)
+        seed_results = self.cache.get(key) if self.cache is not None else None
+        cached = seed_results is not None
+        if not cached:
+            seed_results = self._analyze(seeds, max_hops, policy, engine)
+            if top_k is not None:
+                seed_results = self._rank(seeds, seed_results, top_k)
+            if self.cache is not None:
+                self.cache.put(key, seed_results)
+        return QueryResult(query, seed_results, cached)
+
+    def analyze_batch(self, queries: List[str], top_k: int = None, max_hops: int = 2,
+                      engine: str = 'sparse') -> List['QueryResult']:
+        """analyze for many queries, expanding the seeds of all of them in one traversal
+
+        Seeds shared between queries are expanded once; cached queries are
+        answered from the cache and are not expanded again.
+        """
+        self._check_engine(engine)
+        linked = [self._link_seeds(query) for query in queries]
+        keys = [QueryCache.make_key(seeds, {'max_hops': max_hops, 'top_k': top_k, 'policy': None},
+                                    self.version) for seeds in linked]
+        hits = [self.cache.get(key) if self.cache is not None else None for key in keys]
+        pending = list(OrderedDict.fromkeys(seed for seeds, hit in zip(linked, hits) if hit is None
+                                            for seed in seeds))
+        paths = dict(zip(pending, self._expand(pending, max_hops, None, engine)))
+        results = []
+        for query, seeds, key, seed_results in zip(queries, linked, keys, hits):
+            cached = seed_results is not None
+            if not cached:
+                seed_results = self._seed_results(seeds, [paths[seed] for seed in seeds])
+                if top_k is not None:
+                    seed_results = self._rank(seeds, seed_results, top_k)
+                if self.cache is not None:
+                    self.cache.put(key, seed_results)
+            results.append(QueryResult(query, seed_results, cached))
+        return results
+
+    def analyze_best_first(self, query: str, top_k: int = 10, max_hops: int = 2,
+                           policy=None) -> 'QueryResult':
+        """Structured analysis keeping only the most confident evidence around each seed"""
+        seeds = self._link_seeds(query)
+        policy = self._policy(query, policy)
+        key = QueryCache.make_key(seeds, {'mode': 'best_first', 'top_k': top_k, 'max_hops': max_hops,
+                                          'policy': policy}, self.version)
+        seed_results = self.cache.get(key) if self.cache is not None else None
+        cached = seed_results is not None
+        if not cached:
+            seed_results = []
+            for seed in seeds:
+                neighbors = sorted(((confidence, Neighbor(relationship, neighbor))
+                                    for neighbor, relationship, confidence in self._weighted_neighbors(seed)
+                                    if policy is None or self._follows(policy, 0, relationship, neighbor)),
+                                   key=lambda pair: -pair[0])[:top_k]
+                paths = self._best_first_paths(seed, max_hops, top_k, policy)
+                seed_results.append(SeedResult(seed, self._node_type(seed),
+                                               tuple(neighbor for _, neighbor in neighbors), tuple(paths)))
+            seed_results = tuple(seed_results)
+            if self.cache is not None:
+                self.cache.put(key, seed_results)
+        return QueryResult(query, seed_results, cached)
+
+    def analyze_pairs(self, query: str, k: int = 3, max_hops: int = 6, max_seeds: int = 4,
+                      policy=None) -> 'QueryResult':
+        """Structured analysis of how the entities a query names connect
+
+        Instead of expanding every seed to the whole graph, each pair of
+        seeds gets its k shortest simple paths (listed under the earlier
+        seed); direct links between seeds are its neighbors. Pairs grow
+        quadratically, so only the max_seeds best-matched seeds are paired
+        (see _best_seeds). With a policy (as for query), paths taking an
+        edge it does not allow, counted in hops from the earlier seed, are
+        dropped, so fewer than k may remain.
+        """
+        seeds = self._best_seeds(query, self._link_seeds(query), max_seeds)
+        policy = self._policy(query, policy)
+        key = QueryCache.make_key(seeds, {'mode': 'pairs', 'k': k, 'max_hops': max_hops, 'policy': policy},
+                                  self.version)
+        seed_results = self.cache.get(key) if self.cache is not None else None
+        cached = seed_results is not None
+        if not cached:
+            seed_results = tuple(self._analyze_pair_paths(seeds, i, k, max_hops, policy)
+                                 for i in range(len(seeds)))
+            if self.cache is not None:
+                self.cache.put(key, seed_results)
+        return QueryResult(query, seed_results, cached)
+
+    def _best_seeds(self, query: str, seeds: List[str], limit: int) -> List[str]:
+        """The limit seeds best matched by the query's content words, in seed order
+
+        A seed's match quality is the share of its name covered by the
+        longest content word (not a STOPWORD) it contains, 1 for alias
+        matches; seeds matched only through stopwords or fragments such as
+        'is' in 'Cancer Risk' score 0 and are dropped.
+        """
+        terms = _terms(query)
+        aliased = self._aliased(query)
+        quality = {}
+        for seed in seeds:
+            name = seed.lower()
+            if seed in aliased:
+                quality[seed] = 1.0
+            else:
+                matched = max((len(term) for term in terms if term in name), default=0)
+                quality[seed] = matched / len(name) if name else 0.0
+        ranked = sorted((seed for seed in seeds if quality[seed] > 0), key=lambda seed: -quality[seed])
+        kept = set(ranked[:limit])
+        return [seed for seed in seeds if seed in kept]
+
+    def _analyze_pair_paths(self, seeds: List[str], i: int, k: int, max_hops: int,
+                            policy: TraversalPolicy = None) -> 'SeedResult':
+        paths = []
+        for other in seeds[i + 1:]:
+            paths.extend(path for path in self.k_shortest_paths(seeds[i], other, k, max_hops)
+                         if policy is None or all(self._follows(policy, hop, step.relationship, step.target)
+                                                  for hop, step in enumerate(path)))
+        neighbors = tuple(Neighbor(path[0].relationship, path[0].target) for path in paths if len(path) == 1)
+        return SeedResult(seeds[i], self._node_type(seeds[i]), neighbors, tuple(paths))
+
+    def personalized_pagerank(self, seed_sets: List[List[str]], alpha: float = 0.85,
+                              tol: float = 1e-4, max_iter: int = 50):
+        """Personalized PageRank scores for a batch of seed sets
+
+        Returns an (n_nodes, n_seed_sets) float32 array in graph node order;
+        column j restarts at seed_sets[j]. All columns advance together
+        through one sparse matrix product per iteration. The default tol (L1
+        change per column) is ample for top-k ranking.
+        """
+        import numpy as np
+        nodes, index, transition, dangling = self._transition_matrix()
+        restart = np.zeros((len(nodes), len(seed_sets)), dtype=np.float32)
+        for j, seeds in enumerate(seed_sets):
+            ids = [index[seed] for seed in seeds if seed in index]
+            if ids:
+                restart[ids, j] = 1.0 / len(ids)
+
+        teleport = (1 - alpha) * restart
+        has_dangling = dangling.any()
+        scores = restart
+        for _ in range(max_iter):
+            updated = transition @ scores
+            if has_dangling:
+                # Mass on nodes without edges returns to the seeds
+                updated += restart * scores[dangling].sum(axis=0)
+            updated *= alpha
+            updated += teleport
+            delta = np.abs(updated - scores).sum(axis=0).max(initial=0.0)
+            scores = updated
+            if delta < tol:
+                break
+        return scores
+
+    def rank_nodes(self, seed_sets: List[List[str]], top_k: int = 10) -> List[List[Tuple[str, float]]]:
+        """Top-k (node, score) pairs by personalized PageRank for each seed set"""
+        import numpy as np
+        nodes = self._transition_matrix()[0]
+        scores = self.personalized_pagerank(seed_sets)
+        k = min(top_k, len(nodes))
+        if k == 0:
+            return [[] for _ in seed_sets]
+        top = np.argpartition(-scores, k - 1, axis=0)[:k]
+        ranked = []
+        for j in range(len(seed_sets)):
+            column = top[np.argsort(-scores[top[:, j], j]), j]
+            ranked.append([(nodes[i], float(scores[i, j])) for i in column])
+        return ranked
+
+    def _adjacency(self) -> Tuple:
+        """(nodes, index, indptr, indices) CSR adjacency, rebuilt when the graph changes"""
+        if self._csr is None or self._csr[0] != self.version:
+            import numpy as np
+            if self.store is not None:
+                nodes = self.store.labels()
+                index = {node: i for i, node in enumerate(nodes)}
+                indptr, indices = self.store.csr()
+            else:
+                nodes = list(self.kg)
+                index = {node: i for i, node in enumerate(nodes)}
+                adj = self.kg.adj
+                degree = np.fromiter((len(adj[node]) for node in nodes), dtype=np.int64, count=len(nodes))
+                indptr = np.zeros(len(nodes) + 1, dtype=np.int64)
+                np.cumsum(degree, out=indptr[1:])
+                indices = np.fromiter((index[neighbor] for node in nodes for neighbor in adj[node]),
+                                      dtype=np.int64, count=int(indptr[-1]))
+            self._csr = (self.version, nodes, index, indptr, indices)
+        return self._csr[1:]
+
+    def _relationships(self) -> List[str]:
+        """Relationship of each entry of the CSR adjacency's indices, in the same order
+
+        Stores provide them in bulk (relationships()), one scan or exchange
+        rather than a neighbors() call per node.
+        """
+        if self._csr_relationships is None or self._csr_relationships[0] != self.version:
+            if self.store is not None:
+                relationships = self.store.relationships()
+            else:
+                nodes = self._adjacency()[0]
+                adj = self.kg.adj
+                relationships = [data.get('relationship', 'related') for node in nodes for data in adj[node].values()]
+            self._csr_relationships = (self.version, relationships)
+        return self._csr_relationships[1]
+
+    def _transition_matrix(self) -> Tuple:
+        """Column-stochastic CSR transition matrix, rebuilt when the graph changes"""
+        if self._matrix is None or self._matrix[0] != self.version:
+            import numpy as np
+            import scipy.sparse as sp
+            nodes, index, indptr, indices = self._adjacency()
+            degree = np.diff(indptr)
+            # Row i of the symmetric adjacency is column i; scale by 1/degree
+            inverse = np.divide(1.0, degree, out=np.zeros(len(nodes)), where=degree > 0)
+            weights = np.repeat(inverse, degree).astype(np.float32)
+            transition = sp.csc_matrix((weights, indices, indptr),
+                                       shape=(len(nodes), len(nodes))).tocsr()
+            self._matrix = (self.version, nodes, index, transition, degree == 0)
+        return self._matrix[1:]
+
+    def _rank(self, seeds: List[str], seed_results: Tuple['SeedResult', ...],
+              top_k: int) -> Tuple['SeedResult', ...]:
+        """Keep the top_k neighbors and paths of each seed by PageRank score"""
+        if not seeds:
+            return seed_results
+        index = self._transition_matrix()[1]
+        scores = self.personalized_pagerank([seeds])[:, 0]
+        ranked = []
+        for seed in seed_results:
+            neighbors = sorted(seed.neighbors, key=lambda n: -scores[index[n.entity]])[:top_k]
+            # One-hop paths duplicate the neighbors, so only longer ones compete
+            paths = sorted((path for path in seed.paths if len(path) > 1),
+                           key=lambda p: -scores[index[p[-1].target]])[:top_k]
+            ranked.append(SeedResult(seed.entity, seed.type, tuple(neighbors), tuple(paths)))
+        return tuple(ranked)
+
+    def distance_oracle(self, landmarks: int = 16) -> DistanceOracle:
+        """Landmark distance oracle, rebuilt when the graph changes"""
+        if (self._oracle is None or self._oracle[0] != self.version or
+                len(self._oracle[1].landmarks) != min(landmarks, len(self._adjacency()[0]))):
+            indptr, indices = self._adjacency()[2:]
+            self._oracle = (self.version, DistanceOracle(indptr, indices, landmarks))
+        return self._oracle[1]
+
+    def within_hops(self, source: str, target: str, k: int) -> bool:
+        """Whether target is at most k hops from source
+
+        Answered from the distance oracle's bounds when they decide it,
+        otherwise by a bidirectional BFS limited to k hops.
+        """
+        index = self._adjacency()[1]
+        decided = self.distance_oracle().within(index[source], index[target], k)
+        if decided is not None:
+            return decided
+        return self.shortest_path(source, target, max_hops=k) is not None
+
+    def approximate_path(self, source: str, target: str) -> Tuple[Step, ...]:
+        """A short (not always shortest) path via the oracle's landmarks, None if unconnected"""
+        nodes, index = self._adjacency()[:2]
+        if source == target:
+            return ()
+        path = self.distance_oracle().path(index[source], index[target])
+        if not path:
+            return None
+        return self._steps([nodes[i] for i in path])
+
+    def shortest_path(self, source: str, target: str, max_hops: int = None) -> Tuple[Step, ...]:
+        """Exact shortest path by bidirectional BFS, None if none within max_hops"""
+        for entity in (source, target):
+            self._node_type(entity)  # KeyError for entities not in the graph
+        path = self._bidirectional_path(source, target, max_hops)
+        return None if path is None else self._steps(path)
+
+    def k_shortest_paths(self, source: str, target: str, k: int = 3,
+                         max_hops: int = None) -> List[Tuple[Step, ...]]:
+        """Up to k shortest simple paths between two entities, shortest first (Yen)
+
+        Each further path deviates from an accepted one at a spur node: the
+        accepted prefix's nodes and the edges already taken from that prefix
+        are blocked, and the rest is a bidirectional BFS from the spur.
+        """
+        for entity in (source, target):
+            self._node_type(entity)  # KeyError for entities not in the graph
+        first = self._bidirectional_path(source, target, max_hops)
+        if first is None:
+            return []
+        accepted = [first]
+        candidates = []
+        seen = {tuple(first)}
+        while len(accepted) < k:
+            previous = accepted[-1]
+            for i in range(len(previous) - 1):
+                root = previous[:i + 1]
+                blocked_edges = {frozenset(path[i:i + 2]) for path in accepted
+                                 if len(path) > i + 1 and path[:i + 1] == root}
+                spur = self._bidirectional_path(root[-1], target,
+                                                None if max_hops is None else max_hops - i,
+                                                set(root[:-1]), blocked_edges)
+                if spur is not None:
+                    path = root[:-1] + spur
+                    if tuple(path) not in seen:
+                        seen.add(tuple(path))
+                        heapq.heappush(candidates, (len(path), len(seen), path))
+            if not candidates:
+                break
+            accepted.append(heapq.heappop(candidates)[2])
+        return [self._steps(path) for path in accepted]
+
+    def _bidirectional_path(self, source: str, target: str, max_hops: int = None,
+                            blocked_nodes: set = (), blocked_edges: set = ()) -> List[str]:
+        """Node path of a shortest source-target path avoiding the blocked nodes/edges
+
+        Each round expands a whole level of the smaller frontier; once a
+        level connects the two searches the shortest meeting is returned.
+        """
+        if source == target:
+            return [source]
+        parents = ({source: None}, {target: None})
+        depths = ({source: 0}, {target: 0})
+        frontiers = ([source], [target])
+        hops = 0
+        while frontiers[0] and frontiers[1] and (max_hops is None or hops < max_hops):
+            side = 0 if len(frontiers[0]) <= len(frontiers[1]) else 1
+            parent, depth = parents[side], depths[side]
+            other = depths[1 - side]
+            best = None
+            next_frontier = []
+            for node in frontiers[side]:
+                for neighbor, _ in self._neighbors(node):
+                    if neighbor in blocked_nodes or (blocked_edges and
+                                                     frozenset((node, neighbor)) in blocked_edges):
+                        continue
+                    if neighbor not in parent:
+                        parent[neighbor] = node
+                        depth[neighbor] = depth[node] + 1
+                        next_frontier.append(neighbor)
+                    if neighbor in other:
+                        length = depth[node] + 1 + other[neighbor]
+                        if best is None or length < best[0]:
+                            best = (length, node, neighbor)
+            frontiers = (next_frontier, frontiers[1]) if side == 0 else (frontiers[0], next_frontier)
+            hops += 1
+            if best is not None:
+                _, node, neighbor = best
+                near = [node]
+                while parent[near[-1]] is not None:
+                    near.append(parent[near[-1]])
+                far = [neighbor]
+                while parents[1 - side][far[-1]] is not None:
+                    far.append(parents[1 - side][far[-1]])
+                path = near[::-1] + far
+                return path if side == 0 else path[::-1]
+        return None
+
+    def _steps(self, path: List[str]) -> Tuple[Step, ...]:
+        """Steps with relationship labels along a node path"""
+        return tuple(Step(u, self._relationship(u, v), v) for u, v in zip(path, path[1:]))
+
+    def _relationship(self, u: str, v: str) -> str:
+        """Relationship of the edge between u and v, None if they are not adjacent"""
+        if self.store is not None:
+            return next((relationship for neighbor, relationship in self.store.neighbors(u) if neighbor == v), None)
+        data = self.kg._adj.get(u, {}).get(v)
+        return None if data is None else data.get('relationship', 'related')
+
+    def verify_answers(self, answers: List[str]) -> List[Dict]:
+        """Check the relationship claims of generated answers against the graph (see ClaimVerifier)"""
+        if self._verifier is None or self._verifier.version != self.version:
+            self._verifier = ClaimVerifier(self)
+        return self._verifier.verify_batch(answers)
+
+    def add_relation(self, source: str, relationship: str, target: str, provenance=None, **attributes):
+        """Add or relabel one edge, keeping the triple index in step
+
+        attributes are optional EDGE_ATTRIBUTES such as confidence=0.9;
+        provenance is added to the edge's citations. Relabeling an edge
+        (another relationship or direction) retires its earlier citations,
+        whose evidence supported the old claim, and drops its confidence and
+        evidence attributes. With a resolver, the names
+        are resolved to graph entities as at ingest.
+        """
+        self._check_writable()
+        source, target = self._canonical(source, target)
+        self.version += 1
+        previous = self.triples.add(source, relationship, target)
+        pair, value = self.triples.key(source, relationship, target)
+        if previous is not None and previous != value:
+            self.provenance.remove(pair)
+            # The old claim's confidence and evidence do not carry over
+            data = self.kg.edges[source, target]
+            for name in EDGE_ATTRIBUTES:
+                data.pop(name, None)
+        self.kg.add_edge(source, target, relationship=relationship,
+                         **edge_attributes(attributes))
+        if self._touched is not None:
+            self._touched[source] = self._touched[target] = None
+        if provenance:
+            self._add_provenance(source, relationship, target, provenance)
+
+    def remove_relation(self, source: str, target: str) -> bool:
+        """Remove the edge between two entities; False if there is none"""
+        self._check_writable()
+        source, target = self._canonical(source, target, remember=False)
+        if not self.kg.has_edge(source, target):
+            return False
+        # Edges added to kg directly never reached the index
+        s, t = self.triples.ids.get(source), self.triples.ids.get(target)
+        self.version += 1
+        self.kg.remove_edge(source, target)
+        if self._touched is not None:
+            self._touched[source] = self._touched[target] = None
+        if s is not None and t is not None:
+            self.provenance.remove(TripleIndex._pair(s, t))
+            self.triples.remove(source, target)
+        return True
+
+    def snapshot(self, label: str = None) -> GraphSnapshot:
+        """Record the current graph as a version, e.g. snapshot('2024-06-01')
+
+        Labels must increase (ISO dates and timestamps do); the default is
+        the current time. Only nodes changed since the previous snapshot are
+        copied (see GraphSnapshot).
+        """
+        self._check_writable()
+        label = label if label is not None else datetime.datetime.now().isoformat(timespec='microseconds')
+        previous = self.snapshots[-1] if self.snapshots else None
+        if previous is not None and label <= previous.label:
+            raise ValueError(f"Snapshot label {label!r} must come after {previous.label!r}")
+        snapshot = GraphSnapshot.capture(self.kg, label, self.version, previous, self._touched)
+        self.snapshots.append(snapshot)
+        self._touched = {}
+        return snapshot
+
+    def snapshot_at(self, label: str) -> GraphSnapshot:
+        """The latest snapshot taken at or before label"""
+        i = bisect.bisect_right([snapshot.label for snapshot in self.snapshots], label)
+        if i == 0:
+            raise ValueError(f"No snapshot at or before {label!r}")
+        return self.snapshots[i - 1]
+
+    def at(self, label: str) -> 'GraphRAG':
+        """Read-only GraphRAG answering queries from the graph as it was at label
+
+        Views are kept per snapshot, so switching back and forth reuses
+        their query caches.
+        """
+        snapshot = self.snapshot_at(label)
+        view = self._views.get(snapshot.label)
+        if view is None:
+            view = self._views[snapshot.label] = GraphRAG(self.cache.max_size if self.cache else 0)
+            view.store = snapshot
+            view.version = 1
+            view.aliases = self.aliases
+            view._alias_words = self._alias_words
+            view.resolver = self.resolver
+        return view
+
+    def diff(self, old: str, new: str = None) -> Dict[str, List]:
+        """Node and edge changes between the snapshots at two labels (new defaults to the latest)"""
+        before = self.snapshot_at(old)
+        after = self.snapshot_at(new) if new is not None else self.snapshots[-1]
+        return before.diff(after)
+
+    def shard(self, shards: int = 4, method: str = 'hash', addresses: List[Tuple[str, int]] = None,
+              authkey: bytes = None) -> 'GraphRAG':
+        """Read-only GraphRAG answering queries from the graph partitioned into shards
+
+        Shards are served by local processes, or by listen_shard servers at
+        addresses; method is 'hash' or 'edge_cut' (see ShardedGraph). Call
+        view.store.close() to stop them.
+        """
+        if addresses is not None:
+            store = ShardedGraph.connect(self.kg, addresses, authkey, method)
+        else:
+            store = ShardedGraph.launch(self.kg, shards, method)
+        view = GraphRAG(self.cache.max_size if self.cache else 0)
+        view.store = store
+        view.version = 1
+        view.aliases = self.aliases
+        view._alias_words = self._alias_words
+        view.resolver = self.resolver
+        return view
+
+    def cite(self, result: 'QueryResult') -> 'QueryResult':
+        """Attach the citation keys of the result's edges; a no-op without provenance"""
+        if not len(self.provenance) or self.store is not None:
+            return result
+        ids = self.triples.ids
+        edges = {}
+        for step in result.triples():
+            if step.source in ids and step.target in ids:
+                edges.setdefault(frozenset((step.source, step.target)),
+                                 TripleIndex._pair(ids[step.source], ids[step.target]))
+        # Only rows recorded for the edge's current relationship and direction
+        values = [self.triples.edges.get(pair, -1) for pair in edges.values()]
+        result.citations = {edge: tuple(map(ProvenanceTable.key, rows)) for edge, rows in
+                            zip(edges, self.provenance.rows_of(list(edges.values()), values)) if rows}
+        return result
+
+    def attach_documents(self, documents):
+        """Source of evidence text for resolve_citation: a mapping or callable from document id to text"""
+        self.provenance.documents = documents
+
+    def resolve_citation(self, key: str) -> Dict:
+        """Edge, document, offsets and evidence text behind a citation key such as 'c12'"""
+        claim = self.provenance.record(key)
+        if self.triples.edges.get(claim['pair']) != claim['value']:
+            raise KeyError(f"Citation key {key} no longer matches its edge")
+        record = self.provenance.resolve(key)
+        pair, value = record.pop('pair'), record.pop('value')
+        record.update(self.triples._decode(pair, value)._asdict())
+        return record
+
+    def has_triple(self, source: str, relationship: str, target: str, directed: bool = True) -> bool:
+        """Whether the graph holds the triple; directed=False also accepts target -> source"""
+        self._check_indexed()
+        return ((source, relationship, target) in self.triples or
+                (not directed and (target, relationship, source) in self.triples))
+
+    def match(self, source: str = None, relationship: str = None, target: str = None,
+              limit: int = None) -> List[Step]:
+        """Triples matching a pattern, None being a wildcard, e.g. match(None, 'treats', 'Breast Cancer')
+
+        A bound endpoint is scanned through its adjacency, otherwise the
+        relationship's posting set (or every edge) is. Edges added to kg
+        directly are not in the index: they have no ingest direction, so
+        they are read as leaving the bound source (or entering the bound
+        target) and only found through an endpoint.
+        """
+        self._check_indexed()
+        anchor = source if source is not None else target
+        if anchor is None:
+            triples = self.triples.match(None, relationship, None)
+        elif anchor not in self.kg:
+            return []
         else:
-            response = "No directly relevant information found in the knowledge graph."
+            triples = (self.triples.get(anchor, neighbor) or
+                       (Step(anchor, data.get('relationship', 'related'), neighbor) if source is not None
+                        else Step(neighbor, data.get('relationship', 'related'), anchor))
+                       for neighbor, data in self.kg._adj[anchor].items())
+            triples = (triple for triple in triples
+                       if (source is None or triple.source == source) and
+                       (target is None or triple.target == target) and
+                       (relationship is None or triple.relationship == relationship))
+        return list(islice(triples, limit))
+
+    def _check_engine(self, engine: str):
+        if engine not in self.ENGINES:
+            raise ValueError(f"Unknown traversal engine {engine!r}; expected one of {', '.join(self.ENGINES)}")
+
+    def _check_indexed(self):
+        if self.store is not None:
+            raise ValueError("The triple index covers in-memory graphs only")
+
+    def cache_stats(self) -> Dict:
+        """Hit/miss statistics of the query cache"""
+        return self.cache.stats() if self.cache is not None else {}
+
+    def _link_seeds(self, query: str) -> List[str]:
+        """Graph entities whose names contain any of the query terms
+
+        Entities are also matched through the alias index when the query
+        mentions one of their merged spellings.
+        """
+        terms = [term.lower() for term in query.split()]
+        aliased = self._aliased(query)
+        if self.store is not None:
+            return self.store.find_nodes(terms, aliased)
+        return [node for node in self.kg.nodes()
+                if node in aliased or any(term in node.lower() for term in terms)]
+
+    def _aliased(self, query: str) -> set:
+        """Entities one of whose merged spellings the query mentions"""
+        if not self.aliases or self.resolver is None:
+            return set()
+        normalized = self.resolver.normalize(query)
+        padded = f" {normalized} "
+        return {self.aliases[alias] for word in set(normalized.split())
+                for alias in self._alias_words.get(word, ()) if f" {alias} " in padded}
+
+    def _neighbors(self, node: str) -> List[Tuple[str, str]]:
+        """(neighbor, relationship) pairs of a node in adjacency order"""
+        if self.store is not None:
+            return self.store.neighbors(node)
+        return [(neighbor, data.get('relationship', 'related'))
+                for neighbor, data in self.kg.adj[node].items()]
+
+    def _weighted_neighbors(self, node: str) -> List[Tuple[str, str, float]]:
+        """(neighbor, relationship, confidence) triples of a node in adjacency order
+
+        Stores keep no edge attributes, so their edges have the default confidence.
+        """
+        if self.store is not None:
+            return [(neighbor, relationship, edge_confidence({}))
+                    for neighbor, relationship in self.store.neighbors(node)]
+        return [(neighbor, data.get('relationship', 'related'), edge_confidence(data))
+                for neighbor, data in self.kg.adj[node].items()]
+
+    def _follows(self, policy: TraversalPolicy, hop: int, relationship: str, neighbor: str) -> bool:
+        """policy.allows, looking the neighbor's type up only for edges whose relationship passes"""
+        return policy.allows_relationship(hop, relationship) and \
+            (policy.node_types is None or policy.allows_type(hop, self._node_type(neighbor)))
+
+    def _node_type(self, node: str) -> str:
+        if self.store is not None:
+            return self.store.node_type(node)
+        return self.kg.nodes[node].get('type', 'concept')
+
+    @staticmethod
+    def _policy(query: str, policy) -> TraversalPolicy:
+        """The TraversalPolicy a query's policy argument stands for, None for no restriction"""
+        if policy is None or isinstance(policy, TraversalPolicy):
+            return policy
+        if policy == 'auto':
+            return TRAVERSAL_POLICIES.get(classify_intent(query))
+        if policy not in TRAVERSAL_POLICIES:
+            raise ValueError(f"Unknown traversal policy {policy!r}; expected 'auto' or one of "
+                             f"{', '.join(TRAVERSAL_POLICIES)}")
+        return TRAVERSAL_POLICIES[policy]
+
+    def _analyze(self, seeds: List[str], max_hops: int = 2, policy: TraversalPolicy = None,
+                 engine: str = 'python') -> Tuple['SeedResult', ...]:
+        """Collect neighbors and paths (up to max_hops) for each seed entity"""
+        # Find paths to related concepts (up to max_hops), all seeds' BFS in step
+        return self._seed_results(seeds, self._expand(seeds, max_hops, policy, engine), policy)
+
+    def _expand(self, seeds: List[str], max_hops: int, policy: TraversalPolicy = None,
+                engine: str = 'python') -> List[List[Tuple[Step, ...]]]:
+        """BFS paths of each seed with one of ENGINES
+
+        Policies, and stores without bulk relationships(), run on the
+        Python engine.
+        """
+        self._check_engine(engine)
+        if engine == 'sparse' and policy is None and (self.store is None or hasattr(self.store, 'relationships')):
+            return self._bfs_paths_sparse(seeds, max_hops)
+        return self._bfs_paths_many(seeds, max_hops, policy)
+
+    def _seed_results(self, seeds: List[str], all_paths: List[List[Tuple[Step, ...]]],
+                      policy: TraversalPolicy = None) -> Tuple['SeedResult', ...]:
+        """SeedResults from each seed's direct neighbors and its expanded paths"""
+        prefetch = getattr(self.store, 'prefetch', None)
+        if prefetch is not None:
+            prefetch(seeds)
+        seed_results = []
+        for seed, paths in zip(seeds, all_paths):
+            # Direct neighbors
+            neighbors = tuple(Neighbor(relationship, neighbor)
+                              for neighbor, relationship in self._neighbors(seed)
+                              if policy is None or self._follows(policy, 0, relationship, neighbor))
+            paths = tuple(paths)
             
-        return response
+            seed_results.append(SeedResult(seed, self._node_type(seed), neighbors, paths))
+        return tuple(seed_results)
+
+    def _best_first_paths(self, seed: str, cutoff: int, top_k: int,
+                          policy: TraversalPolicy = None) -> List[Tuple[Step, ...]]:
+        """The top_k most confident paths of two or more hops from seed, best first
+
+        A path's confidence is the product of its edges', which never grows
+        along a path, so a priority queue settles nodes in order of their
+        most confident path (Dijkstra) and expansion stops after top_k
+        multi-hop paths. A node is expanded again only when reached in
+        fewer hops, which may let its neighbors fit within cutoff.
+        """
+        heap = [(-1.0, 0, 0, seed, ())]  # (-confidence, hops, tiebreak, node, steps)
+        settled = {}  # node -> fewest hops it has been expanded at
+        paths = []
+        pushed = 1
+        while heap and len(paths) < top_k:
+            negative, hops, _, node, steps = heapq.heappop(heap)
+            if node in settled:
+                if hops >= settled[node]:
+                    continue
+            elif len(steps) > 1:
+                paths.append(steps)
+            settled[node] = hops
+            if hops == cutoff:
+                continue
+            for neighbor, relationship, confidence in self._weighted_neighbors(node):
+                # Nodes on this path were settled at fewer hops, so paths stay simple
+                if settled.get(neighbor, cutoff + 1) <= hops + 1:
+                    continue
+                if policy is not None and not self._follows(policy, hops, relationship, neighbor):
+                    continue
+                heapq.heappush(heap, (negative * confidence, hops + 1, pushed, neighbor,
+                                      steps + (Step(node, relationship, neighbor),)))
+                pushed += 1
+        return paths
+
+    def _bfs_paths(self, seed: str, cutoff: int, policy: TraversalPolicy = None) -> List[Tuple[Step, ...]]:
+        """Shortest paths from seed to every node within cutoff hops, in BFS order
+
+        With a policy, edges it disallows are skipped before their target is
+        marked visited, so the target can still be reached another way.
+        """
+        return self._bfs_paths_many([seed], cutoff, policy)[0]
+
+    def _bfs_paths_many(self, seeds: List[str], cutoff: int,
+                        policy: TraversalPolicy = None) -> List[List[Tuple[Step, ...]]]:
+        """_bfs_paths of several seeds, advanced hop by hop together
+
+        A store with prefetch (ShardedGraph) is asked for the next frontier
+        of all seeds at once, one batched exchange per hop.
+        """
+        prefetch = getattr(self.store, 'prefetch', None)
+        searches = [({seed: None}, [seed], []) for seed in seeds]  # (parents, frontier, paths)
+        for hop in range(cutoff):
+            if prefetch is not None:
+                prefetch({node for _, frontier, _ in searches for node in frontier})
+            for i, (parents, frontier, paths) in enumerate(searches):
+                # parents: node -> Step that discovered it
+                next_frontier = []
+                for node in frontier:
+                    for neighbor, relationship in self._neighbors(node):
+                        if neighbor not in parents and (
+                                policy is None or self._follows(policy, hop, relationship, neighbor)):
+                            parents[neighbor] = Step(node, relationship, neighbor)
+                            next_frontier.append(neighbor)
+                for node in next_frontier:
+                    path = [parents[node]]
+                    while parents[path[-1].source] is not None:
+                        path.append(parents[path[-1].source])
+                    paths.append(tuple(reversed(path)))
+                searches[i] = (parents, next_frontier, paths)
+        return [paths for _, _, paths in searches]
+
+    def _bfs_paths_sparse(self, seeds: List[str], cutoff: int) -> List[List[Tuple[Step, ...]]]:
+        """_bfs_paths_many with the frontiers of all seeds advanced as arrays
+
+        The frontier is a sparse (seed, node) vector over the CSR adjacency;
+        each hop gathers the CSR rows of all its entries at once (a sparse
+        matrix-vector product keeping, per reached (seed, node), the first
+        discovering entry), drops visited pairs with one sorted-array
+        membership test and records each new entry's predecessor entry.
+        First discovery in frontier then adjacency order gives exactly the
+        Python engine's paths; only the final Step tuples are built in Python.
+        """
+        import numpy as np
+        nodes, index, indptr, indices = self._adjacency()
+        n = len(nodes)
+        frontier_seed = np.arange(len(seeds), dtype=np.int64)
+        frontier_node = np.array([index[seed] for seed in seeds], dtype=np.int64)
+        frontier_entry = -1 - frontier_seed  # predecessor of a first hop: -1 - seed
+        visited = np.sort(frontier_seed * n + frontier_node)
+        entry_seed, entry_node, entry_parent, entry_edge = [], [], [], []
+        for _ in range(cutoff):
+            starts = indptr[frontier_node]
+            counts = indptr[frontier_node + 1] - starts
+            total = int(counts.sum())
+            if not total:
+                break
+            # Positions of all frontier entries' neighbors in indices, in order
+            ends = np.cumsum(counts)
+            positions = np.arange(total) + np.repeat(starts - (ends - counts), counts)
+            source = np.repeat(np.arange(len(frontier_node)), counts)
+            keys = np.repeat(frontier_seed, counts) * n + indices[positions]
+            fresh = visited[np.searchsorted(visited, keys).clip(max=len(visited) - 1)] != keys
+            keys, source, positions = keys[fresh], source[fresh], positions[fresh]
+            _, first = np.unique(keys, return_index=True)
+            first.sort()
+            keys, source = keys[first], source[first]
+            entry_edge.append(positions[first])
+            visited = np.union1d(visited, keys)
+            offset = sum(map(len, entry_seed))
+            frontier_seed, frontier_node = keys // n, keys % n
+            entry_seed.append(frontier_seed)
+            entry_node.append(frontier_node)
+            entry_parent.append(frontier_entry[source])
+            frontier_entry = np.arange(offset, offset + len(keys))
+        if not entry_seed:
+            return [[] for _ in seeds]
+
+        # Path reconstruction from the predecessor array, level by level
+        entry_seed = np.concatenate(entry_seed).tolist()
+        entry_node = np.concatenate(entry_node).tolist()
+        entry_parent = np.concatenate(entry_parent).tolist()
+        relationships = self._relationships()
+        entry_relationship = [relationships[edge] for edge in np.concatenate(entry_edge).tolist()]
+        make_step = Step._make
+        paths = []
+        by_seed = [[] for _ in seeds]
+        for seed, node, parent, relationship in zip(entry_seed, entry_node, entry_parent, entry_relationship):
+            if parent < 0:
+                prefix, source = (), seeds[seed]
+            else:
+                prefix = paths[parent]
+                source = prefix[-1].target
+            path = prefix + (make_step((source, relationship, nodes[node])),)
+            paths.append(path)
+            by_seed[seed].append(path)
+        return by_seed
+
+# Sample knowledge base for cancer research; relations may carry a confidence
+# and an evidence count (supporting mentions), see edge_confidence
+CANCER_KNOWLEDGE_BASE = [
+    {
+        'entity': 'Trastuzumab',
+        'type': 'drug',
+        'related_to': [
+            {'entity': 'HER2', 'type': 'targets', 'confidence': 0.98, 'evidence': 42},
+            {'entity': 'Breast Cancer', 'type': 'treats', 'confidence': 0.95, 'evidence': 35},
+            {'entity': 'Cardiotoxicity', 'type': 'causes', 'confidence': 0.6, 'evidence': 8}
+        ]
+    },
+    {
+        'entity': 'HER2',
+        'type': 'protein',
+        'related_to': [
+            {'entity': 'Cell Growth', 'type': 'regulates', 'confidence': 0.9, 'evidence': 12},
+            {'entity': 'ERBB2', 'type': 'encoded_by', 'confidence': 0.99, 'evidence': 50}
+        ]
+    },
+    {
+        'entity': 'Breast Cancer',
+        'type': 'cancer_type',
+        'related_to': [
+            {'entity': 'HER2', 'type': 'overexpresses', 'confidence': 0.8, 'evidence': 18},
+            {'entity': 'BRCA1', 'type': 'associated_with', 'confidence': 0.7, 'evidence': 15}
+        ]
+    },
+    {
+        'entity': 'ERBB2',
+        'type': 'gene',
+        'related_to': [
+            {'entity': 'PI3K Pathway', 'type': 'activates', 'confidence': 0.85, 'evidence': 10},
+            {'entity': 'Cell Growth', 'type': 'promotes', 'confidence': 0.8, 'evidence': 7}
+        ]
+    },
+    {
+        'entity': 'PI3K Pathway',
+        'type': 'pathway',
+        'related_to': [
+            {'entity': 'Cell Survival', 'type': 'promotes', 'confidence': 0.9, 'evidence': 14},
+            {'entity': 'Cancer Growth', 'type': 'leads_to', 'confidence': 0.75, 'evidence': 6}
+        ]
+    },
+    {
+        'entity': 'Cardiotoxicity',
+        'type': 'side_effect',
+        'related_to': [
+            {'entity': 'Heart Damage', 'type': 'causes', 'confidence': 0.7, 'evidence': 5},
+            {'entity': 'Dose Reduction', 'type': 'requires', 'confidence': 0.65, 'evidence': 4}
+        ]
+    },
+    {
+        'entity': 'BRCA1',
+        'type': 'gene',
+        'related_to': [
+            {'entity': 'DNA Repair', 'type': 'involved_in', 'confidence': 0.97, 'evidence': 30},
+            {'entity': 'Cancer Risk', 'type': 'affects', 'confidence': 0.9, 'evidence': 25}
+        ]
+    }
+]
+
+TEST_QUERIES = [
+    "Why is Trastuzumab effective for breast cancer?",
+    "What are the risks of Trastuzumab treatment?",
+    "How does HER2 relate to cancer growth?",
+    "Explain the pathway from HER2 to cancer growth",
+    "What is the relationship between BRCA1 and cancer risk?",
+    "How does the PI3K pathway affect cancer development?"
+]
+
+# Gold paths for TEST_QUERIES, used by Evaluator's graph-grounded checks
+EVALUATION_SET = [
+    {'query': TEST_QUERIES[0], 'gold_path': [('Trastuzumab', 'targets', 'HER2'),
+                                             ('HER2', 'overexpresses', 'Breast Cancer'),
+                                             ('Trastuzumab', 'treats', 'Breast Cancer')]},
+    {'query': TEST_QUERIES[1], 'gold_path': [('Trastuzumab', 'causes', 'Cardiotoxicity'),
+                                             ('Cardiotoxicity', 'causes', 'Heart Damage'),
+                                             ('Cardiotoxicity', 'requires', 'Dose Reduction')]},
+    {'query': TEST_QUERIES[2], 'gold_path': [('HER2', 'encoded_by', 'ERBB2'),
+                                             ('ERBB2', 'activates', 'PI3K Pathway'),
+                                             ('PI3K Pathway', 'leads_to', 'Cancer Growth')]},
+    {'query': TEST_QUERIES[3], 'gold_path': [('HER2', 'regulates', 'Cell Growth'),
+                                             ('Cell Growth', 'promotes', 'ERBB2'),
+                                             ('ERBB2', 'activates', 'PI3K Pathway'),
+                                             ('PI3K Pathway', 'leads_to', 'Cancer Growth')]},
+    {'query': TEST_QUERIES[4], 'gold_path': [('BRCA1', 'affects', 'Cancer Risk'),
+                                             ('BRCA1', 'involved_in', 'DNA Repair')]},
+    {'query': TEST_QUERIES[5], 'gold_path': [('ERBB2', 'activates', 'PI3K Pathway'),
+                                             ('PI3K Pathway', 'promotes', 'Cell Survival'),
+                                             ('PI3K Pathway', 'leads_to', 'Cancer Growth')]}
+]
+
+class Evaluator:
+    """Automated scoring of question-answering systems against gold graph paths
+
+    Replaces the hand scoring described in Metric.md. Deterministic checks:
+    entity_recall is the fraction of gold path entities an answer names,
+    edge_coverage the fraction of gold edges whose two entities it names in
+    one sentence (or line). An optional judge (ClassicalAI) also scores the
+    four Metric.md rubrics 0-5; judge replies are cached on disk by prompt
+    hash (cache_dir=None disables this), so re-running an evaluation costs
+    no judge calls.
+    """
+    RUBRICS = ('relationship_depth', 'pathway_completeness', 'clinical_relevance', 'mechanism_clarity')
+
+    def __init__(self, questions: List[Dict] = None, judge: ClassicalAI = None,
+                 cache_dir: str = ".judge_cache", workers: int = 8):
+        self.questions = questions if questions is not None else EVALUATION_SET
+        self.judge = judge
+        self.cache_dir = cache_dir
+        self.workers = workers
+        self.records = []
+
+    def run(self, systems: Dict[str, object], llm: ClassicalAI = None) -> Dict[str, Dict]:
+        """Answer every question with every system (questions in parallel) and score them
+
+        systems maps a name to a callable taking the question and returning
+        the answer. With llm, its token usage is attributed to each system.
+        Returns per-system means; per-answer records are kept in records.
+        """
+        def answer(system, question):
+            start = time.perf_counter()
+            text = system(question['query'])
+            return {'query': question['query'], 'answer': text,
+                    'latency_ms': (time.perf_counter() - start) * 1000}
+
+        summary = {}
+        self.records = []
+        for name, system in systems.items():
+            before = dict(llm.usage) if llm is not None else None
+            start = time.perf_counter()
+            from concurrent.futures import ThreadPoolExecutor
+            with ThreadPoolExecutor(max_workers=self.workers) as pool:
+                records = list(pool.map(lambda question: answer(system, question), self.questions))
+            wall = time.perf_counter() - start
+            usage = {key: llm.usage[key] - before[key] for key in before} if before is not None else {}
+            for record, question in zip(records, self.questions):
+                record['system'] = name
+                record.update(self.score(record['answer'], question['gold_path']))
+            if self.judge is not None:
+                with ThreadPoolExecutor(max_workers=self.workers) as pool:
+                    judged = list(pool.map(self._judge, records, self.questions))
+                for record, scores in zip(records, judged):
+                    record.update(scores)
+            self.records.extend(records)
+            summary[name] = self._summarize(records, wall)
+            summary[name].update(usage)
+        return summary
+
+    @staticmethod
+    def score(answer: str, gold_path: List[Tuple[str, str, str]]) -> Dict[str, float]:
+        """Graph-grounded checks of one answer against its gold path edges"""
+        text = answer.lower()
+        sentences = [sentence for sentence in re.split(r'[.!?;\n]+', text) if sentence.strip()]
+        entities = {entity.lower() for source, _, target in gold_path for entity in (source, target)}
+        covered = sum(any(source.lower() in sentence and target.lower() in sentence for sentence in sentences)
+                      for source, _, target in gold_path)
+        return {
+            'entity_recall': sum(entity in text for entity in entities) / len(entities) if entities else 0.0,
+            'edge_coverage': covered / len(gold_path) if gold_path else 0.0
+        }
+
+    def _judge(self, record: Dict, question: Dict) -> Dict[str, float]:
+        reference = "\n".join(" ".join(step) for step in question['gold_path'])
+        prompt = self.judge.templates['judge'].render(query=question['query'], reference=reference,
+                                                     answer=record['answer'])
+        key = self._key(prompt)
+        reply = self._cache_get(key) if self.cache_dir else None
+        if reply is None:
+            reply = self.judge._make_api_call(prompt, max_tokens=50)
+            if self.cache_dir and not reply.startswith("API Error"):
+                self._cache_put(key, reply)
+        scores = {}
+        for rubric in self.RUBRICS:
+            pattern = rubric.replace('_', '[ _]')
+            match = re.search(rf'{pattern}\W+([0-5](?:\.\d+)?)', reply, re.IGNORECASE)
+            if match:
+                scores[rubric] = float(match.group(1))
+        return scores
+
+    def _key(self, prompt: str) -> str:
+        return hashlib.sha256(f"{self.judge.MODEL}\n{prompt}".encode('utf-8')).hexdigest()
+
+    def _cache_get(self, key: str):
+        path = os.path.join(self.cache_dir, f"{key}.json")
+        if not os.path.exists(path):
+            return None
+        with open(path, encoding='utf-8') as f:
+            return json.load(f)
+
+    def _cache_put(self, key: str, reply: str):
+        os.makedirs(self.cache_dir, exist_ok=True)
+        with open(os.path.join(self.cache_dir, f"{key}.json"), 'w', encoding='utf-8') as f:
+            json.dump(reply, f, ensure_ascii=False)
+
+    def _summarize(self, records: List[Dict], wall: float) -> Dict:
+        latencies = sorted(record['latency_ms'] for record in records)
+        summary = {}
+        for metric in ('entity_recall', 'edge_coverage') + self.RUBRICS:
+            values = [record[metric] for record in records if metric in record]
+            if values:
+                summary[metric] = round(statistics.mean(values), 3)
+        summary['p50_ms'] = round(statistics.median(latencies), 2)
+        summary['p95_ms'] = round(latencies[int(len(latencies) * 0.95)], 2)
+        summary['wall_s'] = round(wall, 3)
+        return summary
+
+    @classmethod
+    def markdown(cls, summary: Dict[str, Dict]) -> str:
+        """Quality and latency/cost tables for the systems of one run"""
+        tables = []
+        for title, columns in (('Quality', ('entity_recall', 'edge_coverage') + cls.RUBRICS),
+                               ('Latency and cost', ('p50_ms', 'p95_ms', 'wall_s', 'requests',
+                                                     'prompt_tokens', 'completion_tokens', 'cached_tokens'))):
+            columns = [column for column in columns if any(column in row for row in summary.values())]
+            lines = [f"### {title}", "", "| system | " + " | ".join(columns) + " |",
+                     "|---" * (len(columns) + 1) + "|"]
+            for name, row in summary.items():
+                lines.append(f"| {name} | " + " | ".join(str(row.get(column, '')) for column in columns) + " |")
+            tables.append("\n".join(lines))
+        return "\n\n".join(tables)
+
+def run_evaluation(mock: bool = False, judge: bool = False) -> str:
+    """Evaluate the demo systems on EVALUATION_SET and return the markdown tables
+
+    LLM systems run when OPENAI_API_KEY is set or with mock (MockLLMClient);
+    otherwise only the graph context itself is scored.
+    """
+    graphrag = GraphRAG()
+    graphrag.create_knowledge_graph(CANCER_KNOWLEDGE_BASE)
+    systems = {'graph_context': graphrag.query,
+               'graph_context_pairs': lambda query: graphrag.query(query, mode='pairs')}
+    llm = None
+    if mock or os.getenv("OPENAI_API_KEY"):
+        llm = ClassicalAI(CANCER_KNOWLEDGE_BASE)
+        if mock:
+            llm._client = MockLLMClient()
+        systems = {
+            'baseline': llm.raw_query,
+            **systems,
+            'graphrag': lambda query: llm.query_with_graph_context(query, graphrag.query(query)),
+        }
+    # Mock replies must not end up in the judge cache
+    evaluator = Evaluator(judge=llm if judge else None, cache_dir=None if mock else ".judge_cache")
+    return Evaluator.markdown(evaluator.run(systems, llm))
+
+def make_synthetic_knowledge_base(num_entities: int, relations_per_entity: int = 4,
+                                  seed: int = 0) -> List[Dict]:
+    """Random knowledge base in the CANCER_KNOWLEDGE_BASE format"""
+    rng = random.Random(seed)
+    types = ['drug', 'protein', 'pathway', 'cancer_type', 'side_effect', 'gene']
+    relationships = ['targets', 'treats', 'causes', 'regulates', 'activates',
+                     'promotes', 'inhibits', 'associated_with']
+    names = [f"N{i:08d}" for i in range(num_entities)]
+    knowledge_base = []
+    for i, name in enumerate(names):
+        related = []
+        for _ in range(relations_per_entity):
+            j = rng.randrange(num_entities - 1)
+            related.append({'entity': names[j + (j >= i)], 'type': rng.choice(relationships)})
+        knowledge_base.append({'entity': name, 'type': rng.choice(types), 'related_to': related})
+    return knowledge_base
+
+def _renderers_agree(graphrag: 'GraphRAG', query: str) -> bool:
+    """Every renderer states the same facts of one analysis"""
+    result = graphrag.analyze(query)
+    triples = result.triples()
+    compact = result.render('compact')
+    facts = [line for line in compact.splitlines() if line.lstrip().startswith('- ')]
+    return (result.render('text') == graphrag.query(query) and
+            json.loads(result.render('json')) == result.to_dict() and
+            result.render('triples').splitlines() ==
+            ([" | ".join(step) for step in triples] if result.seeds else [NO_RESULTS]) and
+            len(facts) == len(triples) and
+            all(f"{step.relationship} {step.target}" in compact for step in triples))
+
+def _compression_stats(graphrag: 'GraphRAG', queries: List[str]) -> Dict:
+    text_chars = compact_chars = 0
+    text_time = compact_time = 0.0
+    for query in queries:
+        start = time.perf_counter()
+        text_chars += len(graphrag.query(query))
+        text_time += time.perf_counter() - start
+        start = time.perf_counter()
+        compact_chars += len(graphrag.query(query, renderer='compact'))
+        compact_time += time.perf_counter() - start
+    return {
+        'text_chars': text_chars,
+        'compact_chars': compact_chars,
+        'reduction': f"{1 - compact_chars / text_chars:.1%}",
+        'text_ms': round(text_time * 1000, 2),
+        'compact_ms': round(compact_time * 1000, 2),
+        'renderers_agree': all(_renderers_agree(graphrag, query) for query in queries)
+    }
+
+def benchmark_query_cache(num_relations: int = 100000, pairs: int = 50) -> Dict:
+    """Hit rate and latency of paraphrased queries, and invalidation by add_relation"""
+    knowledge_base = make_synthetic_knowledge_base(num_relations // 4)
+    graphrag = GraphRAG()
+    graphrag.create_knowledge_graph(knowledge_base)
+    rng = random.Random(27)
+    names = [item['entity'] for item in knowledge_base]
+    # Linking splits on whitespace, so names are kept clear of punctuation
+    templates = ["How does {} relate to {}", "What links {} and {}", "Tell me about {} and {}"]
+    entities = [rng.sample(names, 2) for _ in range(pairs)]
+    queries = [template.format(*pair) for template in templates for pair in entities]
+
+    start = time.perf_counter()
+    answers = [graphrag.query(query) for query in queries]
+    elapsed = time.perf_counter() - start
+    stats = graphrag.cache_stats()
+    cache, graphrag.cache = graphrag.cache, None
+    uncached = [graphrag.query(query) for query in queries[:pairs]]
+    graphrag.cache = cache
+
+    # A new edge on a seed must show up in the next answer, not a cached one
+    query = queries[0]
+    graphrag.query(query)
+    graphrag.add_relation(entities[0][0], 'treats', 'Cache Probe Entity')
+    result = graphrag.analyze(query)
+    invalidated = not result.cached and 'Cache Probe Entity' in result.render()
+    return {
+        'queries': len(queries),
+        'hits': stats['hits'],
+        'hit_rate': round(stats['hit_rate'], 3),
+        'ms_per_query': round(1000 * elapsed / len(queries), 3),
+        'invalidated_on_add_relation': invalidated,
+        'passed': (stats['hits'] == len(queries) - pairs and answers[:pairs] == uncached and
+                   answers[pairs:] == answers[:pairs] * (len(templates) - 1) and invalidated)
+    }
+
+def benchmark_path_compression(sizes: Tuple[int, ...] = (1000, 10000), queries: int = 20) -> Dict:
+    """Output size of the text vs compact renderers, and agreement of all renderers"""
+    # Caching is disabled so both renderers pay for the traversal
+    graphrag = GraphRAG(cache_size=0)
+    graphrag.create_knowledge_graph(CANCER_KNOWLEDGE_BASE)
+    results = {'cancer_kb': _compression_stats(graphrag, TEST_QUERIES)}
+
+    for size in sizes:
+        knowledge_base = make_synthetic_knowledge_base(size)
+        graphrag = GraphRAG(cache_size=0)
+        graphrag.create_knowledge_graph(knowledge_base)
+        rng = random.Random(size)
+        names = [item['entity'] for item in knowledge_base]
+        synthetic_queries = [f"How does {rng.choice(names)} relate to {rng.choice(names)}?"
+                             for _ in range(queries)]
+        results[f'synthetic_{size}'] = _compression_stats(graphrag, synthetic_queries)
+    results['passed'] = all(stats['renderers_agree'] for stats in results.values())
+    return results
+
+def benchmark_bulk_build(sizes: Tuple[int, ...] = None, workers: int = None) -> Dict:
+    """Sequential vs bulk graph construction time for N relations
+
+    Sizes default to 1M and 10M relations and can be overridden with
+    GRAPHRAG_BULK_SIZES=1000000,2000000 (10M needs roughly 16 GB of RAM).
+    The bulk build runs in-process, and also with worker processes (default
+    one per core) when there is more than one core.
+    """
+    if sizes is None:
+        sizes = tuple(int(size) for size in
+                      os.getenv("GRAPHRAG_BULK_SIZES", "1000000,10000000").split(","))
+    workers = workers or os.cpu_count() or 1
+    builds = {'sequential': lambda graphrag, data: graphrag.create_knowledge_graph(data),
+              'bulk': lambda graphrag, data: graphrag.create_knowledge_graph_bulk(data)}
+    if workers > 1:
+        builds[f'bulk_{workers}_workers'] = \
+            lambda graphrag, data: graphrag.create_knowledge_graph_bulk(data, workers=workers)
+    results = {}
+    same = True
+    for size in sizes:
+        knowledge_base = make_synthetic_knowledge_base(size // 4, relations_per_entity=4)
+        result = {}
+        reference = None
+        for name, build in builds.items():
+            graphrag = GraphRAG()
+            start = time.perf_counter()
+            build(graphrag, knowledge_base)
+            result[f'{name}_s'] = round(time.perf_counter() - start, 2)
+            result['edges'] = graphrag.kg.number_of_edges()
+            edges = list(graphrag.kg.edges(data='relationship'))
+            same &= reference is None or edges == reference
+            reference = edges
+            del graphrag, edges
+            gc.collect()
+        results[f'{size}_relations'] = result
+        del knowledge_base, reference
+        gc.collect()
+    results['cores'] = os.cpu_count()
+    results['passed'] = same
+    return results
+
+def benchmark_pagerank(num_relations: int = 1000000, batch: int = 32, seeds_per_set: int = 3) -> Dict:
+    """Batched personalized PageRank on a synthetic million-edge graph"""
+    graphrag = GraphRAG()
+    graphrag.create_knowledge_graph_bulk(make_synthetic_knowledge_base(num_relations // 4))
+    rng = random.Random(0)
+    nodes = list(graphrag.kg)
+    seed_sets = [rng.sample(nodes, seeds_per_set) for _ in range(batch)]
+
+    start = time.perf_counter()
+    graphrag._transition_matrix()
+    matrix_time = time.perf_counter() - start
+    start = time.perf_counter()
+    graphrag.personalized_pagerank(seed_sets[:1])
+    single_time = time.perf_counter() - start
+    start = time.perf_counter()
+    graphrag.rank_nodes(seed_sets, top_k=10)
+    batch_time = time.perf_counter() - start
+    return {
+        'nodes': len(nodes),
+        'edges': graphrag.kg.number_of_edges(),
+        'matrix_build_s': round(matrix_time, 3),
+        'single_seed_set_s': round(single_time, 3),
+        f'batch_of_{batch}_s': round(batch_time, 3),
+        'per_seed_set_ms': round(batch_time / batch * 1000, 2)
+    }
+
+def benchmark_entity_resolution(num_entities: int = 20000, variant_fraction: float = 0.5,
+                                min_fuzzy_recall: float = 0.95) -> Dict:
+    """Ingest time with and without an EntityResolver, and its merges of spelling variants
+
+    Case and suffix variants normalize to the same key and must always
+    merge; hyphenated and misspelt variants rely on trigram similarity and
+    must mostly merge. Spellings of different entities must never merge.
+    """
+    rng = random.Random(34)
+    words = (['Epidermal', 'Vascular', 'Fibroblast', 'Hepatocyte', 'Insulin-like', 'Platelet-derived'],
+             ['Growth', 'Endothelial', 'Signaling', 'Transcription', 'Kinase'],
+             ['Factor Receptor', 'Regulator', 'Inhibitor Complex', 'Binding Domain'])
+    # Numbers differ between entities, so only spellings of one entity may merge
+    names = [f"{' '.join(rng.choice(group) for group in words)} {i}" for i in range(num_entities)]
+
+    def variant(name: str) -> Tuple[str, str]:
+        kind = rng.randrange(4)
+        if kind == 0:
+            return name.lower(), 'exact'
+        if kind == 1:
+            return f"{name} protein", 'exact'
+        if kind == 2:
+            return name.replace(' ', '-'), 'fuzzy'
+        # Drop a letter of the first word, past the leading characters blocking compares
+        i = rng.randrange(2, name.index(' '))
+        return name[:i] + name[i + 1:], 'fuzzy'
+
+    owner = {name: (i, 'exact') for i, name in enumerate(names)}
+    knowledge_base = []
+    for i, name in enumerate(names):
+        related = []
+        for _ in range(4):
+            j = rng.randrange(num_entities - 1)
+            j += j >= i
+            target, kind = variant(names[j]) if rng.random() < variant_fraction else (names[j], 'exact')
+            owner.setdefault(target, (j, kind))
+            related.append({'entity': target, 'type': 'regulates'})
+        knowledge_base.append({'entity': name, 'type': 'protein', 'related_to': related})
+
+    start = time.perf_counter()
+    GraphRAG(cache_size=0).create_knowledge_graph(knowledge_base)
+    plain_time = time.perf_counter() - start
+    # Two ingests, so variants must also merge with entities resolved by the first
+    graphrag = GraphRAG(cache_size=0)
+    resolver = EntityResolver()
+    half = len(knowledge_base) // 2
+    start = time.perf_counter()
+    graphrag.create_knowledge_graph(knowledge_base[:half], resolver=resolver)
+    graphrag.create_knowledge_graph(knowledge_base[half:], resolver=resolver)
+    resolved_time = time.perf_counter() - start
+    nodes = graphrag.kg.number_of_nodes()
+    # Updates are resolved as at ingest
+    for i in range(100):
+        graphrag.add_relation(f"{names[i].lower()} protein", 'regulates', names[i + 1].replace(' ', '-'))
+    updates_merged = graphrag.kg.number_of_nodes() == nodes
+
+    merged = {'exact': [0, 0], 'fuzzy': [0, 0]}
+    wrong = 0
+    for spelling, (entity, kind) in owner.items():
+        node = resolver.aliases[resolver.normalize(spelling)]
+        wrong += owner[node][0] != entity
+        merged[kind][0] += node == resolver.aliases[resolver.normalize(names[entity])]
+        merged[kind][1] += 1
+    exact_merged = merged['exact'][0] == merged['exact'][1]
+    fuzzy_recall = merged['fuzzy'][0] / merged['fuzzy'][1]
+    return {
+        'spellings': len(owner),
+        'entities': num_entities,
+        'nodes': nodes,
+        'plain_build_s': round(plain_time, 2),
+        'resolved_build_s': round(resolved_time, 2),
+        'exact_variants_merged': exact_merged,
+        'fuzzy_recall': round(fuzzy_recall, 4),
+        'wrong_merges': wrong,
+        'updates_merged': updates_merged,
+        'passed': exact_merged and fuzzy_recall >= min_fuzzy_recall and wrong == 0 and updates_merged
+    }
+
+def benchmark_columns(num_relations: int = 1000000, queries: int = 20) -> Dict:
+    """Heap footprint and query latency of networkx vs memory-mapped columns"""
+    import tracemalloc
+
+    knowledge_base = make_synthetic_knowledge_base(num_relations // 4)
+    rng = random.Random(1)
+    names = [item['entity'] for item in knowledge_base]
+    sample = [f"How does {rng.choice(names)} relate to {rng.choice(names)}?" for _ in range(queries)]
+
+    gc.collect()
+    tracemalloc.start()
+    graphrag = GraphRAG(cache_size=0)
+    graphrag.create_knowledge_graph(knowledge_base)
+    graph_bytes = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del knowledge_base
+    start = time.perf_counter()
+    expected = [graphrag.query(query) for query in sample]
+    graph_query = time.perf_counter() - start
+
+    path = tempfile.mkdtemp(prefix="graphrag_columns_")
+    try:
+        graphrag.write_columns(path)
+        disk_bytes = sum(os.path.getsize(os.path.join(path, name)) for name in os.listdir(path))
+        del graphrag
+        gc.collect()
+        tracemalloc.start()
+        columnar = GraphRAG.from_columns(path, cache_size=0)
+        columns_bytes = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+        start = time.perf_counter()
+        answers = [columnar.query(query) for query in sample]
+        columns_query = time.perf_counter() - start
+        del columnar
+    finally:
+        shutil.rmtree(path, ignore_errors=True)
+
+    return {
+        'networkx_heap_mb': round(graph_bytes / 2**20, 1),
+        'columns_heap_mb': round(columns_bytes / 2**20, 2),
+        'columns_on_disk_mb': round(disk_bytes / 2**20, 1),
+        'networkx_query_ms': round(graph_query / queries * 1000, 2),
+        'columns_query_ms': round(columns_query / queries * 1000, 2),
+        'same_answers': answers == expected
+    }
+
+def _latency_ms(func, inputs: List) -> Tuple[float, float]:
+    """p50 and p95 latency of func over inputs in milliseconds"""
+    timings = []
+    for value in inputs:
+        start = time.perf_counter()
+        func(value)
+        timings.append((time.perf_counter() - start) * 1000)
+    return round(statistics.median(timings), 2), round(sorted(timings)[int(len(timings) * 0.95)], 2)
+
+def benchmark_sqlite(num_relations: int = 200000, queries: int = 50) -> Dict:
+    """Ingest time and query latency of the SQLite store vs in-memory networkx"""
+    knowledge_base = make_synthetic_knowledge_base(num_relations // 4)
+    rng = random.Random(2)
+    names = [item['entity'] for item in knowledge_base]
+    sample = [f"How does {rng.choice(names)} relate to {rng.choice(names)}?" for _ in range(queries)]
+
+    directory = tempfile.mkdtemp(prefix="graphrag_sqlite_")
+    path = os.path.join(directory, "graph.db")
+    try:
+        start = time.perf_counter()
+        store = SQLiteGraphStore(path)
+        store.ingest(knowledge_base)
+        store.close()
+        ingest_time = time.perf_counter() - start
+
+        graphrag = GraphRAG(cache_size=0)
+        graphrag.create_knowledge_graph(knowledge_base)
+        on_disk = GraphRAG.from_sqlite(path, cache_size=0)
+        same = all(graphrag.query(query) == on_disk.query(query) for query in sample[:5])
+        on_disk = GraphRAG.from_sqlite(path, cache_size=0)
+        cold = _latency_ms(on_disk.query, sample)
+        warm = _latency_ms(on_disk.query, sample)
+        in_memory = _latency_ms(graphrag.query, sample)
+        size = os.path.getsize(path)
+        on_disk.store.close()
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+    return {
+        'ingest_s': round(ingest_time, 2),
+        'file_mb': round(size / 2**20, 1),
+        'sqlite_cold_p50_p95_ms': cold,
+        'sqlite_warm_p50_p95_ms': warm,
+        'networkx_p50_p95_ms': in_memory,
+        'same_answers': same
+    }
+
+def benchmark_neo4j_export(num_relations: int = 1000000, queries: int = 20) -> Dict:
+    """Export/load time of Neo4j import files, validated and round-tripped offline"""
+    knowledge_base = make_synthetic_knowledge_base(num_relations // 4)
+    rng = random.Random(3)
+    for item in knowledge_base:
+        for relation in item['related_to']:
+            if rng.random() < 0.5:
+                relation['confidence'] = round(rng.random(), 3)
+            if rng.random() < 0.5:
+                relation['evidence'] = rng.randrange(1, 10)
+    names = [item['entity'] for item in knowledge_base]
+    sample = [f"How does {rng.choice(names)} relate to {rng.choice(names)}?" for _ in range(queries)]
+    graphrag = GraphRAG(cache_size=0)
+    graphrag.create_knowledge_graph(knowledge_base)
+    del knowledge_base
+
+    path = tempfile.mkdtemp(prefix="graphrag_neo4j_")
+    try:
+        start = time.perf_counter()
+        graphrag.write_neo4j(path)
+        export_time = time.perf_counter() - start
+        sizes = {name: os.path.getsize(os.path.join(path, name)) for name in os.listdir(path)}
+        checks = Neo4jBulkFiles.validate(path)
+        start = time.perf_counter()
+        loaded = GraphRAG(cache_size=0)
+        loaded.load_neo4j(path)
+        load_time = time.perf_counter() - start
+    finally:
+        shutil.rmtree(path, ignore_errors=True)
+
+    same = (loaded.kg.number_of_edges() == graphrag.kg.number_of_edges() and
+            all(loaded.query(query) == graphrag.query(query) for query in sample))
+    loaded_adj = loaded.kg.adj
+    same_attributes = all(loaded_adj[u][v] == data for u, v, data in graphrag.kg.edges(data=True))
+    return {
+        'nodes': checks['nodes'],
+        'relationships': checks['relationships'],
+        'export_s': round(export_time, 2),
+        'load_s': round(load_time, 2),
+        'files_mb': {name: round(size / 2**20, 1) for name, size in sorted(sizes.items())},
+        'cypher_statements': checks['cypher_statements'],
+        'same_answers': same,
+        'same_edge_attributes': same_attributes,
+        'passed': checks['valid'] and same and same_attributes
+    }
+
+def benchmark_distance_oracle(num_relations: int = 1000000, pairs: int = 200, k: int = 4) -> Dict:
+    """Landmark oracle vs exact bidirectional BFS for point-to-point questions"""
+    graphrag = GraphRAG(cache_size=0)
+    graphrag.create_knowledge_graph(make_synthetic_knowledge_base(num_relations // 4))
+    graphrag._adjacency()
+    start = time.perf_counter()
+    oracle = graphrag.distance_oracle()
+    build_time = time.perf_counter() - start
+
+    rng = random.Random(4)
+    nodes, index = graphrag._adjacency()[:2]
+    sample = [(rng.choice(nodes), rng.choice(nodes)) for _ in range(pairs)]
+    ids = [(index[x], index[y]) for x, y in sample]
+
+    start = time.perf_counter()
+    decided = [oracle.within(x, y, k) for x, y in ids]
+    within_time = time.perf_counter() - start
+    start = time.perf_counter()
+    approximate = [oracle.path(x, y) for x, y in ids]
+    path_time = time.perf_counter() - start
+    start = time.perf_counter()
+    exact = [graphrag.shortest_path(x, y) for x, y in sample]
+    exact_time = time.perf_counter() - start
+
+    connected = [(len(a) - 1, len(e)) for a, e in zip(approximate, exact) if e]
+    correct = all((len(e) <= k) == d for d, e in zip(decided, exact) if d is not None and e is not None)
+    return {
+        'nodes': len(nodes),
+        'median_distance': statistics.median(e for _, e in connected) if connected else None,
+        'oracle_build_s': round(build_time, 2),
+        'oracle_mb': round((oracle.distance.nbytes + oracle.parent.nbytes) / 2**20, 1),
+        f'within_{k}_us': round(within_time / pairs * 1e6, 1),
+        f'within_{k}_decided_by_bounds': round(sum(d is not None for d in decided) / pairs, 3),
+        'approximate_path_us': round(path_time / pairs * 1e6, 1),
+        'exact_bidirectional_ms': round(exact_time / pairs * 1000, 2),
+        'mean_stretch': round(statistics.mean(a / e for a, e in connected), 3) if connected else None,
+        'passed': correct
+    }
+
+def benchmark_seed_pairs(num_relations: int = 1000000, queries: int = 20, k: int = 3) -> Dict:
+    """Latency and context size of pair mode vs local expansion for two-entity questions"""
+    knowledge_base = make_synthetic_knowledge_base(num_relations // 4)
+    rng = random.Random(5)
+    names = [item['entity'] for item in knowledge_base]
+    # No trailing '?', so both entity names match as seeds
+    sample = [f"How does {rng.choice(names)} relate to {rng.choice(names)}" for _ in range(queries)]
+    graphrag = GraphRAG(cache_size=0)
+    graphrag.create_knowledge_graph(knowledge_base)
+    del knowledge_base
+
+    results = {}
+    for mode in ('local', 'pairs'):
+        start = time.perf_counter()
+        answers = [graphrag.query(query, mode=mode, top_k=k if mode == 'pairs' else None)
+                   for query in sample]
+        results[mode] = (time.perf_counter() - start, sum(len(answer) for answer in answers))
+
+    # Many named entities are capped at max_seeds; 'is' matching 'Cancer Risk' is no seed
+    graphrag.add_relation('Cancer Risk', 'affects', names[0])
+    wide = rng.sample(names, 8)
+    start = time.perf_counter()
+    capped = graphrag.analyze_pairs(f"What is the link between {' '.join(wide)}", k)
+    capped_time = time.perf_counter() - start
+    noisy = graphrag.analyze_pairs(f"What is {wide[0]} to {wide[1]}", k)
+    # With one seed, pair mode expands it with the caller's parameters
+    single = f"What does {wide[0]} do"
+    fallback_kept = graphrag.query(single, mode='pairs', max_hops=1) == graphrag.query(single, max_hops=1)
+    return {
+        'local_query_ms': round(results['local'][0] / queries * 1000, 2),
+        'pairs_query_ms': round(results['pairs'][0] / queries * 1000, 2),
+        'local_context_chars': results['local'][1] // queries,
+        'pairs_context_chars': results['pairs'][1] // queries,
+        'eight_entity_query_ms': round(capped_time * 1000, 2),
+        'passed': (len(capped.seeds) == 4 and {seed.entity for seed in noisy.seeds} == set(wide[:2]) and
+                   fallback_kept)
+    }
+
+def benchmark_prompt_templates(num_entities: int = 2000, queries: int = 200) -> Dict:
+    """Raw-query prompt assembly: precompiled prefix vs rebuilding the knowledge base text"""
+    ai = ClassicalAI(make_synthetic_knowledge_base(num_entities))
+    sample = [f"What does N{i:08d} regulate?" for i in range(queries)]
+
+    # Graph-context queries never serialize the knowledge base
+    start = time.perf_counter()
+    ai.templates['graph'].render(graph_context="", query=sample[0])
+    graph_time = time.perf_counter() - start
+    raw_deferred = 'raw' not in ai.templates
+    start = time.perf_counter()
+    template = ai.templates['raw']
+    compile_time = time.perf_counter() - start
+    start = time.perf_counter()
+    prompts = [template.render(query=query) for query in sample]
+    render_time = time.perf_counter() - start
+    start = time.perf_counter()
+    for query in sample:
+        # What raw_query used to do on every call
+        f"{ai._knowledge_context()}\n\nQuestion: {query}"
+    rebuild_time = time.perf_counter() - start
+    return {
+        'prefix_tokens': template.prefix_tokens,
+        'compile_ms': round(compile_time * 1000, 2),
+        'graph_template_ms': round(graph_time * 1000, 2),
+        'render_us': round(render_time / queries * 1e6, 1),
+        'rebuild_per_call_us': round(rebuild_time / queries * 1e6, 1),
+        'passed': raw_deferred and all(prompt.startswith(template.prefix) for prompt in prompts)
+    }
+
+def benchmark_llm_batching(repeats: int = 8, pack_size: int = 8) -> Dict:
+    """Requests and prompt tokens of packed/batch-API evaluation runs, on the mock endpoint"""
+    graphrag = GraphRAG(cache_size=0)
+    graphrag.create_knowledge_graph(CANCER_KNOWLEDGE_BASE)
+    queries = TEST_QUERIES * repeats
+    runs = {
+        'raw': [{'query': query} for query in queries],
+        'graph': [{'query': query, 'graph_context': graphrag.query(query)} for query in queries]
+    }
+    result = {'prompts': 2 * len(queries)}
+    correct = True
+    for label, options in (('single', {'pack_size': 1}), ('packed', {'pack_size': pack_size}),
+                           ('batch_api', {'pack_size': pack_size, 'batch_api': True})):
+        ai = ClassicalAI(CANCER_KNOWLEDGE_BASE)
+        ai._client = MockLLMClient()
+        requests = tokens = 0
+        for template, fields in runs.items():
+            answers, report = ai.batch(template, fields, **options)
+            correct &= answers == [f"Mock answer to: Question: {item['query']}" for item in fields]
+            requests += report['requests']
+            tokens += report['prompt_tokens']
+        result[f'{label}_requests'] = requests
+        result[f'{label}_prompt_tokens'] = tokens
+    result['passed'] = correct
+    return result
+
+def benchmark_extraction(num_relations: int = 20000, sentences_per_document: int = 50,
+                         workers: int = 4) -> Dict:
+    """Requests and time of a cold and a cached extraction run, on the mock JSON endpoint"""
+    knowledge_base = make_synthetic_knowledge_base(num_relations // 4)
+    sentences = [f"{item['entity']} {relation['type']} {relation['entity']}."
+                 for item in knowledge_base for relation in item['related_to']]
+    documents = [" ".join(sentences[i:i + sentences_per_document])
+                 for i in range(0, len(sentences), sentences_per_document)]
+    expected = {(item['entity'], relation['type'], relation['entity'])
+                for item in knowledge_base for relation in item['related_to']}
+    directory = tempfile.mkdtemp(prefix="graphrag_extraction_")
+    runs = []
+    try:
+        for label in ('cold', 'cached'):
+            llm = ClassicalAI(CANCER_KNOWLEDGE_BASE)
+            llm._client = MockLLMClient(extract=True)
+            extractor = TripleExtractor(llm, cache_dir=directory, workers=workers)
+            start = time.perf_counter()
+            items = list(extractor.extract(documents))
+            elapsed = time.perf_counter() - start
+            runs.append({'label': label, 'items': items, 'seconds': elapsed,
+                         'stats': extractor.stats, 'sent': llm._client.requests})
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+    cold, cached = runs
+    found = {(item['entity'], relation['type'], relation['entity'])
+             for item in cold['items'] for relation in item['related_to']}
+    return {
+        'documents': len(documents),
+        'chunks': cold['stats']['chunks'],
+        'cold': {'requests': cold['stats']['requests'], 's': round(cold['seconds'], 2)},
+        'cached': {'requests': cached['stats']['requests'], 'cached': cached['stats']['cached'],
+                   's': round(cached['seconds'], 2)},
+        'requests_counted': cold['stats']['requests'] == cold['sent'],
+        'same_triples': cached['items'] == cold['items'],
+        'passed': (found == expected and cached['items'] == cold['items'] and
+                   cold['stats']['requests'] == cold['sent'] and not cold['stats']['failed'] and
+                   cached['sent'] == 0 and cached['stats']['cached'] == cached['stats']['chunks'])
+    }
+
+def benchmark_claim_verification(num_relations: int = 1000000, answers: int = 500,
+                                 claims_per_answer: int = 10) -> Dict:
+    """Per-answer latency and accuracy of ClaimVerifier on generated answers"""
+    knowledge_base = make_synthetic_knowledge_base(num_relations // 4)
+    graphrag = GraphRAG(cache_size=0)
+    graphrag.create_knowledge_graph(knowledge_base)
+    del knowledge_base
+    rng = random.Random(6)
+    nodes = list(graphrag.kg)
+    # Edges in their ingest direction, which claims must follow
+    edges = [graphrag.triples.get(node, next(iter(graphrag.kg.adj[node])))
+             for node in rng.sample(nodes, 2000)]
+    # Entities with two outgoing relations, for shared-subject sentences: "u r1 v1 and r2 v2"
+    pairs = []
+    for u in rng.sample(nodes, 2000):
+        triples = [graphrag.triples.get(u, v) for v in graphrag.kg.adj[u]]
+        outgoing = [(triple.target, triple.relationship) for triple in triples if triple.source == u]
+        if len(outgoing) >= 2:
+            pairs.append((u, outgoing[:2]))
+    verifier = ClaimVerifier(graphrag)
+    relation_text = lambda relationship: verifier._key(relationship.replace('_', ' '))
+    texts = []
+    expected = {}  # Claim -> status; a claim's status follows from its content
+    for _ in range(answers):
+        sentences = []
+        for _ in range(claims_per_answer):
+            if rng.random() < 0.2:
+                u, ((v1, r1), (v2, r2)) = rng.choice(pairs)
+                sentences.append(f"{u} {r1.replace('_', ' ')} {v1} and {r2.replace('_', ' ')} {v2}.")
+                expected[Claim(u, relation_text(r1), v1)] = 'supported'
+                expected[Claim(u, relation_text(r2), v2)] = 'supported'
+                continue
+            u, relationship, v = rng.choice(edges)
+            kind = rng.choice(('supported', 'reversed', 'relation_mismatch', 'unsupported'))
+            if kind == 'reversed':
+                u, v = v, u
+                if relationship in ClaimVerifier.SYMMETRIC:
+                    kind = 'supported'
+            elif kind == 'relation_mismatch':
+                relationship = 'contradicts'
+            elif kind == 'unsupported':
+                v = rng.choice(nodes)
+                while v == u:
+                    v = rng.choice(nodes)
+                if graphrag.kg.has_edge(u, v):
+                    kind = 'relation_mismatch'
+                relationship = 'contradicts'
+            sentences.append(f"{u} {relationship.replace('_', ' ')} {v}.")
+            expected[Claim(u, relation_text(relationship), v)] = kind
+        texts.append(" ".join(sentences))
+
+    start = time.perf_counter()
+    graphrag.verify_answers(texts[:1])
+    index_time = time.perf_counter() - start
+    results = graphrag.verify_answers(texts)
+    found = {}
+    for result in results:
+        for status in ('supported', 'reversed', 'relation_mismatch', 'unsupported'):
+            for claim in result[status]:
+                found[claim] = status
+    latencies = sorted(result['latency_ms'] for result in results)
+    return {
+        'answers': answers,
+        'claims_per_answer': claims_per_answer,
+        'name_index_s': round(index_time, 2),
+        'p50_ms': round(latencies[len(latencies) // 2], 3),
+        'p95_ms': round(latencies[int(len(latencies) * 0.95)], 3),
+        'accuracy': round(sum(found.get(claim) == status for claim, status in expected.items())
+                          / len(expected), 4),
+        'spurious_claims': len(found.keys() - expected.keys()),
+        'passed': found == expected
+    }
+
+def benchmark_triple_index(num_relations: int = 1000000, probes: int = 10000, scans: int = 20) -> Dict:
+    """Ingest overhead, existence checks and pattern scans of the triple index"""
+    knowledge_base = make_synthetic_knowledge_base(num_relations // 4)
+    graphrag = GraphRAG(cache_size=0)
+    start = time.perf_counter()
+    graphrag.create_knowledge_graph(knowledge_base)
+    build_time = time.perf_counter() - start
+    index = TripleIndex()
+    start = time.perf_counter()
+    for item in knowledge_base:
+        for relation in item.get('related_to', ()):
+            index.add(item['entity'], relation['type'], relation['entity'])
+    index_time = time.perf_counter() - start
+    del knowledge_base, index
+
+    rng = random.Random(7)
+    triples = [graphrag.triples.get(*edge) for edge in
+               rng.sample(list(graphrag.kg.edges()), probes)]
+    start = time.perf_counter()
+    found = sum(graphrag.has_triple(*triple) for triple in triples)
+    exists_time = time.perf_counter() - start
+    # Without the index: adjacency lookup plus relationship compare, direction unknown
+    start = time.perf_counter()
+    for source, relationship, target in triples:
+        data = graphrag.kg._adj.get(source, {}).get(target)
+        data is not None and data.get('relationship') == relationship
+    adjacency_time = time.perf_counter() - start
+
+    patterns = [(None, triple.relationship, triple.target) for triple in triples[:scans]]
+    start = time.perf_counter()
+    indexed = [graphrag.match(*pattern) for pattern in patterns]
+    scan_time = time.perf_counter() - start
+    start = time.perf_counter()
+    full = [[Step(u, data['relationship'], v) for u, v, data in graphrag.kg.edges(data=True)
+             if data['relationship'] == relationship and (u == target or v == target)]
+            for _, relationship, target in patterns[:2]]
+    full_time = (time.perf_counter() - start) / 2
+    # Undirected edge scan finds both orientations; the index keeps ingest direction
+    consistent = all({(t.source, t.target) for t in a} <= {(t.source, t.target) for t in b} |
+                     {(t.target, t.source) for t in b}
+                     for a, b in zip(indexed, full))
+    start = time.perf_counter()
+    by_relationship = len(graphrag.match(relationship=patterns[0][1]))
+    relationship_time = time.perf_counter() - start
+
+    # Removal drops the triple; an edge added to kg directly has none to drop,
+    # and is matched from its endpoints
+    graphrag.remove_relation(triples[0].source, triples[0].target)
+    graphrag.kg.add_edge('Unindexed A', 'Unindexed B', relationship='related_to')
+    removed = (not graphrag.has_triple(*triples[0]) and
+               graphrag.match('Unindexed A') == [Step('Unindexed A', 'related_to', 'Unindexed B')] and
+               graphrag.remove_relation('Unindexed A', 'Unindexed B') and
+               not graphrag.kg.has_edge('Unindexed A', 'Unindexed B'))
+    return {
+        'edges': len(graphrag.triples),
+        'build_s': round(build_time, 2),
+        'index_s': round(index_time, 2),
+        'ingest_overhead_pct': round(100 * index_time / (build_time - index_time), 1),
+        'exists_us': round(1e6 * exists_time / probes, 2),
+        'adjacency_lookup_us': round(1e6 * adjacency_time / probes, 2),
+        'pattern_scan_ms': round(1000 * scan_time / scans, 3),
+        'full_edge_scan_ms': round(1000 * full_time, 1),
+        'relationship_scan': {'triples': by_relationship, 'ms': round(1000 * relationship_time, 1)},
+        'removal_consistent': removed,
+        'passed': found == probes and consistent and removed
+    }
+
+def benchmark_traversal_policies(num_relations: int = 1000000, queries: int = 30, max_hops: int = 3) -> Dict:
+    """Expansion work and latency, prompt size and gold-path coverage with intent-chosen policies vs none"""
+    def run(graphrag, texts, policy):
+        start = time.perf_counter()
+        results = [graphrag.analyze(text, max_hops=max_hops, policy=policy) for text in texts]
+        elapsed = time.perf_counter() - start
+        # Seed linking costs the same either way; time the expansion the policy prunes
+        # on its own, best of three runs
+        linked = [(graphrag._link_seeds(text), GraphRAG._policy(text, policy)) for text in texts]
+        expand_times = []
+        for _ in range(3):
+            start = time.perf_counter()
+            for seeds, chosen in linked:
+                graphrag._analyze(seeds, max_hops, chosen, 'python')
+            expand_times.append(time.perf_counter() - start)
+        return {
+            'paths': sum(len(seed.paths) for result in results for seed in result.seeds),
+            'prompt_chars': sum(len(render_text(result)) for result in results),
+            'ms_per_query': round(1000 * elapsed / len(texts), 2),
+            'expand_ms_per_query': round(1000 * min(expand_times) / len(texts), 3)
+        }, results
+
+    cancer = GraphRAG(cache_size=0)
+    cancer.create_knowledge_graph(CANCER_KNOWLEDGE_BASE)
+    texts = [question['query'] for question in EVALUATION_SET]
+    results = {'cancer_kb': {}}
+    for name, policy in (('unrestricted', None), ('auto', 'auto')):
+        stats, analyses = run(cancer, texts, policy)
+        stats['gold_edge_coverage'] = round(sum(
+            Evaluator.score(render_text(analysis), question['gold_path'])['edge_coverage']
+            for analysis, question in zip(analyses, EVALUATION_SET)) / len(texts), 3)
+        results['cancer_kb'][name] = stats
+    results['cancer_kb']['intents'] = [classify_intent(text) for text in texts]
+
+    graphrag = GraphRAG(cache_size=0)
+    graphrag.create_knowledge_graph(make_synthetic_knowledge_base(num_relations // 4))
+    rng = random.Random(8)
+    templates = ("How does {} signal?", "What are the risks of {}?", "Is {} an effective therapy?")
+    texts = [rng.choice(templates).format(node) for node in rng.sample(list(graphrag.kg), queries)]
+    results['synthetic'] = {name: run(graphrag, texts, policy)[0]
+                            for name, policy in (('unrestricted', None), ('auto', 'auto'))}
+    results['synthetic']['max_hops'] = max_hops
+    results['passed'] = all(results[graph]['auto']['paths'] < results[graph]['unrestricted']['paths'] and
+                            results[graph]['auto']['expand_ms_per_query'] <
+                            results[graph]['unrestricted']['expand_ms_per_query']
+                            for graph in ('cancer_kb', 'synthetic'))
+    return results
+
+def benchmark_best_first(num_relations: int = 1000000, seeds: int = 50, top_k: int = 10,
+                         max_hops: int = 3) -> Dict:
+    """Best-first top_k expansion vs enumerating every path and truncating by confidence"""
+    rng = random.Random(9)
+    knowledge_base = make_synthetic_knowledge_base(num_relations // 4)
+    for item in knowledge_base:
+        for relation in item['related_to']:
+            relation['confidence'] = round(rng.uniform(0.05, 1.0), 3)
+            relation['evidence'] = rng.randint(1, 20)
+    graphrag = GraphRAG(cache_size=0)
+    graphrag.create_knowledge_graph(knowledge_base)
+    del knowledge_base
+    samples = rng.sample(list(graphrag.kg), seeds)
+
+    def confidence(path):
+        return math.prod(edge_confidence(graphrag.kg._adj[step.source][step.target]) for step in path)
+
+    start = time.perf_counter()
+    best_first = [graphrag._best_first_paths(seed, max_hops, top_k) for seed in samples]
+    best_first_time = time.perf_counter() - start
+    start = time.perf_counter()
+    enumerated = 0
+    truncated = []
+    for seed in samples:
+        paths = [path for path in graphrag._bfs_paths(seed, max_hops) if len(path) > 1]
+        enumerated += len(paths)
+        truncated.append(sorted(paths, key=confidence, reverse=True)[:top_k])
+    truncate_time = time.perf_counter() - start
+    # BFS keeps the shortest path per node, best-first the most confident one,
+    # so the i-th best-first path is at least as confident as the i-th truncated one
+    at_least_as_confident = all(
+        confidence(ours) >= confidence(theirs) - 1e-12
+        for found, baseline in zip(best_first, truncated) for ours, theirs in zip(found, baseline))
+    # Relabeling an edge drops the old claim's confidence; restating it keeps it
+    triple = graphrag.triples.get(samples[0], next(iter(graphrag.kg.adj[samples[0]])))
+    graphrag.add_relation(*triple)
+    kept = 'confidence' in graphrag.kg.edges[triple.source, triple.target]
+    graphrag.add_relation(triple.target, triple.relationship, triple.source)
+    relabel_cleared = kept and edge_attributes(graphrag.kg.edges[triple.source, triple.target]) == {}
+    return {
+        'seeds': seeds,
+        'top_k': top_k,
+        'max_hops': max_hops,
+        'best_first_ms_per_seed': round(1000 * best_first_time / seeds, 2),
+        'enumerate_truncate_ms_per_seed': round(1000 * truncate_time / seeds, 2),
+        'paths_enumerated_per_seed': enumerated // seeds,
+        'mean_top_confidence': {
+            'best_first': round(sum(map(confidence, sum(best_first, []))) / max(1, sum(map(len, best_first))), 4),
+            'enumerate_truncate': round(sum(map(confidence, sum(truncated, []))) / max(1, sum(map(len, truncated))), 4)
+        },
+        'relabel_clears_confidence': relabel_cleared,
+        'passed': at_least_as_confident and relabel_cleared
+    }
+
+def benchmark_provenance(num_relations: int = 1000000, cited_fraction: float = 0.5,
+                         queries: int = 50, documents: int = 100000) -> Dict:
+    """Side-table size, citation overhead on query and lazy evidence resolution"""
+    rng = random.Random(10)
+    knowledge_base = make_synthetic_knowledge_base(num_relations // 4)
+    for item in knowledge_base:
+        for relation in item['related_to']:
+            if rng.random() < cited_fraction:
+                start = rng.randrange(0, 900)
+                relation['provenance'] = {'document': f"PMID:{rng.randrange(documents)}",
+                                          'start': start, 'end': start + 100}
+    graphrag = GraphRAG(cache_size=0)
+    start = time.perf_counter()
+    graphrag.create_knowledge_graph(knowledge_base)
+    build_time = time.perf_counter() - start
+    table = graphrag.provenance
+    table_bytes = sum(column.itemsize * len(column) for column in
+                      (table.edges, table.claims, table.documents_of, table.starts, table.ends))
+    # The same records kept inline as per-edge attribute dicts, for comparison
+    inline_bytes = sum(sys.getsizeof(record) + sum(map(sys.getsizeof, record.values()))
+                       for record in (relation['provenance'] for item in knowledge_base
+                                      for relation in item['related_to'] if 'provenance' in relation))
+    del knowledge_base
+
+    texts = [f"How does {node} work?" for node in rng.sample(list(graphrag.kg), queries)]
+    results = [graphrag.analyze(text) for text in texts]
+    start = time.perf_counter()
+    table.rows(0)
+    sort_time = time.perf_counter() - start
+    start = time.perf_counter()
+    plain = [render_text(result) for result in results]
+    plain_time = time.perf_counter() - start
+    start = time.perf_counter()
+    cited = [render_text(graphrag.cite(result)) for result in results]
+    cited_time = time.perf_counter() - start
+    keys = [key for result in results for keys in result.citations.values() for key in keys]
+
+    loads = []
+    graphrag.attach_documents(lambda document: loads.append(document) or ("x" * 1000))
+    sample = rng.sample(keys, min(200, len(keys)))
+    start = time.perf_counter()
+    resolved = [graphrag.resolve_citation(key) for key in sample]
+    resolve_time = time.perf_counter() - start
+
+    # Relabeling a cited edge retires its citations: they supported the old claim
+    record = resolved[0]
+    relabeled = 'contradicts' if record['relationship'] != 'contradicts' else 'supports'
+    graphrag.add_relation(record['source'], relabeled, record['target'])
+    stale = sample[0]
+    try:
+        graphrag.resolve_citation(stale)
+        retired = False
+    except KeyError:
+        retired = True
+    recited = graphrag.cite(graphrag.analyze(record['source']))
+    retired = retired and all(stale not in keys for keys in (recited.citations or {}).values())
+    return {
+        'rows': len(table),
+        'build_s': round(build_time, 2),
+        'table_mb': round(table_bytes / 2 ** 20, 1),
+        'inline_dicts_mb': round(inline_bytes / 2 ** 20, 1),
+        'citation_index_s': round(sort_time, 3),
+        'render_ms_per_query': round(1000 * plain_time / queries, 3),
+        'cite_and_render_ms_per_query': round(1000 * cited_time / queries, 3),
+        'chars_added_pct': round(100 * (sum(map(len, cited)) / sum(map(len, plain)) - 1), 1),
+        'resolve_ms': round(1000 * resolve_time / len(sample), 3),
+        'documents_loaded': len(loads),
+        'relabel_retires_citations': retired,
+        'passed': bool(keys) and all(len(record['text']) == 100 for record in resolved) and retired
+    }
+
+def benchmark_snapshots(num_relations: int = 1000000, days: int = 5, updates_per_day: int = 1000,
+                        queries: int = 20) -> Dict:
+    """Cost of daily copy-on-write snapshots, switching between them and diffing"""
+    rng = random.Random(11)
+    graphrag = GraphRAG(cache_size=0)
+    graphrag.create_knowledge_graph(make_synthetic_knowledge_base(num_relations // 4))
+    nodes = list(graphrag.kg)
+    texts = [f"How does {node} work?" for node in rng.sample(nodes, queries)]
+    start = time.perf_counter()
+    graphrag.snapshot('day-0')
+    full_time = time.perf_counter() - start
+    answers = [graphrag.query(text) for text in texts]
+
+    delta_times = []
+    for day in range(1, days + 1):
+        for _ in range(updates_per_day):
+            u, v = rng.sample(nodes, 2)
+            if rng.random() < 0.2 and graphrag.kg.degree(u):
+                graphrag.remove_relation(u, next(iter(graphrag.kg.adj[u])))
+            else:
+                graphrag.add_relation(u, rng.choice(('treats', 'inhibits', 'targets')), v)
+        start = time.perf_counter()
+        graphrag.snapshot(f"day-{day}")
+        delta_times.append(time.perf_counter() - start)
+    first, last = graphrag.snapshots[0], graphrag.snapshots[-1]
+
+    start = time.perf_counter()
+    view = graphrag.at('day-0')
+    switch_time = time.perf_counter() - start
+    start = time.perf_counter()
+    replayed = [view.query(text) for text in texts]
+    view_time = time.perf_counter() - start
+    start = time.perf_counter()
+    live = [graphrag.query(text) for text in texts]
+    live_time = time.perf_counter() - start
+    start = time.perf_counter()
+    changes = graphrag.diff('day-0')
+    diff_time = time.perf_counter() - start
+    return {
+        'nodes': len(nodes),
+        'full_snapshot_s': round(full_time, 2),
+        'delta_snapshot_ms': round(1000 * sum(delta_times) / days, 1),
+        # Random updates touch most buckets, but node records (the bulk of the memory) stay shared
+        'buckets_shared_day_to_day_pct': round(100 * sum(
+            a is b for a, b in zip(graphrag.snapshots[-2].buckets, last.buckets)) / len(last.buckets), 1),
+        'records_shared_day_to_day_pct': round(100 * sum(
+            a.get(node) is record for a, b in zip(graphrag.snapshots[-2].buckets, last.buckets)
+            for node, record in b.items()) / len(nodes), 1),
+        'records_shared_first_to_last_pct': round(100 * sum(
+            a.get(node) is record for a, b in zip(first.buckets, last.buckets)
+            for node, record in b.items()) / len(nodes), 1),
+        'switch_ms': round(1000 * switch_time, 3),
+        'view_query_ms': round(1000 * view_time / queries, 2),
+        'live_query_ms': round(1000 * live_time / queries, 2),
+        'diff_s': round(diff_time, 2),
+        'diff_edges': {'added': len(changes['added_edges']), 'removed': len(changes['removed_edges']),
+                       'changed': len(changes['changed_edges'])},
+        'passed': replayed == answers and len(graphrag.snapshots) == days + 1
+    }
+
+def benchmark_sharding(num_relations: int = 1000000, shards: int = 4, queries: int = 20,
+                       seeds_per_query: int = 5, max_hops: int = 2) -> Dict:
+    """Distributed k-hop expansion over local shard servers vs a single process"""
+    graphrag = GraphRAG(cache_size=0)
+    graphrag.create_knowledge_graph(make_synthetic_knowledge_base(num_relations // 4))
+    rng = random.Random(12)
+    nodes = list(graphrag.kg)
+    texts = [" ".join(rng.sample(nodes, seeds_per_query)) for _ in range(queries)]
+    start = time.perf_counter()
+    expected = [graphrag.query(text, max_hops=max_hops) for text in texts]
+    single_time = time.perf_counter() - start
+    results = {'single_process_ms_per_query': round(1000 * single_time / queries, 1)}
+    passed = True
+    for method in ('hash', 'edge_cut'):
+        start = time.perf_counter()
+        view = graphrag.shard(shards, method)
+        setup_time = time.perf_counter() - start
+        store = view.store
+        owner = store.owner
+        cut = sum(owner(u) != owner(v) for u, v in graphrag.kg.edges()) / graphrag.kg.number_of_edges()
+        start = time.perf_counter()
+        answers = [view.query(text, max_hops=max_hops) for text in texts]
+        sharded_time = time.perf_counter() - start
+        stats = store.stats()
+        store.close()
+        passed = passed and answers == expected
+        results[method] = {
+            'setup_s': round(setup_time, 1),
+            'cross_shard_edges_pct': round(100 * cut, 1),
+            'ms_per_query': round(1000 * sharded_time / queries, 1),
+            'exchanges_per_query': round(stats['exchanges'] / queries, 1),
+            'nodes_fetched_per_query': stats['nodes_fetched'] // queries
+        }
+    results['passed'] = passed
+    return results
+
+def benchmark_sparse_bfs(num_relations: int = 1000000, queries: int = 20, seeds_per_query: int = 5,
+                         settings: Tuple[Tuple[int, int], ...] = ((4, 3), (64, 2))) -> Dict:
+    """Multi-seed expansion with the sparse frontier engine vs the Python BFS
+
+    Each setting is (relations_per_entity, max_hops). Seeds are linked up
+    front so only expansion is timed: per query, and for all queries' seeds
+    in one traversal as analyze_batch does. The graph is frozen out of the
+    garbage collector, whose full passes over it would otherwise dominate.
+    """
+    results = {}
+    passed = True
+    for relations_per_entity, max_hops in settings:
+        graphrag = GraphRAG(cache_size=0)
+        graphrag.create_knowledge_graph(make_synthetic_knowledge_base(num_relations // relations_per_entity,
+                                                                      relations_per_entity))
+        rng = random.Random(13)
+        nodes = list(graphrag.kg)
+        linked = [graphrag._link_seeds(" ".join(rng.sample(nodes, seeds_per_query))) for _ in range(queries)]
+        pooled = [seed for seeds in linked for seed in seeds]
+        graphrag._relationships()  # with the CSR adjacency, built once per graph version
+        gc.collect()
+        gc.freeze()
+        timings = {}
+        expected = None
+        for engine in GraphRAG.ENGINES:
+            start = time.perf_counter()
+            answers = [graphrag._expand(seeds, max_hops, engine=engine) for seeds in linked]
+            query_time = time.perf_counter() - start
+            start = time.perf_counter()
+            batch = graphrag._expand(pooled, max_hops, engine=engine)
+            batch_time = time.perf_counter() - start
+            answers = [paths for paths_of in answers for paths in paths_of]
+            expected = expected or answers
+            passed = passed and answers == expected and batch == expected
+            timings[engine] = (query_time, batch_time)
+        gc.unfreeze()
+        results[f'degree_{2 * relations_per_entity}_hops_{max_hops}'] = {
+            'paths_per_query': sum(map(len, expected)) // queries,
+            'python_ms_per_query': round(1000 * timings['python'][0] / queries, 1),
+            'sparse_ms_per_query': round(1000 * timings['sparse'][0] / queries, 1),
+            'sparse_batch_ms_per_query': round(1000 * timings['sparse'][1] / queries, 1),
+            'speedup': round(timings['python'][0] / timings['sparse'][0], 1)
+        }
+        del graphrag, linked, expected, answers, batch
+        gc.collect()
+    results['passed'] = passed
+    return results
+
+def benchmark_import_time(runs: int = 5, budget_ms: float = IMPORT_TIME_BUDGET_MS) -> Dict:
+    """Measure cold import time of this module in fresh interpreters"""
+    import subprocess
+
+    code = (
+        "import importlib.util, json, sys, time\n"
+        "start = time.perf_counter()\n"
+        f"spec = importlib.util.spec_from_file_location('graphrag', {os.path.abspath(__file__)!r})\n"
+        "module = importlib.util.module_from_spec(spec)\n"
+        "spec.loader.exec_module(module)\n"
+        "elapsed = (time.perf_counter() - start) * 1000\n"
+        "heavy = [m for m in module.HEAVY_MODULES if m in sys.modules]\n"
+        "print(json.dumps({'ms': elapsed, 'heavy': heavy}))"
+    )
+    timings = []
+    heavy = set()
+    for _ in range(runs):
+        out = subprocess.run([sys.executable, "-c", code],
+                             capture_output=True, text=True, check=True)
+        result = json.loads(out.stdout.strip().splitlines()[-1])
+        timings.append(result['ms'])
+        heavy.update(result['heavy'])
+
+    median = statistics.median(timings)
+    return {
+        'runs': runs,
+        'min_ms': round(min(timings), 2),
+        'median_ms': round(median, 2),
+        'budget_ms': budget_ms,
+        'heavy_modules_loaded': sorted(heavy),
+        'passed': median <= budget_ms and not heavy
+    }
+
+BENCHMARKS = {
+    'import_time': benchmark_import_time,
+    'query_cache': benchmark_query_cache,
+    'path_compression': benchmark_path_compression,
+    'bulk_build': benchmark_bulk_build,
+    'pagerank': benchmark_pagerank,
+    'entity_resolution': benchmark_entity_resolution,
+    'columns': benchmark_columns,
+    'sqlite': benchmark_sqlite,
+    'neo4j_export': benchmark_neo4j_export,
+    'distance_oracle': benchmark_distance_oracle,
+    'seed_pairs': benchmark_seed_pairs,
+    'prompt_templates': benchmark_prompt_templates,
+    'llm_batching': benchmark_llm_batching,
+    'extraction': benchmark_extraction,
+    'claim_verification': benchmark_claim_verification,
+    'triple_index': benchmark_triple_index,
+    'traversal_policies': benchmark_traversal_policies,
+    'best_first': benchmark_best_first,
+    'provenance': benchmark_provenance,
+    'snapshots': benchmark_snapshots,
+    'sharding': benchmark_sharding,
+    'sparse_bfs': benchmark_sparse_bfs,
+}
+
+def run_benchmarks(names: List[str]) -> int:
+    """Run the named benchmarks (all if none given), return a process exit code"""
+    names = names or list(BENCHMARKS)
+    unknown = [name for name in names if name not in BENCHMARKS]
+    if unknown:
+        print(f"Unknown benchmark(s): {', '.join(unknown)}")
+        print(f"Available: {', '.join(BENCHMARKS)}")
+        return 2
+
+    failed = False
+    for name in names:
+        result = BENCHMARKS[name]()
+        print(f"\n{name}:")
+        for key, value in result.items():
+            print(f"  {key}: {value}")
+        if result.get('passed') is False:
+            failed = True
+    return 1 if failed else 0
 
 def main():
-    if not os.getenv("HUGGINGFACE_API_TOKEN"):
+    if len(sys.argv) > 1 and sys.argv[1] == "--benchmark":
+        sys.exit(run_benchmarks(sys.argv[2:]))
+    if len(sys.argv) > 1 and sys.argv[1] == "--evaluate":
+        print(run_evaluation(mock="--mock" in sys.argv[2:], judge="--judge" in sys.argv[2:]))
+        return
+    # --batch packs the LLM calls (see ClassicalAI.batch); --mock answers them offline
+    batch = "--batch" in sys.argv[1:]
+    mock = "--mock" in sys.argv[1:]
+
+    if not mock and not os.getenv("HUGGINGFACE_API_TOKEN"):
         print("Error: Please set the HUGGINGFACE_API_TOKEN environment variable")
         print("\nYou can get  token from: https://huggingface.co/settings/tokens")
         print("\nThen set it using:")
@@ -200,77 +5024,18 @@ def main():
         print("set HUGGINGFACE_API_TOKEN=_token_here  # For Windows")
         return
     
-    # Sample knowledge base for cancer research
-    cancer_knowledge_base = [
-        {
-            'entity': 'Trastuzumab',
-            'type': 'drug',
-            'related_to': [
-                {'entity': 'HER2', 'type': 'targets'},
-                {'entity': 'Breast Cancer', 'type': 'treats'},
-                {'entity': 'Cardiotoxicity', 'type': 'causes'}
-            ]
-        },
-        {
-            'entity': 'HER2',
-            'type': 'protein',
-            'related_to': [
-                {'entity': 'Cell Growth', 'type': 'regulates'},
-                {'entity': 'ERBB2', 'type': 'encoded_by'}
-            ]
-        },
-        {
-            'entity': 'Breast Cancer',
-            'type': 'cancer_type',
-            'related_to': [
-                {'entity': 'HER2', 'type': 'overexpresses'},
-                {'entity': 'BRCA1', 'type': 'associated_with'}
-            ]
-        },
-        {
-            'entity': 'ERBB2',
-            'type': 'gene',
-            'related_to': [
-                {'entity': 'PI3K Pathway', 'type': 'activates'},
-                {'entity': 'Cell Growth', 'type': 'promotes'}
-            ]
-        },
-        {
-            'entity': 'PI3K Pathway',
-            'type': 'pathway',
-            'related_to': [
-                {'entity': 'Cell Survival', 'type': 'promotes'},
-                {'entity': 'Cancer Growth', 'type': 'leads_to'}
-            ]
-        },
-        {
-            'entity': 'Cardiotoxicity',
-            'type': 'side_effect',
-            'related_to': [
-                {'entity': 'Heart Damage', 'type': 'causes'},
-                {'entity': 'Dose Reduction', 'type': 'requires'}
-            ]
-        },
-        {
-            'entity': 'BRCA1',
-            'type': 'gene',
-            'related_to': [
-                {'entity': 'DNA Repair', 'type': 'involved_in'},
-                {'entity': 'Cancer Risk', 'type': 'affects'}
-            ]
-        }
-    ]
-    
     print("Initializing systems...")
     try:
-        if not os.getenv("HUGGINGFACE_API_TOKEN"):
+        if not mock and not os.getenv("HUGGINGFACE_API_TOKEN"):
             raise ValueError("Please set the HUGGINGFACE_API_TOKEN environment variable")
             
-        classical_ai = ClassicalAI(cancer_knowledge_base)
+        classical_ai = ClassicalAI(CANCER_KNOWLEDGE_BASE)
+        if mock:
+            classical_ai._client = MockLLMClient()
         graphrag = GraphRAG()
         
         print("Creating knowledge graph...")
-        graphrag.create_knowledge_graph(cancer_knowledge_base)
+        graphrag.create_knowledge_graph(CANCER_KNOWLEDGE_BASE)
         
         print("\nGenerating visualization...")
         graph_file = graphrag.visualize_graph()
@@ -288,41 +5053,47 @@ def main():
         print("3. Hover over nodes and edges to see additional information")
         print("4. Use the physics button to adjust the graph layout")
         
-        test_queries = [
-            "Why is Trastuzumab effective for breast cancer?",
-            "What are the risks of Trastuzumab treatment?",
-            "How does HER2 relate to cancer growth?",
-            "Explain the pathway from HER2 to cancer growth",
-            "What is the relationship between BRCA1 and cancer risk?",
-            "How does the PI3K pathway affect cancer development?"
-        ]
-        
+        graph_responses = [graphrag.query(query) for query in TEST_QUERIES]
+        if batch:
+            basic_responses, basic_report = classical_ai.batch(
+                'raw', [{'query': query} for query in TEST_QUERIES])
+            enhanced_responses, enhanced_report = classical_ai.batch(
+                'graph', [{'query': query, 'graph_context': context}
+                          for query, context in zip(TEST_QUERIES, graph_responses)])
+
         print("\nComparing different approaches:")
-        for query in test_queries:
+        for i, query in enumerate(TEST_QUERIES):
             print("\n" + "="*80)
             print(f"Query: {query}")
             
             print("\n1. Basic LLM Response (without knowledge graph):")
             print("-"*40)
-            basic_response = classical_ai.raw_query(query)
+            basic_response = basic_responses[i] if batch else classical_ai.raw_query(query)
             print(basic_response)
             
             print("\n2. Knowledge Graph Analysis:")
             print("-"*40)
-            graph_response = graphrag.query(query)
+            graph_response = graph_responses[i]
             print(graph_response)
             
             print("\n3. Enhanced LLM Response (with knowledge graph context):")
             print("-"*40)
-            enhanced_response = classical_ai.query_with_graph_context(query, graph_response)
+            enhanced_response = (enhanced_responses[i] if batch else
+                                 classical_ai.query_with_graph_context(query, graph_response))
             print(enhanced_response)
             print("="*80)
+
+        if batch:
+            print("\nBatching report:")
+            for name, report in (('basic', basic_report), ('enhanced', enhanced_report)):
+                print(f"  {name}: {report['requests']} requests for {report['prompts']} prompts, "
+                      f"~{report['prompt_tokens_saved']} prompt tokens saved")
         
     except Exception as e:
         print(f"Error: {e}")
         print("\nPlease make sure you have:")
         print("1. Set the HUGGINGFACE_API_TOKEN environment variable")
-        print("2. Installed all required packages (networkx, pyvis, requests)")
+        print("2. Installed all required packages (networkx, pyvis, openai)")
         print("3. Have an active internet connection")
 
 if __name__ == "__main__":